@@ -3,10 +3,16 @@
 # ===========================
 # Purpose: Load transformed Titanic dataset into Supabase using Supabase client
  
+import argparse
 import os
+import sys
+from pathlib import Path
 import pandas as pd
 from supabase import create_client, Client
 from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # repo root, for etl_common
+from etl_common.load_checkpoint import open_checkpoint, pending_batches
  
 # Initialize Supabase client
 def get_supabase_client():
@@ -72,13 +78,16 @@ def create_table_if_not_exists():
 # ------------------------------------------------------
 # Step 2: Load CSV data into Supabase table
 # ------------------------------------------------------
-def load_to_supabase(staged_path: str, table_name: str = "titanic_data"):
+def load_to_supabase(staged_path: str, table_name: str = "titanic_data", restart: bool = False):
     """
     Load a transformed CSV into a Supabase table.
+    Committed batches are recorded in a checkpoint file next to the CSV, so a
+    rerun skips them and resumes with the first batch that did not make it.
  
     Args:
         staged_path (str): Path to the transformed CSV file.
         table_name (str): Supabase table name. Default is 'titanic_data'.
+        restart (bool): Forget the checkpoint and load every row again.
     """
     # Convert to absolute path
     if not os.path.isabs(staged_path):
@@ -101,19 +110,19 @@ def load_to_supabase(staged_path: str, table_name: str = "titanic_data"):
         total_rows = len(df)
        
         print(f"📊 Loading {total_rows} rows into '{table_name}'...")
+
+        checkpoint = open_checkpoint(staged_path, table_name, restart)
+        # Convert NaN to None for proper NULL handling
+        all_records = df.where(pd.notnull(df), None).to_dict('records')
        
-        # Process in batches
-        for i in range(0, total_rows, batch_size):
-            batch = df.iloc[i:i + batch_size].copy()
-            # Convert NaN to None for proper NULL handling
-            batch = batch.where(pd.notnull(batch), None)
-            records = batch.to_dict('records')
-           
+        # Process in batches (those committed by an earlier run are skipped)
+        for i, records, key in pending_batches(checkpoint, all_records, batch_size):
             try:
                 response = supabase.table(table_name).insert(records).execute()
                 if hasattr(response, 'error') and response.error:
                     print(f"⚠️  Error in batch {i//batch_size + 1}: {response.error}")
                 else:
+                    checkpoint.commit(key, rows=len(records))
                     end = min(i + batch_size, total_rows)
                     print(f"✅ Inserted rows {i+1}-{end} of {total_rows}")
             except Exception as e:
@@ -129,7 +138,10 @@ def load_to_supabase(staged_path: str, table_name: str = "titanic_data"):
 # Step 3: Run as standalone script
 # ------------------------------------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the transformed Titanic data into Supabase")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and load every row again")
+    args = parser.parse_args()
     # Path relative to the script location
     staged_csv_path = os.path.join("..", "data", "staged", "titanic_transformed.csv")
     create_table_if_not_exists()  # Ensure table exists
-    load_to_supabase(staged_csv_path)
\ No newline at end of file
+    load_to_supabase(staged_csv_path, restart=args.restart)
\ No newline at end of file
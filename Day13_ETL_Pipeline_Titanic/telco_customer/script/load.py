@@ -3,11 +3,17 @@
 # ===========================
 # Purpose: Load transformed dataset into Supabase using Supabase client
 #
+import argparse
 import os
+import sys
+from pathlib import Path
 import pandas as pd
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+sys.path.append(str(Path(__file__).resolve().parents[3]))  # repo root, for etl_common
+from etl_common.load_checkpoint import open_checkpoint, pending_batches
+
 # Initialize Supabase client
 def get_supabase_client():
     """Initialize and return Supabase client."""
@@ -68,7 +74,12 @@ CREATE TABLE IF NOT EXISTS public.telco_customer (
 # ------------------------------------------------------
 # Step 2: Load CSV data into Supabase table
 # ------------------------------------------------------
-def load_to_supabase(staged_path: str, table_name: str = "telco_customer"):
+def load_to_supabase(staged_path: str, table_name: str = "telco_customer", restart: bool = False):
+    """
+    Load the staged CSV in batches. Committed batches are recorded in a
+    checkpoint file next to the CSV, so a rerun resumes where the last one
+    stopped; restart=True forgets the checkpoint and loads every row again.
+    """
 
     # Convert to absolute path (relative to script)
     if not os.path.isabs(staged_path):
@@ -123,14 +134,13 @@ def load_to_supabase(staged_path: str, table_name: str = "telco_customer"):
         # Reorder and keep only send_cols
         df_send = df[send_cols].copy()
 
-        # Process in batches
-        batch_size = 200  # Reduced batch size for better reliability
-        for i in range(0, total_rows, batch_size):
-            batch = df_send.iloc[i:i + batch_size].copy()
-            # Convert NaN to None for proper NULL handling
-            batch = batch.where(pd.notnull(batch), None)
-            records = batch.to_dict('records')
+        checkpoint = open_checkpoint(staged_path, table_name, restart)
+        # Convert NaN to None for proper NULL handling
+        all_records = df_send.where(pd.notnull(df_send), None).to_dict('records')
 
+        # Process in batches (those committed by an earlier run are skipped)
+        batch_size = 200  # Reduced batch size for better reliability
+        for i, records, key in pending_batches(checkpoint, all_records, batch_size):
             try:
                 # Use the standard table insert API
                 response = supabase.table(table_name).insert(records).execute()
@@ -143,6 +153,7 @@ def load_to_supabase(staged_path: str, table_name: str = "telco_customer"):
                     if hasattr(response, "error") and response.error:
                         print(f"⚠️  Error in batch {i//batch_size + 1}: {response.error}")
                     else:
+                        checkpoint.commit(key, rows=len(records))
                         end = min(i + batch_size, total_rows)
                         print(f"✅ Inserted rows {i+1}-{end} of {total_rows}")
             except Exception as e:
@@ -164,7 +175,10 @@ def load_to_supabase(staged_path: str, table_name: str = "telco_customer"):
 # Step 3: Run as standalone script
 # ------------------------------------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the transformed Telco data into Supabase")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and load every row again")
+    args = parser.parse_args()
     # Path relative to the script location - ensure this matches your transform.py output filename
     staged_csv_path = os.path.join("..", "data", "staged", "telco_customer_transformed.csv")
     create_table_if_not_exists()  # Best-effort create (or print SQL to run)
-    load_to_supabase(staged_csv_path)
+    load_to_supabase(staged_csv_path, restart=args.restart)
@@ -0,0 +1,187 @@
+"""
+aggregate_store.py
+
+Aggregates behind the analysis KPIs, and a persistent store of them.
+
+compute_aggregates makes one pass over the rows and returns a small "cube":
+per combination of key values the number of rows and, for each value column,
+its sum, count of non-missing values and max. KPIs, distributions and trends are
+roll-ups of such a cube (rollup / mean_of), so they cost O(cells), not O(rows).
+
+AggregateStore keeps the cube at (city, date, hour, risk_flag) grain on disk
+(data/processed/aggregates.parquet). After a load, only the (city, date)
+partitions that received rows are recomputed from the staged dataset, which
+holds exactly one row per (city, time) like the table does. Recomputing whole
+partitions keeps upserts (changed rows) and max correct without ever
+subtracting. The caller passes only partitions whose rows all reached the
+table: the staged dataset also holds rows of failed batches. rebuild()
+recomputes everything from the staged dataset.
+"""
+
+import argparse
+import os
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from staged_store import DATASET_DIR, list_partitions, read_staged, widen_float32
+
+# ---------------- Config ----------------
+BASE_DIR = Path(__file__).resolve().parent
+STORE_PATH = BASE_DIR / "data" / "processed" / "aggregates.parquet"
+
+CUBE_KEYS = ["city", "hour", "risk_flag"]
+AGG_VALUE_COLUMNS = ["pm2_5", "severity_score"]
+
+STORE_KEYS = ["city", "date", "hour", "risk_flag"]
+STORE_VALUE_COLUMNS = ["pm2_5", "pm10", "ozone", "severity_score"]
+
+# staged column names -> table (analysis) column names
+STAGED_TO_DB = {"severity": "severity_score", "risk": "risk_flag", "aqi_pm25": "aqi_category"}
+
+
+# ---------------- Cube ----------------
+
+def _codes(values: pd.Series):
+    """(int codes with -1 for missing, uniques) for a key column."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(dtype="int64"), values.cat.categories
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes.astype("int64"), uniques
+
+
+def compute_aggregates(df: pd.DataFrame, keys: List[str] = CUBE_KEYS,
+                       value_cols: List[str] = AGG_VALUE_COLUMNS) -> pd.DataFrame:
+    """
+    One pass over df: per combination of `keys` the number of rows and, for each
+    value column, the sum, count and max of its non-missing values. Missing keys
+    get their own (None) cell so no row is lost.
+    """
+    keys = [k for k in keys if k in df.columns]
+    value_cols = [c for c in value_cols if c in df.columns]
+
+    cell = np.zeros(len(df), dtype="int64")
+    decoded = []
+    n_cells = 1
+    for k in keys:
+        codes, uniques = _codes(df[k])
+        size = len(uniques) + 1  # slot 0 = missing
+        cell = cell * size + (codes + 1)
+        n_cells *= size
+        decoded.append((k, uniques, size))
+
+    data = {"rows": np.bincount(cell, minlength=n_cells)}
+    for c in value_cols:
+        values = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype="float64")
+        valid = ~np.isnan(values)
+        cells = cell[valid]
+        data[f"{c}_sum"] = np.bincount(cells, weights=values[valid], minlength=n_cells)
+        data[f"{c}_count"] = np.bincount(cells, minlength=n_cells)
+        top = np.full(n_cells, -np.inf)
+        np.maximum.at(top, cells, values[valid])
+        data[f"{c}_max"] = np.where(np.isneginf(top), np.nan, top)
+
+    occupied = np.flatnonzero(data["rows"])
+    cube = pd.DataFrame({name: arr[occupied] for name, arr in data.items()})
+    rest = occupied
+    for k, uniques, size in reversed(decoded):
+        code = rest % size - 1
+        rest = rest // size
+        labels = np.asarray(uniques, dtype=object)
+        cube.insert(0, k, np.where(code >= 0, labels[np.maximum(code, 0)] if len(labels) else None, None))
+    return cube
+
+
+def rollup(cube: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """Cube combined over everything but `keys` (missing key values dropped, like groupby)."""
+    how = {}
+    for c in cube.columns:
+        if c == "rows" or c.endswith("_sum") or c.endswith("_count"):
+            how[c] = "sum"
+        elif c.endswith("_max"):
+            how[c] = "max"
+    return cube.groupby(keys).agg(how)
+
+
+def mean_of(rolled: pd.DataFrame, col: str) -> pd.Series:
+    """Mean of col per group of a rollup (NaN where the group has no values)."""
+    return rolled[f"{col}_sum"] / rolled[f"{col}_count"].where(rolled[f"{col}_count"] > 0)
+
+
+# ---------------- Store ----------------
+
+def staged_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """Store-grain cube of staged rows (staged column names)."""
+    rows = widen_float32(df.rename(columns=STAGED_TO_DB))
+    rows = rows.assign(date=pd.to_datetime(rows["time"], utc=True).dt.strftime("%Y-%m-%d"))
+    return compute_aggregates(rows, STORE_KEYS, STORE_VALUE_COLUMNS)
+
+
+def _utc(ts) -> pd.Timestamp:
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+class AggregateStore:
+    def __init__(self, path: Path = STORE_PATH, staged_root: Path = DATASET_DIR):
+        self.path = Path(path)
+        self.staged_root = Path(staged_root)
+        self.cube = pd.read_parquet(self.path) if self.path.exists() else pd.DataFrame(columns=STORE_KEYS + ["rows"])
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        self.cube.to_parquet(tmp, index=False)
+        os.replace(tmp, self.path)
+
+    def refresh(self, partitions: Iterable[Tuple[str, object]]) -> int:
+        """
+        Recompute the cells of the given (city, date) partitions from the staged
+        dataset (one read, one cube) and save. Returns the number of partitions
+        refreshed.
+        """
+        partitions = {(str(city), pd.Timestamp(day).strftime("%Y-%m-%d")) for city, day in partitions}
+        if not partitions:
+            return 0
+        rows = read_staged(self.staged_root, partitions=[(city, pd.Timestamp(day).date())
+                                                         for city, day in sorted(partitions)])
+        cubes = [] if rows.empty else [staged_cube(rows)]
+        if not self.cube.empty:
+            touched = pd.MultiIndex.from_tuples(sorted(partitions), names=["city", "date"])
+            keep = ~pd.MultiIndex.from_frame(self.cube[["city", "date"]]).isin(touched)
+            cubes.insert(0, self.cube[keep])
+        self.cube = pd.concat(cubes, ignore_index=True) if cubes else self.cube.iloc[0:0]
+        self.save()
+        return len(partitions)
+
+    def rebuild(self) -> int:
+        """Drop everything and recompute every partition of the staged dataset."""
+        self.cube = self.cube.iloc[0:0]
+        return self.refresh((city, day) for city, day in list_partitions(self.staged_root))
+
+    def window(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """Cells with start <= date+hour < end (ISO strings, both optional)."""
+        cube = self.cube
+        if cube.empty or (start is None and end is None):
+            return cube
+        ts = pd.to_datetime(cube["date"], utc=True) + pd.to_timedelta(pd.to_numeric(cube["hour"]), unit="h")
+        mask = pd.Series(True, index=cube.index)
+        if start is not None:
+            mask &= ts >= _utc(start)
+        if end is not None:
+            mask &= ts < _utc(end)
+        return cube[mask]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the air-quality aggregate store")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every cell from the staged dataset")
+    args = parser.parse_args()
+    store = AggregateStore()
+    if args.rebuild:
+        n = store.rebuild()
+        print(f"Rebuilt {STORE_PATH} from {n} staged partitions ({len(store.cube)} cells)")
+    else:
+        print(f"{STORE_PATH}: {len(store.cube)} cells")
@@ -0,0 +1,100 @@
+"""
+bench_analysis.py
+
+Parity check and benchmark for the single-pass aggregates in etl_analysis.py
+(aggregate_store.compute_aggregates + roll-ups) against the previous approach of one groupby
+per KPI / export / plot.
+
+Usage:
+    python bench_analysis.py               # 50M rows
+    python bench_analysis.py --rows 5000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import aggregate_store as agg
+import etl_analysis as ea
+
+CITIES = ["Bengaluru", "Delhi", "Hyderabad", "Kolkata", "Mumbai"]
+RISKS = ["High Risk", "Low Risk", "Moderate Risk"]
+
+
+def make_rows(n: int, seed: int = 0) -> pd.DataFrame:
+    """Rows shaped like fetch_data() output; city/risk as categoricals to keep 50M rows in memory."""
+    rng = np.random.default_rng(seed)
+    pm25 = rng.gamma(2.0, 40.0, n)
+    pm25[rng.random(n) < 0.03] = np.nan
+    severity = pm25 * 5 + rng.gamma(2.0, 30.0, n)
+    return pd.DataFrame({
+        "city": pd.Categorical.from_codes(rng.integers(0, len(CITIES), n, dtype="int8"), CITIES),
+        "hour": rng.integers(0, 24, n, dtype="int8"),
+        "pm2_5": pm25,
+        "severity_score": severity,
+        "risk_flag": pd.Categorical.from_codes(
+            np.where(severity > 400, 0, np.where(severity > 200, 2, 1)).astype("int8"), RISKS),
+    })
+
+
+# ---- previous implementation: one grouped pass per result ----
+
+def legacy(df: pd.DataFrame):
+    pm25_by_city = df.groupby("city", observed=True)["pm2_5"].mean().sort_values(ascending=False)
+    sev_by_city = df.groupby("city", observed=True)["severity_score"].mean().sort_values(ascending=False)
+    risk_counts = df["risk_flag"].value_counts(dropna=True)
+    hour_pm25 = df.groupby("hour")["pm2_5"].mean().sort_values(ascending=False)
+    counts = df.groupby(["city", "risk_flag"], observed=True).size().reset_index(name="count")
+    counts["percentage"] = counts["count"] / counts.groupby("city")["count"].transform("sum") * 100
+    bar = df.groupby(["city", "risk_flag"], observed=True).size().unstack(fill_value=0)
+    line = df.groupby("hour")["pm2_5"].mean().sort_index()
+    return pm25_by_city, sev_by_city, risk_counts, hour_pm25, counts, bar, line
+
+
+def single_pass(df: pd.DataFrame):
+    cube = agg.compute_aggregates(df)
+    summary = ea.compute_kpi_metrics(cube)
+    risk = ea.city_risk_distribution(cube)
+    bar = agg.rollup(cube, ["city", "risk_flag"])["rows"].unstack(fill_value=0)
+    line = agg.mean_of(agg.rollup(cube, ["hour"]), "pm2_5").sort_index()
+    return cube, summary, risk, bar, line
+
+
+def check_parity(n: int = 200_000) -> None:
+    df = make_rows(n, seed=1)
+    pm25_by_city, sev_by_city, risk_counts, hour_pm25, counts, bar, line = legacy(df)
+    cube, summary, risk, bar2, line2 = single_pass(df)
+    s = summary.iloc[0]
+    assert s["city_highest_avg_pm25"] == pm25_by_city.index[0]
+    assert np.isclose(s["highest_avg_pm25_value"], pm25_by_city.iloc[0])
+    assert s["city_highest_severity"] == sev_by_city.index[0]
+    assert s["worst_hour_pm25"] == hour_pm25.index[0]
+    assert int(cube["rows"].sum()) == n
+    assert risk["count"].tolist() == counts["count"].tolist()
+    assert np.allclose(risk["percentage"], counts["percentage"])
+    assert (bar2.to_numpy() == bar.to_numpy()).all()
+    assert np.allclose(line2.to_numpy(), line.to_numpy())
+    print(f"Parity OK on {n:,} rows")
+
+
+def benchmark(rows: int) -> None:
+    df = make_rows(rows)
+    t0 = time.perf_counter()
+    legacy(df)
+    old = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    cube = single_pass(df)[0]
+    new = time.perf_counter() - t0
+    print(f"Rows                : {rows:,} (cube: {len(cube)} cells)")
+    print(f"groupby per result  : {old:.2f}s")
+    print(f"single pass         : {new:.2f}s ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--rows", type=int, default=50_000_000)
+    args = parser.parse_args()
+    check_parity()
+    benchmark(args.rows)
@@ -0,0 +1,143 @@
+"""
+bench_extract.py
+
+Rate-limit check for sharded extraction: extract_due_stations(processes=N)
+against the synthetic API (synthetic_api.py), in a scratch copy of this
+directory as in bench_pipeline.py.
+
+Every request the API answers is logged with its start and end time (all
+worker processes append to one file). The check fails when, over any interval,
+more requests started than the token bucket allows
+(RATE_LIMIT_PER_SEC * seconds + RATE_LIMIT_BURST), or when more than
+MAX_PER_HOST requests were in flight at once.
+
+Usage:
+    python bench_extract.py                          # 3000 stations with 1, 2 and 4 processes
+    python bench_extract.py --stations 10000 --processes 4 8 --latency 0.3
+"""
+
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bench_pipeline import scratch_copy
+
+REQUEST_LOG = "bench_extract_requests.log"
+CLOCK_SLACK = 1  # requests: the log is written a moment after the token was taken
+
+
+# ---------------- one run (inside the scratch copy) ----------------
+
+def logged_transport(log_path: Path, **kwargs):
+    from synthetic_api import SyntheticTransport
+
+    class LoggedTransport(SyntheticTransport):
+        """SyntheticTransport appending "<start> <end>" per request to log_path."""
+
+        def send(self, request, **send_kwargs):
+            start = time.time()
+            resp = super().send(request, **send_kwargs)
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(f"{start:.6f} {time.time():.6f}\n")
+            return resp
+
+    return LoggedTransport(**kwargs)
+
+
+def peak_burst(starts: np.ndarray, rate: float) -> float:
+    """
+    Smallest burst a token bucket of `rate` needs to allow these request starts:
+    max over i <= j of (j - i + 1) - rate * (t_j - t_i).
+    """
+    a = np.arange(len(starts)) - rate * np.sort(starts)
+    return float((a - np.minimum.accumulate(a)).max() + 1) if len(a) else 0.0
+
+
+def peak_in_flight(starts: np.ndarray, ends: np.ndarray) -> int:
+    # at equal times an end is counted before a start
+    events = np.concatenate([np.stack([ends, np.zeros_like(ends)], 1), np.stack([starts, np.ones_like(starts)], 1)])
+    events = events[np.lexsort((events[:, 1], events[:, 0]))]
+    return int(np.cumsum(np.where(events[:, 1] == 1, 1, -1)).max()) if len(events) else 0
+
+
+def run_extract(args) -> dict:
+    import extract
+    import station_registry
+    from synthetic_api import synthetic_stations, write_registry
+
+    log_path = Path("data") / REQUEST_LOG
+    write_registry(station_registry.REGISTRY_FILE, synthetic_stations(args.stations, extract.CITIES))
+    extract.mount_transport(logged_transport(log_path, latency=args.latency))
+    t0 = time.perf_counter()
+    extract.extract_due_stations(processes=args.processes[0])
+    seconds = time.perf_counter() - t0
+
+    times = np.loadtxt(log_path, ndmin=2)
+    return {
+        "requests": len(times),
+        "seconds": seconds,
+        "peak_burst": peak_burst(times[:, 0], extract.RATE_LIMIT_PER_SEC),
+        "peak_in_flight": peak_in_flight(times[:, 0], times[:, 1]),
+        "rate_limit": extract.RATE_LIMIT_PER_SEC,
+        "burst": extract.RATE_LIMIT_BURST,
+        "max_per_host": extract.MAX_PER_HOST,
+    }
+
+
+# ---------------- driver ----------------
+
+def check(processes: int, args) -> bool:
+    root, workdir = scratch_copy(f"bench_extract_p{processes}_")
+    out = workdir / "data" / "bench_extract.json"
+    keep = args.keep
+    try:
+        with open(workdir / "bench_extract.log", "w", encoding="utf-8") as log:
+            proc = subprocess.run(
+                [sys.executable, Path(__file__).name, "--run", "--result", str(out),
+                 "--processes", str(processes), "--stations", str(args.stations), "--latency", str(args.latency)],
+                cwd=workdir, stdout=log, stderr=subprocess.STDOUT,
+            )
+        if proc.returncode != 0:
+            keep = True  # the log is in there
+            print(f"\n{processes} processes: extract failed (work dir {workdir})")
+            return False
+        r = json.loads(out.read_text(encoding="utf-8"))
+    finally:
+        if keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    rate_ok = r["peak_burst"] <= r["burst"] + CLOCK_SLACK
+    hosts_ok = r["peak_in_flight"] <= r["max_per_host"]
+    print(f"\n=== {processes} processes: {r['requests']} requests in {r['seconds']:.1f}s "
+          f"({r['requests'] / r['seconds']:.1f}/s, limit {r['rate_limit']}/s) ===")
+    print(f"  burst needed: {r['peak_burst']:.1f} of {r['burst']} ({'OK' if rate_ok else 'EXCEEDED'})")
+    print(f"  in flight:    {r['peak_in_flight']} of {r['max_per_host']} ({'OK' if hosts_ok else 'EXCEEDED'})")
+    return rate_ok and hosts_ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--stations", type=int, default=3000, help="registry stations (50 per request)")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4], help="extract processes to check")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean API latency (seconds)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directories")
+    # internal: one run inside a scratch copy
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(run_extract(args), f)
+    else:
+        results = [check(p, args) for p in args.processes]
+        if not all(results):
+            raise SystemExit("❌ Rate limit exceeded.")
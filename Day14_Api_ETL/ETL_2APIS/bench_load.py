@@ -0,0 +1,88 @@
+"""
+bench_load.py
+
+Parity check and benchmark for the column-wise load path in load.py
+(normalize_frame + encode_batches) against the per-row path
+(to_dict(orient="records") + normalize_row + json.dumps per batch).
+
+Usage:
+    python bench_load.py               # 2M rows
+    python bench_load.py --rows 500000
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+import load
+
+POLLUTANT_RANGES = {
+    "pm10": 400,
+    "pm2_5": 350,
+    "carbon_monoxide": 2000,
+    "nitrogen_dioxide": 150,
+    "sulphur_dioxide": 80,
+    "ozone": 200,
+    "uv_index": 12,
+}
+
+
+def make_staged(n: int, seed: int = 0) -> pd.DataFrame:
+    """Rows shaped like load.read_staged_data() output, ~5% missing readings."""
+    rng = np.random.default_rng(seed)
+    cities = np.array(["Delhi", "Mumbai", "Bengaluru", "Kolkata", "Hyderabad"], dtype=object)
+    time = pd.Timestamp("2025-01-01", tz="UTC") + pd.to_timedelta(rng.integers(0, 24 * 365, n), unit="h")
+    df = pd.DataFrame({"city": cities[rng.integers(0, len(cities), n)], "time": time, "hour": time.hour})
+    for col, hi in POLLUTANT_RANGES.items():
+        values = np.round(rng.uniform(0, hi, size=n), 1)
+        values[rng.random(n) < 0.05] = np.nan
+        df[col] = values
+    df["aqi_pm25"] = np.where(df["pm2_5"] <= 50, "Good", np.where(df["pm2_5"].isna(), None, "Moderate"))
+    df["severity"] = df["pm2_5"].fillna(0) * 5.0 + df["pm10"].fillna(0) * 3.0
+    df["risk"] = np.where(df["severity"] > 400, "High Risk", "Low Risk")
+    return df
+
+
+def per_row(df: pd.DataFrame):
+    records = [load.normalize_row(r) for r in df.to_dict(orient="records")]
+    return [json.dumps(records[i:i + load.BATCH_SIZE]).encode("utf-8")
+            for i in range(0, len(records), load.BATCH_SIZE)]
+
+
+def column_wise(df: pd.DataFrame):
+    return list(load.encode_batches(load.normalize_frame(df), load.BATCH_SIZE))
+
+
+def check_parity(n: int = 50_000) -> None:
+    df = make_staged(n, seed=1)
+    expected = [row for body in per_row(df) for row in json.loads(body)]
+    got = [row for body in column_wise(df) for row in json.loads(body)]
+    assert expected == got, "column-wise rows differ from normalize_row"
+    print(f"Parity OK on {n:,} rows")
+
+
+def benchmark(rows: int) -> None:
+    sample = make_staged(100_000)
+    t0 = time.perf_counter()
+    per_row(sample)
+    row_rate = len(sample) / (time.perf_counter() - t0)
+
+    df = make_staged(rows)
+    t0 = time.perf_counter()
+    n_bytes = sum(len(b) for b in column_wise(df))
+    col = time.perf_counter() - t0
+
+    print(f"Rows               : {rows:,} ({n_bytes / 1e6:,.0f} MB of JSON)")
+    print(f"per-row normalize  : {row_rate:,.0f} rows/s (~{rows / row_rate:,.0f}s for all rows)")
+    print(f"column-wise        : {col:.2f}s ({rows / col:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    args = parser.parse_args()
+    check_parity()
+    benchmark(args.rows)
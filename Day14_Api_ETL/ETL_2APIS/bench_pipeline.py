@@ -0,0 +1,208 @@
+"""
+bench_pipeline.py
+
+Offline benchmark of the whole air-quality pipeline at multiples of today's
+volume (5 cities x 5 days of hourly readings): extract against the synthetic
+API (synthetic_api.py), transform, load into a fake Supabase (fake_supabase.py)
+and analysis.
+
+Each scale runs in a scratch copy of this directory (and of the shared
+etl_common package, in the same layout), so the real data/ is never touched.
+Each stage runs in its own process, so peak RSS is per stage; the peak of the
+processes a stage started (transform's parser pool, the plot renderers) is
+reported separately. Timings and row counts come from run_metrics. A stage
+slower than its MIN_ROWS_PER_SEC fails the run.
+
+Usage:
+    python bench_pipeline.py                    # 10x, 100x and 1000x
+    python bench_pipeline.py --scales 10 100 --days 7 --null-rate 0.1
+    python bench_pipeline.py --latency 0.2 --error-rate 0.02 --db-latency 0.05
+"""
+
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BASE_DIR.parents[1]
+sys.path.append(str(REPO_ROOT))  # for etl_common
+STAGES = ["extract", "transform", "load", "analyze"]
+BASE_STATIONS = 5  # len(extract.CITIES)
+DB_FILE = "fake_supabase.pkl"
+# throughput floors (rows/s, with --latency/--db-latency 0), well under what one core does today
+MIN_ROWS_PER_SEC = {"extract": 20_000, "transform": 5_000, "load": 3_000}
+
+
+# ---------------- one stage (runs inside the scratch copy) ----------------
+
+def _peak_mb(who) -> float:
+    import resource
+    peak = resource.getrusage(who).ru_maxrss  # KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_stage(stage: str, args) -> dict:
+    import resource
+
+    from fake_supabase import FakeSupabase
+    from etl_common.run_metrics import RUN
+
+    db_path = Path("data") / DB_FILE
+    RUN.start(f"bench_{stage}", BASE_DIR / "data" / "metrics")
+    result = {}
+    if stage == "extract":
+        import extract
+        import station_registry
+        from synthetic_api import SyntheticTransport, synthetic_stations, write_registry
+
+        write_registry(station_registry.REGISTRY_FILE, synthetic_stations(args.stations, extract.CITIES))
+        transport = SyntheticTransport(days=args.days, null_rate=args.null_rate, latency=args.latency,
+                                       error_rate=args.error_rate)
+        extract.mount_transport(transport)
+        with RUN.stage(stage):
+            extract.extract_due_stations()
+        result.update(rows=transport.rows_served, requests=transport.requests, errors=transport.errors)
+    elif stage == "transform":
+        import transform
+        with RUN.stage(stage):
+            transform.main()
+    elif stage == "load":
+        import load
+        client = FakeSupabase(latency=args.db_latency)
+        with RUN.stage(stage):
+            load.main(client=client)
+        client.save(db_path)
+        result["table_rows"] = client.count(load.TABLE_NAME)
+    else:
+        import etl_analysis
+        client = FakeSupabase.load(db_path, latency=args.db_latency)
+        with RUN.stage(stage):
+            etl_analysis.main(client=client)
+
+    entry = RUN.to_dict()["stages"][stage]
+    if entry["status"] != "ran":
+        raise RuntimeError(f"{stage} did not finish")
+    result.setdefault("rows", entry["rows_in"] if stage == "analyze" else entry["rows_out"])
+    result.update(
+        seconds=entry["wall_seconds"],
+        cpu_seconds=entry["cpu_seconds"],
+        peak_rss_mb=round(_peak_mb(resource.RUSAGE_SELF), 1),
+        children_peak_rss_mb=round(_peak_mb(resource.RUSAGE_CHILDREN), 1),
+        bytes_read=entry["bytes_read"],
+        bytes_written=entry["bytes_written"],
+    )
+    return result
+
+
+# ---------------- driver ----------------
+
+def stage_args(args, stations: int) -> list:
+    return [
+        "--stations", str(stations), "--days", str(args.days), "--null-rate", str(args.null_rate),
+        "--latency", str(args.latency), "--error-rate", str(args.error_rate), "--db-latency", str(args.db_latency),
+    ]
+
+
+def scratch_copy(prefix: str):
+    """Copy this directory and etl_common to a temp root, in the repo's layout. Returns (root, workdir)."""
+    root = Path(tempfile.mkdtemp(prefix=prefix))
+    shutil.copytree(REPO_ROOT / "etl_common", root / "etl_common",
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    workdir = root / BASE_DIR.relative_to(REPO_ROOT)
+    (workdir / "data").mkdir(parents=True)
+    for f in BASE_DIR.glob("*.py"):
+        shutil.copy2(f, workdir)
+    return root, workdir
+
+
+def bench_scale(scale: int, args) -> list:
+    stations = BASE_STATIONS * scale
+    root, workdir = scratch_copy(f"bench_pipeline_x{scale}_")
+
+    results = []
+    keep = args.keep
+    try:
+        for stage in STAGES:
+            out = workdir / "data" / f"bench_{stage}.json"
+            with open(workdir / f"bench_{stage}.log", "w", encoding="utf-8") as log:
+                proc = subprocess.run(
+                    [sys.executable, Path(__file__).name, "--stage", stage, "--result", str(out)]
+                    + stage_args(args, stations),
+                    cwd=workdir, stdout=log, stderr=subprocess.STDOUT,
+                )
+            if proc.returncode != 0:
+                keep = True  # the logs are in there
+                tail = (workdir / f"bench_{stage}.log").read_text(encoding="utf-8").splitlines()[-20:]
+                raise RuntimeError(f"{stage} failed at {scale}x (work dir {workdir}):\n" + "\n".join(tail))
+            results.append({"stage": stage, **json.loads(out.read_text(encoding="utf-8"))})
+    finally:
+        if keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def print_results(scale: int, stations: int, days: int, results: list, throttled: bool = False) -> bool:
+    """
+    Print one scale's table; False if the row count is off or a stage is under its
+    throughput floor (not counted when throttled, i.e. latency was simulated).
+    """
+    expected = stations * days * 24
+    print(f"\n=== {scale}x: {stations:,} stations x {days} days = {expected:,} hourly rows ===")
+    print(f"  {'stage':<10} {'rows':>10} {'seconds':>9} {'rows/s':>10} {'cpu s':>8} {'MB in':>8} {'MB out':>8} "
+          f"{'peak MB':>8} {'children':>8}")
+    slow = []
+    for r in results:
+        rate = r["rows"] / r["seconds"] if r["seconds"] else float("inf")
+        print(f"  {r['stage']:<10} {r['rows']:>10,} {r['seconds']:>9.2f} {rate:>10,.0f} {r['cpu_seconds']:>8.2f} "
+              f"{r['bytes_read'] / 1e6:>8.1f} {r['bytes_written'] / 1e6:>8.1f} "
+              f"{r['peak_rss_mb']:>8.0f} {r['children_peak_rss_mb']:>8.0f}")
+        if rate < MIN_ROWS_PER_SEC.get(r["stage"], 0):
+            slow.append(f"{r['stage']} {rate:,.0f} rows/s (floor {MIN_ROWS_PER_SEC[r['stage']]:,})")
+    extract, load = results[0], results[2]
+    if extract["errors"]:
+        print(f"  {extract['errors']} of {extract['requests']} API requests answered with errors")
+    status = "OK" if load["table_rows"] == expected else "MISMATCH"
+    print(f"  Table rows: {load['table_rows']:,} of {expected:,} expected ({status})")
+    for s in slow:
+        print(f"  Too slow: {s}" + (" (latency set, not counted)" if throttled else ""))
+    return status == "OK" and not (slow and not throttled)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100, 1000],
+                        help="multiples of today's volume (5 stations)")
+    parser.add_argument("--days", type=int, default=5, help="days of hourly readings per payload")
+    parser.add_argument("--null-rate", type=float, default=0.05, help="fraction of null readings")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean API latency (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of API requests that fail")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="mean fake Supabase latency (seconds)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directories")
+    # internal: run one stage inside a scratch copy
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--stations", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(run_stage(args.stage, args), f)
+    else:
+        ok = True
+        for scale in args.scales:
+            try:
+                results = bench_scale(scale, args)
+            except RuntimeError as e:
+                print(f"\n{e}")
+                ok = False
+                continue
+            throttled = bool(args.latency or args.db_latency)
+            ok = print_results(scale, BASE_STATIONS * scale, args.days, results, throttled) and ok
+        if not ok:
+            raise SystemExit("❌ Benchmark failed (see above).")
@@ -0,0 +1,96 @@
+"""
+bench_transform.py
+
+Parity check and benchmark for the vectorized derived features in transform.py
+(aqi_labels, severity_scores, classify_risks) against the original row-wise
+.apply() path.
+
+Usage:
+    python bench_transform.py               # 10M rows
+    python bench_transform.py --rows 1000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import transform
+
+POLLUTANT_RANGES = {
+    "pm10": 400,
+    "pm2_5": 350,
+    "carbon_monoxide": 2000,
+    "nitrogen_dioxide": 150,
+    "sulphur_dioxide": 80,
+    "ozone": 200,
+    "uv_index": 12,
+}
+
+# values sitting on or between the AQI range edges (the 50–51 style gaps)
+EDGE_PM25 = [0, 50, 50.0001, 50.5, 50.9999, 51, 100, 100.5, 101, 200, 200.5, 201, 300, 300.0001, 301, -1, np.nan]
+
+
+def make_rows(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = {}
+    for col, hi in POLLUTANT_RANGES.items():
+        values = rng.uniform(0, hi, size=n)
+        values[rng.random(n) < 0.05] = np.nan  # ~5% missing readings
+        data[col] = values
+    df = pd.DataFrame(data)
+    k = min(n, len(EDGE_PM25))
+    df.loc[: k - 1, "pm2_5"] = EDGE_PM25[:k]
+    return df
+
+
+def row_wise(df: pd.DataFrame) -> pd.DataFrame:
+    out = pd.DataFrame(index=df.index)
+    out["aqi_pm25"] = df["pm2_5"].apply(transform.aqi_label_from_pm25)
+    out["severity"] = df.apply(transform.compute_severity, axis=1)
+    out["risk"] = out["severity"].apply(transform.classify_risk)
+    return out
+
+
+def vectorized(df: pd.DataFrame) -> pd.DataFrame:
+    out = pd.DataFrame(index=df.index)
+    out["aqi_pm25"] = transform.aqi_labels(df["pm2_5"])
+    out["severity"] = transform.severity_scores(df)
+    out["risk"] = transform.classify_risks(out["severity"])
+    return out
+
+
+def check_parity(n: int = 200_000) -> None:
+    df = make_rows(n, seed=1)
+    expected = row_wise(df)
+    got = vectorized(df)
+    for col in ["aqi_pm25", "risk"]:
+        mismatch = (expected[col].fillna("<None>") != got[col].fillna("<None>")).sum()
+        assert mismatch == 0, f"{col}: {mismatch} rows differ"
+    assert np.array_equal(expected["severity"].to_numpy(), got["severity"].to_numpy()), "severity differs"
+    print(f"Parity OK on {n:,} rows (incl. NaN and AQI edge values)")
+
+
+def benchmark(rows: int) -> None:
+    sample = make_rows(100_000)
+    t0 = time.perf_counter()
+    row_wise(sample)
+    apply_rate = len(sample) / (time.perf_counter() - t0)
+
+    df = make_rows(rows)
+    t0 = time.perf_counter()
+    vectorized(df)
+    vec = time.perf_counter() - t0
+
+    print(f"Rows             : {rows:,}")
+    print(f"row-wise .apply  : {apply_rate:,.0f} rows/s (~{rows / apply_rate:,.0f}s for all rows)")
+    print(f"vectorized       : {vec:.2f}s ({rows / vec:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    args = parser.parse_args()
+    check_parity()
+    benchmark(args.rows)
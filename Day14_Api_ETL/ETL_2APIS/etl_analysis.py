@@ -23,22 +23,46 @@ Bar chart of risk flags per city
 Line chart of hourly PM2.5 trends
 Scatter: severity_score vs pm2_5'''
 
+import argparse
 import os
 import logging
-
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # repo root, for etl_common
+from aggregate_store import AggregateStore, compute_aggregates, mean_of, rollup
+from etl_common.plot_render import PLOT_WORKERS, histogram, line, render_figures, scatter, stacked_bar
+from etl_common.run_metrics import RUN
+
 # --- Config ---
 load_dotenv()
 
+BASE_DIR = Path(__file__).resolve().parent
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
 TABLE_NAME = "air_quality_data"
-OUTPUT_DIR = os.path.join("data", "processed")
+
+# Only the columns the analysis uses (id is the pagination key)
+ANALYSIS_COLUMNS = ["id", "city", "time", "hour", "pm2_5", "pm10", "ozone", "severity_score", "risk_flag"]
+FLOAT_COLUMNS = ["pm2_5", "pm10", "ozone", "severity_score"]
+
+# PostgREST caps a response at max-rows (1000 by default): read in pages of that
+# size, keyset-paginated on id, with FETCH_WORKERS id ranges fetched concurrently
+PAGE_SIZE = 1000
+IDS_PER_RANGE = PAGE_SIZE * 20
+FETCH_WORKERS = 4
+OUTPUT_DIR = os.path.join(BASE_DIR, "data", "processed")
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -55,60 +79,134 @@ def get_supabase_client() -> Client:
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
 
-def fetch_data(client: Client) -> pd.DataFrame:
+def _filtered(client: Client, columns: str, start: Optional[str], end: Optional[str]):
+    query = client.table(TABLE_NAME).select(columns)
+    if start is not None:
+        query = query.gte("time", start)
+    if end is not None:
+        query = query.lt("time", end)
+    return query
+
+
+def _id_bounds(client: Client, start: Optional[str], end: Optional[str]):
+    """(lowest id, highest id) of the rows in the time window, or None if there are none."""
+    first = _filtered(client, "id", start, end).order("id").limit(1).execute().data
+    if not first:
+        return None
+    last = _filtered(client, "id", start, end).order("id", desc=True).limit(1).execute().data
+    return first[0]["id"], last[0]["id"]
+
+
+def _fetch_range(client: Client, columns: List[str], start: Optional[str], end: Optional[str],
+                 lo: int, hi: int) -> Dict[str, list]:
+    """
+    All rows with lo <= id < hi, one keyset page (id > last seen id) at a time, as column lists.
+    Stops at an empty page, not a short one: PostgREST's max-rows may cap pages below PAGE_SIZE.
+    """
+    out = {c: [] for c in columns}
+    last_id = lo - 1
+    while True:
+        t0 = time.perf_counter()
+        page = (
+            _filtered(client, ",".join(columns), start, end)
+            .gt("id", last_id)
+            .lt("id", hi)
+            .order("id")
+            .limit(PAGE_SIZE)
+            .execute()
+            .data
+        )
+        RUN.observe_http("analyze", time.perf_counter() - t0)
+        if not page:
+            return out
+        for c in columns:
+            out[c].extend(row.get(c) for row in page)
+        last_id = page[-1]["id"]
+
+
+def _columns_to_frame(parts: List[Dict[str, list]], columns: List[str]) -> pd.DataFrame:
+    """Typed column arrays from the fetched pages (floats with NaN, tz-aware time, Int64 hour)."""
+    data = {}
+    for c in columns:
+        values = [v for part in parts for v in part[c]]
+        if c in FLOAT_COLUMNS:
+            data[c] = np.array(values, dtype="float64")  # None -> NaN
+        elif c == "time":
+            data[c] = pd.to_datetime(values, utc=True)
+        elif c in ("hour", "id"):
+            data[c] = pd.array(values, dtype="Int64")
+        else:
+            data[c] = np.array(values, dtype=object)
+    return pd.DataFrame(data)
+
+
+def fetch_data(client: Client, start: Optional[str] = None, end: Optional[str] = None,
+               columns: List[str] = ANALYSIS_COLUMNS, workers: int = FETCH_WORKERS) -> pd.DataFrame:
     """
-    Load full table from Supabase into a pandas DataFrame.
-    Adjust select() if you want specific columns only.
+    Load the analysis columns of the rows with start <= time < end (ISO strings,
+    both optional) into a pandas DataFrame. The id range of the window is split
+    into slices fetched concurrently, each one page by page.
     """
-    logger.info("Fetching data from Supabase...")
-    resp = client.table(TABLE_NAME).select("*").execute()  # [web:1]
-    data = resp.data  # supabase-py returns .data as list[dict]
-    df = pd.DataFrame(data)
+    logger.info("Fetching data from Supabase (time window %s .. %s)...", start or "-", end or "-")
+    columns = list(dict.fromkeys(["id"] + list(columns)))
+    bounds = _id_bounds(client, start, end)
+    if bounds is None:
+        logger.info("Loaded 0 rows from Supabase")
+        return _columns_to_frame([], columns)
+
+    lo, hi = bounds
+    ranges = [(r, min(r + IDS_PER_RANGE, hi + 1)) for r in range(lo, hi + 1, IDS_PER_RANGE)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(lambda r: _fetch_range(client, columns, start, end, *r), ranges))
+    df = _columns_to_frame(parts, columns)
+
+    logger.info("Loaded %d rows from Supabase (%d id ranges)", len(df), len(ranges))
+    return df
 
-    # Ensure time is datetime and hour is int
-    if "time" in df.columns:
-        df["time"] = pd.to_datetime(df["time"])
-    if "hour" in df.columns:
-        df["hour"] = pd.to_numeric(df["hour"], errors="coerce").astype("Int64")
 
-    logger.info("Loaded %d rows from Supabase", len(df))
-    return df
+# ---------------- Aggregates ----------------
+# Every KPI, CSV export and aggregate plot below is a roll-up of one small table
+# ("cube", see aggregate_store.py): row counts plus sums/counts/max of the
+# averaged columns per (city, hour, risk_flag), built in a single pass over the
+# rows, or read from the persistent aggregate store.
 
 
-def compute_kpi_metrics(df: pd.DataFrame) -> pd.DataFrame:
+def compute_kpi_metrics(cube: pd.DataFrame) -> pd.DataFrame:
     """
-    A. KPI Metrics
+    A. KPI Metrics (from the aggregates cube)
     - City with highest average PM2.5
     - City with highest average severity score
     - Percentage of High/Moderate/Low risk hours
     - Hour of day with worst AQI (highest avg pm2_5)
     """
     metrics = {}
+    by_city = rollup(cube, ["city"]) if "city" in cube.columns else pd.DataFrame()
 
     # City with highest avg PM2.5
-    pm25_by_city = df.groupby("city")["pm2_5"].mean().sort_values(ascending=False)
-    if not pm25_by_city.empty:
-        metrics["city_highest_avg_pm25"] = pm25_by_city.index[0]
-        metrics["highest_avg_pm25_value"] = pm25_by_city.iloc[0]
+    if "pm2_5_sum" in by_city.columns:
+        pm25_by_city = mean_of(by_city, "pm2_5").sort_values(ascending=False)
+        if not pm25_by_city.empty:
+            metrics["city_highest_avg_pm25"] = pm25_by_city.index[0]
+            metrics["highest_avg_pm25_value"] = pm25_by_city.iloc[0]
 
     # City with highest avg severity_score
-    if "severity_score" in df.columns:
-        sev_by_city = df.groupby("city")["severity_score"].mean().sort_values(ascending=False)
+    if "severity_score_sum" in by_city.columns:
+        sev_by_city = mean_of(by_city, "severity_score").sort_values(ascending=False)
         if not sev_by_city.empty:
             metrics["city_highest_severity"] = sev_by_city.index[0]
             metrics["highest_severity_value"] = sev_by_city.iloc[0]
 
     # Percentage of High/Moderate/Low risk hours
-    if "risk_flag" in df.columns:
-        risk_counts = df["risk_flag"].value_counts(dropna=True)
+    if "risk_flag" in cube.columns:
+        risk_counts = rollup(cube, ["risk_flag"])["rows"]
         risk_pct = (risk_counts / risk_counts.sum()) * 100
         # Fill missing risk levels with 0
         for level in ["High", "Moderate", "Low"]:
             metrics[f"pct_{level.lower()}_risk_hours"] = float(risk_pct.get(level, 0.0))
 
     # Hour of day with worst AQI (using pm2_5 as AQI proxy)
-    if "hour" in df.columns:
-        hour_pm25 = df.groupby("hour")["pm2_5"].mean().sort_values(ascending=False)
+    if "hour" in cube.columns and "pm2_5_sum" in cube.columns:
+        hour_pm25 = mean_of(rollup(cube, ["hour"]), "pm2_5").sort_values(ascending=False)
         if not hour_pm25.empty:
             metrics["worst_hour_pm25"] = int(hour_pm25.index[0])
             metrics["worst_hour_pm25_value"] = hour_pm25.iloc[0]
@@ -117,18 +215,14 @@ def compute_kpi_metrics(df: pd.DataFrame) -> pd.DataFrame:
     return summary_metrics_df
 
 
-def city_risk_distribution(df: pd.DataFrame) -> pd.DataFrame:
+def city_risk_distribution(cube: pd.DataFrame) -> pd.DataFrame:
     """
-    Percentage/count of each risk_flag per city.
+    Percentage/count of each risk_flag per city (from the aggregates cube).
     """
-    if "risk_flag" not in df.columns:
+    if "risk_flag" not in cube.columns:
         return pd.DataFrame()
 
-    counts = (
-        df.groupby(["city", "risk_flag"])
-        .size()
-        .reset_index(name="count")
-    )
+    counts = rollup(cube, ["city", "risk_flag"])["rows"].reset_index(name="count")
     total_per_city = counts.groupby("city")["count"].transform("sum")
     counts["percentage"] = counts["count"] / total_per_city * 100
     return counts
@@ -145,6 +239,22 @@ def pollution_trends(df: pd.DataFrame) -> pd.DataFrame:
     return df[existing_cols].sort_values(["city", "time"])
 
 
+def pollution_trends_from_cube(cube: pd.DataFrame) -> pd.DataFrame:
+    """
+    B. for the aggregate store: hourly means per city. The table holds one row per
+    (city, time), so a (city, date, hour) cell is that hour's reading.
+    """
+    rolled = rollup(cube, ["city", "date", "hour"]).reset_index()
+    trends = pd.DataFrame({
+        "city": rolled["city"],
+        "time": pd.to_datetime(rolled["date"], utc=True) + pd.to_timedelta(pd.to_numeric(rolled["hour"]), unit="h"),
+    })
+    for col in ["pm2_5", "pm10", "ozone"]:
+        if f"{col}_sum" in rolled.columns:
+            trends[col] = mean_of(rolled, col).to_numpy()
+    return trends.sort_values(["city", "time"]).reset_index(drop=True)
+
+
 def save_csvs(summary_df, risk_df, trends_df):
     """
     C. Export Outputs
@@ -158,87 +268,99 @@ def save_csvs(summary_df, risk_df, trends_df):
     summary_df.to_csv(summary_path, index=False)  # [web:9]
     risk_df.to_csv(risk_path, index=False)
     trends_df.to_csv(trends_path, index=False)
+    RUN.add("analyze", bytes_written=sum(os.path.getsize(p) for p in (summary_path, risk_path, trends_path)))
 
     logger.info("Saved CSVs to %s", OUTPUT_DIR)
 
 
-def create_plots(df: pd.DataFrame):
+def create_plots(df: Optional[pd.DataFrame], cube: pd.DataFrame, workers: int = PLOT_WORKERS):
     """
     D. Visualizations (saved as PNGs):
     - Histogram of PM2.5
-    - Bar chart of risk flags per city
-    - Line chart of hourly PM2.5 trends
-    - Scatter: severity_score vs pm2_5
+    - Bar chart of risk flags per city (from the cube)
+    - Line chart of hourly PM2.5 trends (from the cube)
+    - Scatter: severity_score vs pm2_5 (a density grid for large tables)
+    The histogram and scatter need individual rows and are skipped when df is None.
+    Figures are pre-binned here and rendered off-screen in parallel; unchanged
+    figures are not redrawn (see etl_common/plot_render.py).
     """
+    figures = []
+
     # Histogram of PM2.5
-    if "pm2_5" in df.columns:
-        plt.figure()
-        df["pm2_5"].dropna().plot(kind="hist", bins=30)
-        plt.title("Histogram of PM2.5")
-        plt.xlabel("PM2.5")
-        plt.ylabel("Frequency")
-        plt.tight_layout()
-        plt.savefig(os.path.join(OUTPUT_DIR, "hist_pm25.png"))
-        plt.close()
+    if df is not None and "pm2_5" in df.columns:
+        figures.append(histogram("hist_pm25.png", df["pm2_5"], bins=30,
+                                 title="Histogram of PM2.5", xlabel="PM2.5", ylabel="Frequency"))
 
     # Bar chart of risk flags per city
-    if "risk_flag" in df.columns:
-        plt.figure()
-        risk_counts = df.groupby(["city", "risk_flag"]).size().unstack(fill_value=0)
-        risk_counts.plot(kind="bar", stacked=True)
-        plt.title("Risk Flags per City")
-        plt.xlabel("City")
-        plt.ylabel("Count")
-        plt.tight_layout()
-        plt.savefig(os.path.join(OUTPUT_DIR, "bar_risk_flags_per_city.png"))
-        plt.close()
+    if "risk_flag" in cube.columns:
+        risk_counts = rollup(cube, ["city", "risk_flag"])["rows"].unstack(fill_value=0)
+        figures.append(stacked_bar("bar_risk_flags_per_city.png", risk_counts,
+                                   title="Risk Flags per City", xlabel="City", ylabel="Count"))
 
     # Line chart of hourly PM2.5 trends
-    if "hour" in df.columns and "pm2_5" in df.columns:
-        plt.figure()
-        hourly_pm25 = df.groupby("hour")["pm2_5"].mean().sort_index()
-        hourly_pm25.plot(kind="line", marker="o")
-        plt.title("Hourly PM2.5 Trend")
-        plt.xlabel("Hour of Day")
-        plt.ylabel("Average PM2.5")
-        plt.tight_layout()
-        plt.savefig(os.path.join(OUTPUT_DIR, "line_hourly_pm25.png"))
-        plt.close()
+    if "hour" in cube.columns and "pm2_5_sum" in cube.columns:
+        hourly_pm25 = mean_of(rollup(cube, ["hour"]), "pm2_5").sort_index()
+        figures.append(line("line_hourly_pm25.png", hourly_pm25.index.astype("int64"), hourly_pm25,
+                            title="Hourly PM2.5 Trend", xlabel="Hour of Day", ylabel="Average PM2.5"))
 
     # Scatter: severity_score vs pm2_5
-    if "severity_score" in df.columns and "pm2_5" in df.columns:
-        plt.figure()
-        plt.scatter(df["pm2_5"], df["severity_score"], alpha=0.5)
-        plt.title("Severity Score vs PM2.5")
-        plt.xlabel("PM2.5")
-        plt.ylabel("Severity Score")
-        plt.tight_layout()
-        plt.savefig(os.path.join(OUTPUT_DIR, "scatter_severity_vs_pm25.png"))
-        plt.close()
+    if df is not None and "severity_score" in df.columns and "pm2_5" in df.columns:
+        figures.append(scatter("scatter_severity_vs_pm25.png", df["pm2_5"], df["severity_score"],
+                               title="Severity Score vs PM2.5", xlabel="PM2.5", ylabel="Severity Score"))
+
+    drawn = render_figures(figures, OUTPUT_DIR, workers=workers)
+    logger.info("Saved plots to %s (%d redrawn, %d unchanged)", OUTPUT_DIR, len(drawn), len(figures) - len(drawn))
+
 
-    logger.info("Saved plots to %s", OUTPUT_DIR)
+def main(start: Optional[str] = None, end: Optional[str] = None, from_aggregates: bool = False,
+         plot_workers: int = PLOT_WORKERS, client: Optional[Client] = None):
+    """
+    from_aggregates=True answers from the persistent aggregate store instead of
+    reading the table (no row-level plots in that case). client defaults to the
+    Supabase client from .env.
+    """
+    if from_aggregates:
+        cube = AggregateStore().window(start, end)
+        logger.info("Read %d aggregate cells", len(cube))
+        RUN.add("analyze", rows_in=len(cube))
+        save_csvs(compute_kpi_metrics(cube), city_risk_distribution(cube), pollution_trends_from_cube(cube))
+        create_plots(None, cube, workers=plot_workers)
+        return
 
+    client = client if client is not None else get_supabase_client()
+    df = fetch_data(client, start, end)
+    RUN.add("analyze", rows_in=len(df))
 
-def main():
-    client = get_supabase_client()
-    df = fetch_data(client)
+    # One pass over the rows; KPIs, the risk CSV and the aggregate plots share it
+    cube = compute_aggregates(df)
 
     # A. KPI Metrics
-    summary_df = compute_kpi_metrics(df)
+    summary_df = compute_kpi_metrics(cube)
 
     # A (part) + B. City risk distribution + Pollution trends
-    risk_df = city_risk_distribution(df)
+    risk_df = city_risk_distribution(cube)
     trends_df = pollution_trends(df)
 
     # C. Export CSVs
     save_csvs(summary_df, risk_df, trends_df)
 
     # D. Visualizations
-    create_plots(df)
+    create_plots(df, cube, workers=plot_workers)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Analyse air-quality data loaded into Supabase")
+    parser.add_argument("--start", help="only rows with time >= START (ISO date/time)")
+    parser.add_argument("--end", help="only rows with time < END (ISO date/time)")
+    parser.add_argument("--days", type=int, help="only the last DAYS days (overrides --start)")
+    parser.add_argument("--from-aggregates", action="store_true",
+                        help="use the aggregate store (aggregate_store.py) instead of querying the table")
+    parser.add_argument("--plot-workers", type=int, default=PLOT_WORKERS, help="figures rendered in parallel")
+    args = parser.parse_args()
+    start = args.start
+    if args.days:
+        start = (datetime.now(timezone.utc) - timedelta(days=args.days)).isoformat()
+    main(start, args.end, from_aggregates=args.from_aggregates, plot_workers=args.plot_workers)
 
 
 
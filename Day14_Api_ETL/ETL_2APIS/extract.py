@@ -29,20 +29,33 @@ data/raw/<city>_raw_<timestamp>.json'''
 
 
 
-import json
 import logging
-from datetime import datetime
+import random
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
+from urllib.parse import urlparse
 import requests
+from requests.adapters import HTTPAdapter
 import time
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # repo root, for etl_common
+import station_registry
+from etl_common.http_cache import HttpCache
+from etl_common.raw_store import RawStore
+from etl_common.run_metrics import RUN
+
 # ---------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------
 
 BASE_DIR = Path(__file__).resolve().parents[0]
-RAW_DIR = BASE_DIR / "data" / "raw"
+RAW_DIR = BASE_DIR / "data" / "raw"   # legacy one-file-per-response output
 RAW_DIR.mkdir(parents=True, exist_ok=True)
+LANDING_DIR = BASE_DIR / "data" / "landing"
+HTTP_CACHE_DIR = BASE_DIR / "data" / "http_cache"
 
 CITIES = {
     "Delhi":      (28.7041, 77.1025),
@@ -56,8 +69,20 @@ HOURLY_PARAMS = "pm10,pm2_5,carbon_monoxide,nitrogen_dioxide,ozone,sulphur_dioxi
 
 URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
 
+MAX_LOCATIONS_PER_REQUEST = 50  # coordinates per multi-location request
+
 MAX_RETRIES = 3
-RETRY_DELAY = 2  # seconds
+RETRY_DELAY = 2  # seconds (base of the jittered exponential backoff)
+MAX_BACKOFF = 30  # seconds
+
+MAX_WORKERS = 16            # cities fetched at the same time
+MAX_PER_HOST = 8            # concurrent requests to one API host
+RATE_LIMIT_PER_SEC = 10     # token bucket: sustained requests per second
+RATE_LIMIT_BURST = 10       # token bucket: burst size
+
+# Responses younger than this are reused without any request (on top of the
+# server's Cache-Control max-age); older ones are revalidated with ETag/Last-Modified
+CACHE_FRESHNESS_SECONDS = 0
 
 # ---------------------------------------------------------
 # Logging Setup
@@ -73,30 +98,116 @@ logger = logging.getLogger()
 
 
 # ---------------------------------------------------------
-# Helper: Save JSON
+# Shared HTTP session, rate limiting and backoff
 # ---------------------------------------------------------
 
-def save_json(city: str, data: dict, tag="raw") -> Path:
-    """Save JSON with timestamp."""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = RAW_DIR / f"{city.lower()}_{tag}_{timestamp}.json"
-    filename.write_text(json.dumps(data, indent=2))
-    return filename
+class TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until a request may be sent."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_session = None
+_session_lock = threading.Lock()
+_rate_limiter = TokenBucket(RATE_LIMIT_PER_SEC, RATE_LIMIT_BURST)
+_host_slots = {}
+_max_per_host = MAX_PER_HOST
+_http_cache = HttpCache(HTTP_CACHE_DIR, CACHE_FRESHNESS_SECONDS)
+_raw_store = RawStore(LANDING_DIR)
+
+
+def get_session() -> requests.Session:
+    """One pooled session shared by all worker threads (keep-alive connections)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=10, pool_maxsize=MAX_PER_HOST)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def mount_transport(adapter, prefix: str = URL) -> None:
+    """
+    Send requests for `prefix` through `adapter` (a requests transport adapter)
+    instead of the network, e.g. synthetic_api.SyntheticTransport for offline runs.
+    """
+    get_session().mount(prefix, adapter)
+
+
+def _host_slot(url: str) -> threading.BoundedSemaphore:
+    host = urlparse(url).netloc
+    with _session_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(_max_per_host)
+        return _host_slots[host]
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff: random(0, RETRY_DELAY * 2**(attempt-1))."""
+    return random.uniform(0, min(MAX_BACKOFF, RETRY_DELAY * 2 ** (attempt - 1)))
+
+
+def _send(url: str, params: dict, headers: dict, timeout: int) -> requests.Response:
+    _rate_limiter.acquire()
+    with _host_slot(url):
+        return get_session().get(url, params=params, headers=headers, timeout=timeout)
+
+
+def http_get(url: str, params: dict, timeout: int = 20, cache: HttpCache | None = None):
+    """
+    GET through the on-disk cache (extract's own unless `cache` is given), the
+    shared session, the rate limiter and the per-host cap. The response's
+    .changed is False when the payload is the same as last time; a changed
+    payload is cached once the caller commit()s it.
+    """
+    return (cache or _http_cache).get(_send, url, params, timeout=timeout)
 
 
 # ---------------------------------------------------------
-# Extract one city
+# Helper: Save raw response
 # ---------------------------------------------------------
 
-def extract_city(city: str, lat: float, lon: float) -> Path:
-    print(f"\n⏳ Fetching AQI for {city} ({lat}, {lon}) ...")
+def save_raw(city: str, data: dict, tag="raw", station_id: str | None = None) -> str:
+    """
+    Append the response to the compressed landing store (data/landing) and
+    return its reference ("landing:<seq>").
+    """
+    entry = _raw_store.append(city, data, tag=tag, station_id=station_id)
+    RUN.add("extract", city=city, rows_out=1, bytes_written=entry["length"])
+    return entry["ref"]
+
+
+class ExtractError(Exception):
+    pass
 
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "hourly": HOURLY_PARAMS
-    }
 
+def fetch_json(label: str, params: dict, cache: HttpCache | None = None):
+    """
+    GET the air-quality endpoint with retries. Returns (data, response):
+    response.changed tells whether data is new, and response.commit() caches it
+    once it is landed. Raises ExtractError when all attempts fail.
+    Consumers other than extract pass their own `cache`, so that what they have
+    seen does not hide changes from extract (and the other way round).
+    """
     attempts = 0
     last_error = None
 
@@ -104,52 +215,192 @@ def extract_city(city: str, lat: float, lon: float) -> Path:
         attempts += 1
 
         try:
-            response = requests.get(URL, params=params, timeout=20)
+            # latency as the caller sees it, rate limiting included
+            t0 = time.perf_counter()
+            try:
+                response = http_get(URL, params, timeout=20, cache=cache)
+            except Exception:
+                RUN.observe_http("extract", time.perf_counter() - t0, city=label, error=True)
+                raise
+            RUN.observe_http("extract", time.perf_counter() - t0, response.status_code, city=label)
+            RUN.add("extract", city=label, bytes_read=len(response.content))
             response.raise_for_status()
-            data = response.json()
-
-            # Empty API response
-            if not data:
-                logger.warning(f"Empty API response for {city}")
-                fallback = {"city": city, "error": "Empty API response"}
-                return save_json(city, fallback, tag="empty")
-
-            # Success
-            saved_path = save_json(city, data, tag="raw")
-            print(f"✅ Saved AQI data for {city} → {saved_path}")
-            logger.info(f"Success: {city} saved to {saved_path}")
-            return saved_path
+            return response.json(), response
 
         except Exception as e:
             last_error = str(e)
-            logger.error(f"Attempt {attempts} failed for {city}: {e}")
-            print(f"⚠️ Attempt {attempts}/{MAX_RETRIES} failed for {city}: {e}")
+            logger.error(f"Attempt {attempts} failed for {label}: {e}")
+            print(f"⚠️ Attempt {attempts}/{MAX_RETRIES} failed for {label}: {e}")
 
             if attempts < MAX_RETRIES:
-                print(f"⏳ Retrying in {RETRY_DELAY} seconds...")
-                time.sleep(RETRY_DELAY)
+                delay = backoff_delay(attempts)
+                print(f"⏳ Retrying {label} in {delay:.1f} seconds...")
+                time.sleep(delay)
 
-    # All retries failed
-    print(f"❌ Failed to fetch AQI for {city} after {MAX_RETRIES} attempts.")
-    error_payload = {"city": city, "error": last_error}
-    error_path = save_json(city, error_payload, tag="error")
-    logger.error(f"FAILED {city}. Error file saved → {error_path}")
-    return error_path
+    raise ExtractError(last_error)
 
 
 # ---------------------------------------------------------
-# Extract all cities
+# Extract one city
 # ---------------------------------------------------------
 
-def extract_all_cities():
-    saved_files = []
+def city_params(lat: float, lon: float) -> dict:
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": HOURLY_PARAMS
+    }
+
 
+def extract_city(city: str, lat: float, lon: float) -> str | None:
+    """Fetch one city; returns the landing reference, or None when the payload is unchanged."""
+    print(f"\n⏳ Fetching AQI for {city} ({lat}, {lon}) ...")
+
+    params = city_params(lat, lon)
+
+    try:
+        data, response = fetch_json(city, params)
+    except ExtractError as e:
+        # All retries failed
+        print(f"❌ Failed to fetch AQI for {city} after {MAX_RETRIES} attempts.")
+        error_payload = {"city": city, "error": str(e)}
+        error_path = save_raw(city, error_payload, tag="error")
+        logger.error(f"FAILED {city}. Error file saved → {error_path}")
+        return error_path
+
+    if not response.changed:
+        print(f"⏭️ {city}: payload unchanged since last run, nothing saved")
+        logger.info(f"Unchanged: {city}")
+        return None
+
+    # Empty API response
+    if not data:
+        logger.warning(f"Empty API response for {city}")
+        fallback = {"city": city, "error": "Empty API response"}
+        saved_path = save_raw(city, fallback, tag="empty")
+        response.commit()
+        return saved_path
+
+    # Success
+    saved_path = save_raw(city, data, tag="raw")
+    response.commit()
+    print(f"✅ Saved AQI data for {city} → {saved_path}")
+    logger.info(f"Success: {city} saved to {saved_path}")
+    return saved_path
+
+
+# ---------------------------------------------------------
+# Extract many stations (registry-driven)
+# ---------------------------------------------------------
+
+def extract_locations(stations: list) -> list:
+    """
+    Fetch up to MAX_LOCATIONS_PER_REQUEST stations with ONE request: Open-Meteo
+    accepts comma-separated latitude/longitude lists and answers with a list of
+    payloads in the same order. Returns [(station_id, path, ok)]; path is None
+    for unchanged payloads.
+    """
+    params = {
+        "latitude": ",".join(str(s.latitude) for s in stations),
+        "longitude": ",".join(str(s.longitude) for s in stations),
+        "hourly": HOURLY_PARAMS,
+    }
+    label = f"{len(stations)} stations ({stations[0].station_id}..{stations[-1].station_id})"
+    try:
+        data, response = fetch_json(label, params)
+    except ExtractError as e:
+        logger.error(f"FAILED {label}: {e}")
+        return [
+            (s.station_id, save_raw(s.city, {"city": s.city, "station_id": s.station_id, "error": str(e)},
+                                    tag="error", station_id=s.station_id), False)
+            for s in stations
+        ]
+
+    if not response.changed:
+        logger.info(f"Unchanged: {label}")
+        return [(s.station_id, None, True) for s in stations]
+
+    payloads = data if isinstance(data, list) else [data]
+    results = []
+    for station, payload in zip(stations, payloads):
+        if not payload:
+            payload, tag, ok = {"error": "Empty API response"}, "empty", False
+        else:
+            tag, ok = "raw", True
+        # city travels inside the payload so station names never depend on file naming
+        payload["city"] = station.city
+        payload["station_id"] = station.station_id
+        results.append((station.station_id, save_raw(station.city, payload, tag=tag, station_id=station.station_id), ok))
+    response.commit()  # every station of the response is landed
+    logger.info(f"Success: {label} saved")
+    return results
+
+
+def _init_shard_worker(processes: int) -> None:
+    """
+    ProcessPoolExecutor initializer. Every worker process has its own token
+    bucket and host slots, so each one gets a 1/processes share of the rate,
+    the burst and the per-host cap: together they stay within the configured limits.
+    """
+    global _rate_limiter, _max_per_host
+    _rate_limiter = TokenBucket(RATE_LIMIT_PER_SEC / processes, RATE_LIMIT_BURST // processes)
+    _max_per_host = MAX_PER_HOST // processes
+    _host_slots.clear()
+
+
+def _extract_shard(batches: list) -> list:
+    """Worker process: fetch its share of location batches with a local thread pool."""
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        return [r for batch in pool.map(extract_locations, batches) for r in batch]
+
+
+def extract_due_stations(registry_path=None, processes: int = 1, now=None) -> list:
+    """
+    Fetch only the registry stations whose schedule is due, grouped into
+    multi-location requests and sharded across `processes` worker processes.
+    The workers share RATE_LIMIT_PER_SEC and MAX_PER_HOST between them, so
+    processes are capped at MAX_PER_HOST and RATE_LIMIT_BURST (one slot / token each).
+    Successful stations get their last-fetched watermark advanced.
+    """
+    now = now or datetime.now(timezone.utc)
+    stations = station_registry.load_registry(registry_path)
+    due = station_registry.due_stations(stations, now)
+    print(f"\n🌍 {len(due)} of {len(stations)} stations due for extraction\n")
+    if not due:
+        return []
+
+    batches = [due[i:i + MAX_LOCATIONS_PER_REQUEST] for i in range(0, len(due), MAX_LOCATIONS_PER_REQUEST)]
+    processes = max(1, min(processes, len(batches), MAX_PER_HOST, RATE_LIMIT_BURST))
+    if processes > 1:
+        shards = [batches[i::processes] for i in range(processes)]
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_shard_worker,
+                                 initargs=(processes,)) as pool:
+            results = [r for shard in pool.map(_extract_shard, shards) for r in shard]
+    else:
+        results = _extract_shard(batches)
+
+    station_registry.mark_fetched([sid for sid, _, ok in results if ok], now)
+    saved_files = [str(path) for _, path, _ in results if path is not None]
+    print(f"\n🎉 Extraction Completed! {sum(ok for _, _, ok in results)}/{len(results)} stations fetched")
+    return saved_files
+
+
+# ---------------------------------------------------------
+# Extract all cities
+# ---------------------------------------------------------
+
+def extract_all_cities(cities: dict = CITIES, max_workers: int = MAX_WORKERS):
+    """
+    Fetch all cities concurrently on a bounded thread pool. Requests share one
+    session and are paced by the token bucket, so wall time follows the slowest
+    city instead of the sum of all of them. Returned paths keep the order of `cities`;
+    cities whose payload did not change are left out.
+    """
     print("\n🌍 Starting AQI extraction for all cities...\n")
 
-    for city, (lat, lon) in CITIES.items():
-        path = extract_city(city, lat, lon)
-        saved_files.append(str(path))
-        time.sleep(0.5)   # polite delay
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(extract_city, city, lat, lon) for city, (lat, lon) in cities.items()]
+        saved_files = [str(p) for p in (f.result() for f in futures) if p is not None]
 
     print("\n🎉 Extraction Completed! Saved files:")
     for f in saved_files:
@@ -163,7 +414,10 @@ def extract_all_cities():
 # ---------------------------------------------------------
 
 if __name__ == "__main__":
-    extract_all_cities()
+    if station_registry.REGISTRY_FILE.exists():
+        extract_due_stations()
+    else:
+        extract_all_cities()
 
 
 
@@ -0,0 +1,228 @@
+"""
+fake_supabase.py
+
+In-memory stand-in for the Supabase client, covering what load.py and
+etl_analysis.py use:
+
+  client.postgrest.session.post("/<table>", content=..., params={"on_conflict": "city,time"})
+      upsert of a JSON batch: new rows get the next id (BIGSERIAL), rows that
+      conflict on the key are updated in place and keep theirs
+  client.table(name).select("a,b").gte / gt / lte / lt / eq(...).order(col, desc=).limit(n).execute().data
+
+latency adds a delay per request (exponentially distributed) and error_rate
+answers that fraction of requests with 503, so retries and batches in flight
+behave as they do against the real service. save() / load() keep the tables
+in a pickle between processes.
+"""
+
+import json
+import pickle
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, response: "FakeResponse"):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise FakeHTTPError(self)
+
+
+class FakeResult:
+    def __init__(self, data: List[dict]):
+        self.data = data
+
+
+def _comparable(value):
+    """ISO timestamps compare as UTC datetimes, everything else as is."""
+    if isinstance(value, str):
+        try:
+            ts = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+    return value
+
+
+class Table:
+    def __init__(self):
+        self.rows: List[dict] = []  # row with id i is rows[i - 1]
+        self.keys: Dict[Tuple, int] = {}
+
+    def upsert(self, rows: List[dict], on_conflict: Optional[List[str]]) -> None:
+        for row in rows:
+            key = tuple(row.get(c) for c in on_conflict) if on_conflict else None
+            row_id = self.keys.get(key) if key is not None else None
+            if row_id is not None:
+                self.rows[row_id - 1].update(row)
+                continue
+            row_id = len(self.rows) + 1
+            self.rows.append({**row, "id": row_id})
+            if key is not None:
+                self.keys[key] = row_id
+
+
+_OPS = {
+    "eq": lambda a, b: a == b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+
+class Query:
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table = table
+        self.columns: Optional[List[str]] = None
+        self.filters: List[Tuple[str, str, Any]] = []
+        self.order_by: Optional[Tuple[str, bool]] = None
+        self.limit_to: Optional[int] = None
+
+    def select(self, columns: str = "*") -> "Query":
+        self.columns = None if columns == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def _filter(self, op: str, column: str, value) -> "Query":
+        self.filters.append((op, column, value if column == "id" else _comparable(value)))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def order(self, column: str, desc: bool = False) -> "Query":
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, n: int) -> "Query":
+        self.limit_to = n
+        return self
+
+    def _id_range(self, n_rows: int) -> range:
+        """ids allowed by the id filters (rows are stored by id, so these need no scan)."""
+        lo, hi = 1, n_rows
+        for op, column, value in self.filters:
+            if column != "id":
+                continue
+            if op in ("gt", "gte"):
+                lo = max(lo, int(value) + (op == "gt"))
+            elif op in ("lt", "lte"):
+                hi = min(hi, int(value) - (op == "lt"))
+            else:
+                lo, hi = max(lo, int(value)), min(hi, int(value))
+        return range(lo, hi + 1)
+
+    def execute(self) -> FakeResult:
+        self.client._request()
+        with self.client._lock:
+            table = self.client.tables.get(self.table, Table())
+            others = [(_OPS[op], c, v) for op, c, v in self.filters if c != "id"]
+            ids = self._id_range(len(table.rows))
+            by_id = self.order_by is None or self.order_by[0] == "id"
+            if by_id and self.order_by is not None and self.order_by[1]:
+                ids = reversed(ids)
+            out = []
+            for i in ids:
+                row = table.rows[i - 1]
+                if all(row.get(c) is not None and op(_comparable(row[c]), v) for op, c, v in others):
+                    out.append(row)
+                    if by_id and self.limit_to is not None and len(out) >= self.limit_to:
+                        break
+            if not by_id:
+                column, desc = self.order_by
+                out.sort(key=lambda r: (r.get(column) is None, _comparable(r.get(column))), reverse=desc)
+                out = out[:self.limit_to]
+            if self.columns is not None:
+                out = [{c: row.get(c) for c in self.columns} for row in out]
+            else:
+                out = [dict(row) for row in out]
+        return FakeResult(out)
+
+
+class _Session:
+    def __init__(self, client: "FakeSupabase"):
+        self.client = client
+
+    def post(self, path: str, content: bytes = b"", params: Optional[dict] = None,
+             headers: Optional[dict] = None) -> FakeResponse:
+        status = self.client._request()
+        if status >= 400:
+            return FakeResponse(status)
+        if self.client.max_body_bytes is not None and len(content) > self.client.max_body_bytes:
+            return FakeResponse(413)
+        rows = json.loads(content)
+        on_conflict = (params or {}).get("on_conflict")
+        with self.client._lock:
+            table = self.client.tables.setdefault(path.strip("/"), Table())
+            table.upsert(rows, on_conflict.split(",") if on_conflict else None)
+        return FakeResponse(201)
+
+
+class _Postgrest:
+    def __init__(self, client: "FakeSupabase"):
+        self.session = _Session(client)
+
+
+class FakeSupabase:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, max_body_bytes: Optional[int] = None,
+                 seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_body_bytes = max_body_bytes
+        self.tables: Dict[str, Table] = {}
+        self.postgrest = _Postgrest(self)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def _request(self) -> int:
+        """Count a request and wait out its latency; returns the status to answer with."""
+        with self._lock:
+            delay = self._rng.expovariate(1 / self.latency) if self.latency > 0 else 0.0
+            failed = self._rng.random() < self.error_rate
+            self.requests += 1
+        time.sleep(delay)
+        return 503 if failed else 200
+
+    def table(self, name: str) -> Query:
+        return Query(self, name)
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return len(self.tables.get(name, Table()).rows)
+
+    def save(self, path: Path) -> None:
+        with open(path, "wb") as f:
+            pickle.dump(self.tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: Path, **kwargs) -> "FakeSupabase":
+        client = cls(**kwargs)
+        with open(path, "rb") as f:
+            client.tables = pickle.load(f)
+        return client
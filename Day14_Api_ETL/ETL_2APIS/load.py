@@ -14,37 +14,107 @@ air_quality_data (
     aqi_category TEXT,
     severity_score FLOAT,
     risk_flag TEXT,
-    hour INTEGER)
+    hour INTEGER,
+    UNIQUE (city, time))
 Load Requirements
 Batch insert records (batch size = 200)
 Auto-convert NaN → NULL
 Convert datetime to ISO formatted strings
 Retry failed batches (2 retries)
-Print summary of inserted rows'''
+Print summary of inserted rows
 
+Batches are sent LOAD_WORKERS at a time; their size adapts to the observed
+latency and payload size (AdaptiveBatchSize) and failed batches are retried
+with backoff without holding up the others.'''
 
+
+import argparse
+import heapq
+import json
 import os
+import random
+import sys
 import time
 import logging
 
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # repo root, for etl_common
+from aggregate_store import AggregateStore
+from etl_common.load_checkpoint import LoadCheckpoint, batch_key
+from etl_common.run_metrics import RUN
+from staged_store import DATASET_DIR, keep_latest, read_staged, widen_float32
+
 # --- Config ---
 load_dotenv()
 
+BASE_DIR = Path(__file__).resolve().parent
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
 TABLE_NAME = "air_quality_data"
-CSV_PATH = os.path.join("data", "staged", "air_quality_transformed.csv")
+
+# Rows are upserted on (city, time). Existing tables need the unique key once
+# (removes duplicates left by the old insert-only loader, keeping the newest id):
+UNIQUE_KEY_SQL = """
+delete from air_quality_data a
+using air_quality_data b
+where a.city = b.city and a.time = b.time and a.id < b.id;
+
+create unique index if not exists air_quality_data_city_time_key
+    on air_quality_data (city, time);
+"""
+ON_CONFLICT = "city,time"
+
+# Hash of every (city, time) row already sent, so reruns only send changed rows
+LOAD_STATE_PATH = os.path.join(BASE_DIR, "data", "staged", "load_state.parquet")
+# Rows of every batch committed by the current run; folded into LOAD_STATE_PATH
+# when the run ends, read back on the next run if it did not get that far
+CHECKPOINT_PATH = os.path.join(BASE_DIR, "data", "staged", "load_state.checkpoint.ndjson")
 
 BATCH_SIZE = 200
+
+# staged column -> DB column, and the DB columns in insert order
+RENAME_MAP = {
+    "aqi_pm25": "aqi_category",
+    "severity": "severity_score",
+    "risk": "risk_flag",
+}
+DB_COLUMNS = [
+    "city",
+    "time",
+    "pm10",
+    "pm2_5",
+    "carbon_monoxide",
+    "nitrogen_dioxide",
+    "sulphur_dioxide",
+    "ozone",
+    "uv_index",
+    "aqi_category",
+    "severity_score",
+    "risk_flag",
+    "hour",
+]
 MAX_RETRIES = 2
-RETRY_SLEEP = 2  # seconds
+RETRY_SLEEP = 2  # seconds, base of the jittered exponential backoff
+MAX_BACKOFF = 30
+
+# Parallel loader: batches in flight and adaptive batch size limits
+LOAD_WORKERS = 4
+MIN_BATCH_ROWS = 50
+MAX_BATCH_ROWS = 5000
+MAX_BATCH_BYTES = 2 * 1024 * 1024
+TARGET_BATCH_SECONDS = 1.0
+PROGRESS_EVERY = 5  # seconds between rows/s progress lines
 
 logging.basicConfig(
     level=logging.INFO,
@@ -59,11 +129,28 @@ def get_supabase_client() -> Client:
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
 
-def read_csv(path: str) -> pd.DataFrame:
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"CSV not found at {path}. Run transform.py first.")
-    df = pd.read_csv(path, parse_dates=["time"])
-    logger.info("Read CSV with %d rows", len(df))
+def read_staged_data(cities=None, start=None, end=None) -> pd.DataFrame:
+    """
+    Read the staged dataset; cities / [start, end) only read the matching
+    city=/date= partitions.
+    """
+    df = read_staged(DATASET_DIR, cities=cities, start=start, end=end)
+    if df.empty:
+        raise FileNotFoundError(f"No staged data under {DATASET_DIR}. Run transform.py first.")
+    df = plain_dtypes(df)
+    logger.info("Read staged dataset with %d rows", len(df))
+    return df
+
+
+def plain_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Staged dtypes -> what the loader works with: float32 pollutants -> float64
+    with their short decimal form, categories -> plain values. Rows staged or
+    streamed this way hash alike (row_hashes).
+    """
+    df = widen_float32(df)
+    for c in df.select_dtypes("category").columns:
+        df[c] = df[c].astype(object)
     return df
 
 
@@ -101,92 +188,418 @@ def normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
             normalized[key] = value
 
     # Rename columns to match DB schema
-    rename_map = {
-        "aqi_pm25": "aqi_category",
-        "severity": "severity_score",
-        "risk": "risk_flag",
-    }
-    for old, new in rename_map.items():
+    for old, new in RENAME_MAP.items():
         if old in normalized:
             normalized[new] = normalized.pop(old)
 
     # Keep only DB columns
-    db_cols = [
-        "city",
-        "time",
-        "pm10",
-        "pm2_5",
-        "carbon_monoxide",
-        "nitrogen_dioxide",
-        "sulphur_dioxide",
-        "ozone",
-        "uv_index",
-        "aqi_category",
-        "severity_score",
-        "risk_flag",
-        "hour",
-    ]
-    return {c: normalized.get(c) for c in db_cols}
-
-
-def insert_batch(client: Client, rows: List[Dict[str, Any]]) -> None:
-    """
-    Insert a batch, with simple retry logic.
-    Raises an exception if all attempts fail.
-    """
-    attempt = 0
-    while attempt <= MAX_RETRIES:
-        attempt += 1
-        try:
-            logger.info("Inserting batch of %d rows (attempt %d)", len(rows), attempt)
-            client.table(TABLE_NAME).insert(rows).execute()
-            logger.info("Batch inserted successfully")
-            return
-        except Exception as e:
-            logger.error("Batch insert failed: %s", e)
-            if attempt > MAX_RETRIES:
-                raise
-            sleep_for = RETRY_SLEEP * attempt
-            logger.info("Retrying in %d seconds...", sleep_for)
-            time.sleep(sleep_for)
-
-
-def load_to_supabase(df: pd.DataFrame, client: Client) -> None:
-    # Convert to list of dicts and normalize
-    records = [normalize_row(r) for r in df.to_dict(orient="records")]
-
-    total_rows = len(records)
-    inserted_rows = 0
+    return {c: normalized.get(c) for c in DB_COLUMNS}
+
+
+# ---------- Column-wise normalization ----------
+# normalize_row above is the per-row reference; the functions below do the same
+# once per column and encode batches straight to JSON bytes
+# (see bench_load.py for the parity check and timings).
+
+def _iso_times(times: pd.Series) -> np.ndarray:
+    """Timestamps -> the strings Timestamp.isoformat() gives (whole seconds)."""
+    times = pd.to_datetime(times)
+    tz = times.dt.tz
+    if tz is not None:
+        times = times.dt.tz_convert("UTC").dt.tz_localize(None)
+    values = times.to_numpy(dtype="datetime64[s]")
+    out = np.datetime_as_string(values, unit="s").astype(object)
+    if tz is not None:
+        out = out + "+00:00"
+    out[np.isnat(values)] = None
+    return out
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    normalize_row for the whole frame: DB column names and order, ISO time
+    strings, nullable int hour; NaN/NaT stay missing here and become null in
+    json_columns.
+    """
+    out = df.rename(columns=RENAME_MAP)
+    for c in DB_COLUMNS:
+        if c not in out.columns:
+            out[c] = None
+    out = out[DB_COLUMNS].copy()
+    out["time"] = _iso_times(out["time"])
+    out["hour"] = pd.to_numeric(out["hour"], errors="coerce").astype("Int64")
+    return out
+
+
+def json_columns(frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Every column of a normalized frame as an array of JSON literals ("null" for
+    missing). Readings repeat a lot (cities, labels, hours, 0.1-step pollutant
+    values), so each distinct value is encoded once and the literals are gathered
+    back by code.
+    """
+    encoded = {}
+    for c in frame.columns:
+        s = frame[c]
+        codes, uniques = pd.factorize(s, use_na_sentinel=True)
+        if pd.api.types.is_float_dtype(s.dtype):
+            values = np.asarray(uniques, dtype="float64")
+            # numpy's str() of a float64 is its shortest round-trip repr, like json.dumps
+            literals = values.astype(str).astype(object)
+            literals[~np.isfinite(values)] = "null"
+        elif pd.api.types.is_integer_dtype(s.dtype):
+            literals = np.asarray(uniques, dtype="int64").astype(str).astype(object)
+        else:
+            literals = np.array([json.dumps(u, ensure_ascii=False) for u in uniques], dtype=object)
+        encoded[c] = np.append(literals, "null")[codes]
+    return encoded
+
+
+class BatchEncoder:
+    """JSON bytes for any row range of a normalized frame (read-only, thread-safe)."""
+
+    def __init__(self, frame: pd.DataFrame):
+        cols = json_columns(frame)
+        # literals are already JSON text, so one %-format per row builds the object
+        self.template = "{" + ",".join(f"{json.dumps(c)}:%s" for c in cols) + "}"
+        self.columns = [a.tolist() for a in cols.values()]
+        self.n_rows = len(frame)
+
+    def encode(self, start: int, stop: int) -> bytes:
+        rows = [self.template % values for values in zip(*(c[start:stop] for c in self.columns))]
+        return ("[" + ",".join(rows) + "]").encode("utf-8")
+
+
+def encode_batches(frame: pd.DataFrame, batch_size: int = BATCH_SIZE) -> Iterator[bytes]:
+    """Yield the rows of a normalized frame as JSON arrays of batch_size objects."""
+    encoder = BatchEncoder(frame)
+    for start in range(0, encoder.n_rows, batch_size):
+        yield encoder.encode(start, start + batch_size)
+
+
+# ---------- Change detection ----------
+
+def row_hashes(df: pd.DataFrame) -> pd.Series:
+    """uint64 hash of each row's DB values (everything but city/time/fetched_at)."""
+    value_cols = [c for c in df.columns if c not in ("city", "time", "fetched_at")]
+    return pd.util.hash_pandas_object(df[value_cols], index=False)
+
+
+def load_state(path: str = LOAD_STATE_PATH) -> pd.DataFrame:
+    if not os.path.exists(path):
+        return pd.DataFrame({"city": pd.Series(dtype=object),
+                             "time": pd.Series(dtype="datetime64[ns, UTC]"),
+                             "row_hash": pd.Series(dtype="uint64")})
+    return pd.read_parquet(path)
+
+
+def save_state(state: pd.DataFrame, path: str = LOAD_STATE_PATH) -> None:
+    tmp = path + ".tmp"
+    state.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def select_changed(df: pd.DataFrame, state: pd.DataFrame) -> pd.DataFrame:
+    """Rows whose (city, time) was never sent or whose values changed since."""
+    df = df.assign(row_hash=row_hashes(df).to_numpy())
+    sent = state.rename(columns={"row_hash": "sent_hash"})
+    sent["time"] = pd.to_datetime(sent["time"], utc=True).astype(df["time"].dtype)
+    merged = df.merge(sent, on=["city", "time"], how="left")
+    changed = merged[merged["sent_hash"].isna() | (merged["sent_hash"] != merged["row_hash"])]
+    return changed.drop(columns=["sent_hash"]).reset_index(drop=True)
+
+
+def record_sent(state: pd.DataFrame, sent: pd.DataFrame) -> pd.DataFrame:
+    sent = sent[["city", "time", "row_hash"]].assign(time=pd.to_datetime(sent["time"], utc=True))
+    state = state.assign(time=pd.to_datetime(state["time"], utc=True).astype(sent["time"].dtype))
+    rows = pd.concat([state, sent], ignore_index=True)
+    return rows.drop_duplicates(["city", "time"], keep="last").reset_index(drop=True)
+
+
+def record_rows_out(sent: pd.DataFrame) -> None:
+    """Upserted rows per city into the run metrics."""
+    for city, rows in sent["city"].astype(str).value_counts().items():
+        RUN.add("load", city=city, rows_out=int(rows))
+
+
+def checkpoint_batch(checkpoint: LoadCheckpoint, rows: pd.DataFrame, offset: int) -> None:
+    """Journal the (city, time, row_hash) of a committed batch."""
+    sent = [[city, ts.isoformat(), int(h)] for city, ts, h in
+            zip(rows["city"].astype(str), rows["time"], rows["row_hash"])]
+    checkpoint.commit(batch_key(offset, sent), rows=len(sent), sent=sent)
+
+
+def partitions_of(rows: pd.DataFrame) -> set:
+    """(city, date) staged partitions of rows."""
+    return set(zip(rows["city"].astype(str), pd.to_datetime(rows["time"], utc=True).dt.date))
+
+
+def checkpointed_rows(checkpoint: LoadCheckpoint) -> pd.DataFrame:
+    """Rows journaled by a run that stopped before saving LOAD_STATE_PATH."""
+    sent = [row for entry in checkpoint.entries() for row in entry.get("sent", [])]
+    df = pd.DataFrame(sent, columns=["city", "time", "row_hash"])
+    df["time"] = pd.to_datetime(df["time"], utc=True)
+    df["row_hash"] = df["row_hash"].astype("uint64")
+    return df
+
+
+def post_batch(client: Client, body: bytes) -> None:
+    """Upsert an already JSON-encoded batch through the client's PostgREST session."""
+    resp = client.postgrest.session.post(
+        f"/{TABLE_NAME}",
+        content=body,
+        params={"on_conflict": ON_CONFLICT},
+        headers={
+            "Content-Type": "application/json",
+            "Prefer": "resolution=merge-duplicates,return=minimal",
+        },
+    )
+    resp.raise_for_status()
+
+
+# ---------- Parallel loader ----------
+
+class LoadError(Exception):
+    pass
+
+
+@dataclass
+class Batch:
+    start: int
+    stop: int
+    attempts: int = 0
+
+    @property
+    def rows(self) -> int:
+        return self.stop - self.start
+
+
+class AdaptiveBatchSize:
+    """
+    Next batch size from the last ones: grow while batches come back well under
+    TARGET_BATCH_SECONDS, shrink when slower, and never exceed the byte limit
+    (MAX_BATCH_BYTES, lowered whenever the server answers 413) at the observed
+    bytes per row.
+    """
+
+    def __init__(self, initial: int = BATCH_SIZE):
+        self.size = initial
+        self.bytes_per_row = None
+        self.max_bytes = MAX_BATCH_BYTES
+
+    def observe(self, rows: int, n_bytes: int, seconds: float) -> None:
+        self.bytes_per_row = n_bytes / max(rows, 1)
+        if seconds > TARGET_BATCH_SECONDS:
+            self.size = max(MIN_BATCH_ROWS, self.size // 2)
+        elif seconds < TARGET_BATCH_SECONDS / 2 and rows >= self.size:
+            self.size = min(MAX_BATCH_ROWS, self.size * 2)
+
+    def too_large(self, rows: int) -> None:
+        """A batch of `rows` rows was rejected as too large."""
+        if self.bytes_per_row:
+            self.max_bytes = min(self.max_bytes, rows * self.bytes_per_row / 2)
+        self.size = max(MIN_BATCH_ROWS, min(self.size, rows) // 2)
+
+    def next_size(self) -> int:
+        if self.bytes_per_row:
+            return max(MIN_BATCH_ROWS, min(self.size, int(self.max_bytes / self.bytes_per_row)))
+        return self.size
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff: random(0, RETRY_SLEEP * 2**(attempt-1))."""
+    return random.uniform(0, min(MAX_BACKOFF, RETRY_SLEEP * 2 ** (attempt - 1)))
+
+
+def _payload_too_large(exc: Exception) -> bool:
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None) == 413
+
+
+def _send(client: Client, encoder: BatchEncoder, batch: Batch):
+    body = encoder.encode(batch.start, batch.stop)
+    t0 = time.perf_counter()
+    try:
+        post_batch(client, body)
+    except Exception:
+        RUN.observe_http("load", time.perf_counter() - t0, error=True)
+        raise
+    seconds = time.perf_counter() - t0
+    RUN.observe_http("load", seconds)
+    RUN.add("load", bytes_written=len(body))
+    return len(body), seconds
+
+
+def send_batches(client: Client, encoder: BatchEncoder, workers: int = LOAD_WORKERS,
+                 on_sent: Optional[Callable[[Batch], None]] = None) -> Tuple[List[Batch], Dict[str, float]]:
+    """
+    Upsert every row of the encoder, keeping up to `workers` batches in flight.
+    Failed batches wait in a retry queue (jittered backoff) while the others
+    keep going; a 413 splits the batch in two. on_sent(batch) is called as each
+    batch is committed. Returns the batches that made it and the run's stats
+    (rows, seconds, rows_per_second, batches, failed_batches).
+    """
+    sizer = AdaptiveBatchSize()
+    next_row = 0
+    pending = {}
+    retries = []  # heap of (ready_at, seq, batch)
+    seq = 0
+    done_batches: List[Batch] = []
     failed_batches = 0
+    sent_rows = 0
+    t_start = last_report = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while next_row < encoder.n_rows or pending or retries:
+            now = time.monotonic()
+            while len(pending) < workers:
+                if retries and retries[0][0] <= now:
+                    batch = heapq.heappop(retries)[2]
+                elif next_row < encoder.n_rows:
+                    batch = Batch(next_row, min(next_row + sizer.next_size(), encoder.n_rows))
+                    next_row = batch.stop
+                else:
+                    break
+                pending[pool.submit(_send, client, encoder, batch)] = batch
+
+            if not pending:
+                time.sleep(max(0.0, retries[0][0] - now))
+                continue
+            timeout = max(0.0, retries[0][0] - now) if retries else None
+            finished, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for fut in finished:
+                batch = pending.pop(fut)
+                try:
+                    n_bytes, seconds = fut.result()
+                except Exception as e:
+                    if _payload_too_large(e) and batch.rows > 1:
+                        sizer.too_large(batch.rows)
+                        mid = batch.start + batch.rows // 2
+                        for part in (Batch(batch.start, mid, batch.attempts), Batch(mid, batch.stop, batch.attempts)):
+                            seq += 1
+                            heapq.heappush(retries, (now, seq, part))
+                        continue
+                    batch.attempts += 1
+                    if batch.attempts > MAX_RETRIES:
+                        failed_batches += 1
+                        logger.error("Failed to insert batch rows %d-%d: %s", batch.start + 1, batch.stop, e)
+                        continue
+                    delay = backoff_delay(batch.attempts)
+                    logger.warning("Batch rows %d-%d failed (%s), retry %d in %.1fs",
+                                   batch.start + 1, batch.stop, e, batch.attempts, delay)
+                    seq += 1
+                    heapq.heappush(retries, (time.monotonic() + delay, seq, batch))
+                    continue
+                sizer.observe(batch.rows, n_bytes, seconds)
+                sent_rows += batch.rows
+                done_batches.append(batch)
+                if on_sent is not None:
+                    on_sent(batch)
+
+            if time.monotonic() - last_report >= PROGRESS_EVERY:
+                last_report = time.monotonic()
+                elapsed = last_report - t_start
+                logger.info("Loaded %d/%d rows (%.0f rows/s, batch size %d, %d in flight, %d to retry)",
+                            sent_rows, encoder.n_rows, sent_rows / elapsed, sizer.size, len(pending), len(retries))
+
+    elapsed = time.monotonic() - t_start
+    stats = {
+        "rows": sent_rows,
+        "seconds": elapsed,
+        "rows_per_second": sent_rows / elapsed if elapsed else 0.0,
+        "batches": len(done_batches),
+        "failed_batches": failed_batches,
+    }
+    return done_batches, stats
+
+
+def load_to_supabase(df: pd.DataFrame, client: Client, only_changed: bool = True,
+                     workers: int = LOAD_WORKERS) -> None:
+    """
+    Upsert the rows on (city, time), `workers` batches at a time. With
+    only_changed, rows identical to what an earlier run already sent are skipped
+    (see LOAD_STATE_PATH). Committed batches are journaled as they land
+    (CHECKPOINT_PATH), so a rerun after a crash resumes with the rows still missing.
+    Raises LoadError if batches still failed after their retries: the rows that
+    did land are recorded, and a rerun sends the rest.
+    """
+    # an upsert batch must not touch the same key twice
+    df = keep_latest(df, ["city", "time"])
+    staged_rows = len(df)
+    RUN.add("load", rows_in=staged_rows)
+    checkpoint = LoadCheckpoint(Path(CHECKPOINT_PATH))
+    if only_changed:
+        state = load_state()
+        if len(checkpoint):
+            logger.info("Resuming: %d rows committed by an interrupted run", checkpoint.committed_rows())
+            state = record_sent(state, checkpointed_rows(checkpoint))
+    else:
+        checkpoint.reset()
+        state = load_state().iloc[0:0]
+    df = select_changed(df, state)
+
+    # Normalize column-wise; batches are encoded straight to JSON bytes as they are sent
+    encoder = BatchEncoder(normalize_frame(df))
+    done, stats = send_batches(
+        client, encoder, workers,
+        on_sent=lambda b: checkpoint_batch(checkpoint, df.iloc[b.start:b.stop], b.start),
+    )
+
+    touched = set()
+    if done or len(checkpoint):
+        # the journal covers this run's batches and those of an interrupted one
+        touched = partitions_of(checkpointed_rows(checkpoint))
+        sent = pd.concat([df.iloc[b.start:b.stop] for b in done], ignore_index=True) if done else df.iloc[0:0]
+        save_state(record_sent(state, sent))
+        record_rows_out(sent)
+    # everything journaled is in the saved state now
+    checkpoint.reset()
 
-    for start in range(0, total_rows, BATCH_SIZE):
-        batch = records[start:start + BATCH_SIZE]
-        try:
-            insert_batch(client, batch)
-            inserted_rows += len(batch)
-        except Exception:
-            failed_batches += 1
-            logger.exception(
-                "Failed to insert batch rows %d-%d",
-                start + 1,
-                start + len(batch),
-            )
+    # keep the analysis aggregates in step: recompute the (city, date) partitions that got rows,
+    # except those still holding rows of failed batches (the staged dataset has them, the table
+    # does not); the rerun that sends those rows refreshes them
+    if stats["failed_batches"]:
+        landed = np.zeros(len(df), dtype=bool)
+        for b in done:
+            landed[b.start:b.stop] = True
+        pending = partitions_of(df[~landed])
+        if touched & pending:
+            logger.warning("Aggregates of %d (city, date) partitions left as they were until their rows load",
+                           len(touched & pending))
+        touched -= pending
+    if touched:
+        AggregateStore().refresh(touched)
+        logger.info("Refreshed aggregates for %d (city, date) partitions", len(touched))
 
     # Print summary
     print("\n=== LOAD SUMMARY ===")
-    print("Total rows:", total_rows)
-    print("Rows inserted:", inserted_rows)
-    print("Batches attempted:", (total_rows + BATCH_SIZE - 1) // BATCH_SIZE)
-    print("Failed batches:", failed_batches)
+    print("Staged rows:", staged_rows)
+    print("Unchanged rows skipped:", staged_rows - encoder.n_rows)
+    print("Total rows:", encoder.n_rows)
+    print("Rows upserted:", stats["rows"])
+    print(f"Throughput: {stats['rows_per_second']:,.0f} rows/s ({stats['seconds']:.1f}s, {workers} in flight)")
+    print("Batches sent:", stats["batches"])
+    print("Failed batches:", stats["failed_batches"])
+    if stats["failed_batches"]:
+        raise LoadError(f"{stats['failed_batches']} batches failed; rerun the load to send their rows")
 
 
-def main():
+def main(cities=None, start=None, end=None, only_changed=True, workers=LOAD_WORKERS, client=None):
     logger.info("Starting load job")
-    client = get_supabase_client()
-    df = read_csv(CSV_PATH)
-    load_to_supabase(df, client)
+    client = client if client is not None else get_supabase_client()
+    df = read_staged_data(cities, start, end)
+    load_to_supabase(df, client, only_changed, workers)
     logger.info("Load job finished")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Load staged air-quality data into Supabase")
+    parser.add_argument("--city", action="append", dest="cities", help="only this city (repeatable)")
+    parser.add_argument("--start", help="only rows with time >= START (ISO date/time, UTC)")
+    parser.add_argument("--end", help="only rows with time < END (ISO date/time, UTC)")
+    parser.add_argument("--resend-all", action="store_true",
+                        help="upsert every staged row, not only rows changed since the last load")
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS, help="batches in flight")
+    args = parser.parse_args()
+    main(args.cities, args.start, args.end, only_changed=not args.resend_all, workers=args.workers)
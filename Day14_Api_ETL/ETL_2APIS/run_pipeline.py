@@ -1,33 +1,65 @@
 # run_pipeline.py
+#
+# Runs extract → transform → load → analyze as a DAG (see etl_common/pipeline_dag.py):
+# extract always asks the API; every later stage is skipped when the content of
+# its inputs is the same as on its last successful run, so a run without new
+# data only pays for the API round-trips. Per-stage timings are printed at the end
+# and a metrics report (etl_common/run_metrics.py) is written to data/metrics/.
 
-import time
+import argparse
+import sys
+from pathlib import Path
 
-from extract import extract_all_cities          # or your main extract fn
-from transform import main as transform_main    # or transform_all(...)
-from load import main as load_main              # or load_to_supabase(...)
-from etl_analysis import main as analysis_main  # or run_analysis(...)
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # repo root, for etl_common
+import station_registry
+from extract import extract_all_cities, extract_due_stations
+from transform import LANDING_DIR, RAW_DIR, main as transform_main
+from staged_store import DATASET_DIR
+from load import LOAD_STATE_PATH, main as load_main
+from etl_analysis import OUTPUT_DIR, main as analysis_main
+from etl_common.pipeline_dag import Pipeline, Stage
+from etl_common.run_metrics import RUN
 
+BASE_DIR = Path(__file__).resolve().parent
+STATE_PATH = BASE_DIR / "data" / "pipeline_state.json"
+METRICS_DIR = BASE_DIR / "data" / "metrics"
 
-def run_full_pipeline():
-    # 1) Extract
-    print("Step 1: Extract...")
-    extract_all_cities()        # adjust to your real function name
-    time.sleep(1)               # small pause (optional)
 
-    # 2) Transform
-    print("Step 2: Transform...")
-    transform_main()
+def extract():
+    if station_registry.REGISTRY_FILE.exists():
+        extract_due_stations()
+    else:
+        extract_all_cities()
 
-    # 3) Load
-    print("Step 3: Load...")
-    load_main()
 
-    # 4) Analyze
-    print("Step 4: Analyze...")
-    analysis_main()
+def build_pipeline() -> Pipeline:
+    return Pipeline([
+        # the API (with its ETag cache) decides whether there is anything new
+        Stage("extract", lambda _: extract(), always=True),
+        Stage("transform", lambda _: transform_main(), after=["extract"],
+              inputs=[RAW_DIR, LANDING_DIR / "index.ndjson"], outputs=[DATASET_DIR]),
+        # a load with failed batches raises (LoadError), so it is not cached and runs again
+        Stage("load", lambda _: load_main(), after=["transform"],
+              inputs=[DATASET_DIR], outputs=[Path(LOAD_STATE_PATH)]),
+        # the load state only changes when rows were actually upserted
+        Stage("analyze", lambda _: analysis_main(), after=["load"],
+              inputs=[Path(LOAD_STATE_PATH)], outputs=[Path(OUTPUT_DIR) / "summary_metrics.csv"]),
+    ], STATE_PATH, metrics=RUN)
 
+
+def run_full_pipeline(force: bool = False, profile: str | None = None, prometheus: bool = False):
+    RUN.start("air_quality", METRICS_DIR, profile=profile)
+    reports = build_pipeline().run(force=force)
+    print("Metrics:", RUN.write_report(prometheus=prometheus))
+    if any(r.status == "failed" for r in reports):
+        raise SystemExit("❌ Pipeline failed.")
     print("✅ Pipeline finished.")
 
 
 if __name__ == "__main__":
-    run_full_pipeline()
+    parser = argparse.ArgumentParser(description="Run the air-quality ETL pipeline")
+    parser.add_argument("--force", action="store_true", help="run every stage even if its inputs are unchanged")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], help="profile every stage (see etl_common/run_metrics.py)")
+    parser.add_argument("--prometheus", action="store_true", help="also write the metrics in Prometheus text format")
+    args = parser.parse_args()
+    run_full_pipeline(force=args.force, profile=args.profile, prometheus=args.prometheus)
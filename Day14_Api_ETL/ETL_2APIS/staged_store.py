@@ -0,0 +1,258 @@
+"""
+staged_store.py
+
+Partitioned Parquet dataset for the transformed air-quality rows.
+
+Instead of one air_quality_transformed.csv/.parquet rewritten on every run, the
+staged rows live in a Hive-partitioned dataset:
+
+  data/staged/air_quality/city=<city>/date=<YYYY-MM-DD>/part.parquet
+
+A write reads the partitions it touches in one dataset scan, merges them with
+the new rows in one pass and writes every partition with one write_dataset
+call into a scratch directory; each file is then moved into place with
+os.replace, so readers never see half a partition and a crash leaves the old
+file intact. Incremental runs only rewrite the partitions they touch.
+
+Columns are stored with compact dtypes: categorical city / aqi_pm25 / risk,
+float32 pollutants, int8 hour and tz-aware UTC time / fetched_at. A partition
+holds one row per time: when forecast windows overlap, the row from the latest
+fetch wins (keep_latest). Readers use pyarrow
+datasets, so city/date filters prune whole partitions, time filters are pushed
+down to the row groups and only the requested columns are decoded. A dataset
+keeps the Parquet metadata of every file it opened until it is dropped, so
+large reads scan SCAN_FILES partitions at a time.
+"""
+
+import os
+import shutil
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# ---------------- Config ----------------
+BASE_DIR = Path(__file__).resolve().parent
+DATASET_DIR = BASE_DIR / "data" / "staged" / "air_quality"
+PART_FILE = "part.parquet"
+SCAN_FILES = 500  # partition files per dataset scan (each file's metadata is held until the scan ends)
+
+POLLUTANTS = [
+    "pm10",
+    "pm2_5",
+    "carbon_monoxide",
+    "nitrogen_dioxide",
+    "sulphur_dioxide",
+    "ozone",
+    "uv_index",
+]
+CATEGORICAL_COLUMNS = ["aqi_pm25", "risk"]
+# city and date are encoded in the directory names, not stored in the files
+PARTITION_COLUMNS = ["city", "date"]
+# directory names hold the values as they are (city=Delhi #00001), see partition_path
+PARTITIONING = ds.HivePartitioning(pa.schema([("city", pa.string()), ("date", pa.string())]),
+                                   segment_encoding="none")
+
+
+def to_staging_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast a transformed frame to the staged dtypes (returns a new frame)."""
+    out = df.copy()
+    out["time"] = pd.to_datetime(out["time"], utc=True)
+    if "fetched_at" in out.columns:
+        out["fetched_at"] = pd.to_datetime(out["fetched_at"], utc=True)
+    out["city"] = out["city"].astype("category")
+    for c in POLLUTANTS:
+        if c in out.columns:
+            out[c] = pd.to_numeric(out[c], errors="coerce").astype("float32")
+    for c in CATEGORICAL_COLUMNS:
+        if c in out.columns:
+            out[c] = out[c].astype("category")
+    if "hour" in out.columns:
+        out["hour"] = out["hour"].astype("int8")
+    return out
+
+
+def keep_latest(df: pd.DataFrame, key: List[str], order: str = "fetched_at") -> pd.DataFrame:
+    """
+    One row per key: the one with the latest `order` value (rows without one
+    count as oldest); on ties the row that comes later in df wins.
+    """
+    if order in df.columns:
+        df = df.sort_values(order, kind="stable", na_position="first")
+    return df.drop_duplicates(key, keep="last")
+
+
+def widen_float32(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    float32 columns -> float64 holding the shortest decimal of each value
+    (12.3 stays 12.3 instead of 12.300000190734863), e.g. before sending rows on.
+    """
+    for c in df.columns:
+        if df[c].dtype == np.float32:
+            df[c] = df[c].to_numpy().astype(str).astype("float64")
+    return df
+
+
+def partition_path(city: str, day: date, root: Path = DATASET_DIR) -> Path:
+    return Path(root) / f"city={city}" / f"date={day.isoformat()}" / PART_FILE
+
+
+def _file_table(df: pd.DataFrame) -> pa.Table:
+    # the partition columns live in the path; categoricals are written as plain
+    # strings (Parquet dictionary-encodes them anyway) so every file has the same schema
+    body = df.drop(columns=[c for c in PARTITION_COLUMNS if c in df.columns]).reset_index(drop=True)
+    for c in CATEGORICAL_COLUMNS:
+        if c in body.columns:
+            body[c] = body[c].astype(object).where(body[c].notna(), None)
+    return pa.Table.from_pandas(body, preserve_index=False)
+
+
+def list_partitions(root: Path = DATASET_DIR) -> List[Tuple[str, date]]:
+    root = Path(root)
+    if not root.exists():
+        return []
+    parts = []
+    for path in root.glob(f"city=*/date=*/{PART_FILE}"):
+        city = path.parent.parent.name.split("=", 1)[1]
+        day = date.fromisoformat(path.parent.name.split("=", 1)[1])
+        parts.append((city, day))
+    return sorted(parts)
+
+
+def _day_strings(times: pd.Series) -> np.ndarray:
+    """UTC dates of tz-aware timestamps as YYYY-MM-DD strings (the date partition values)."""
+    return times.dt.tz_convert(None).to_numpy().astype("datetime64[D]").astype(str)
+
+
+def _write_dataset(df: pd.DataFrame, root: Path) -> None:
+    """
+    Write every (city, date) partition of df (staged dtypes, with a date column)
+    with one write_dataset call into a scratch directory under root, then move
+    each file over its partition's part.parquet.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    df = df.sort_values(["city", "date", "time"], kind="stable")
+    table = _file_table(df)
+    table = table.append_column("city", pa.array(df["city"].astype(str).to_numpy(), pa.string()))
+    table = table.append_column("date", pa.array(df["date"].to_numpy(), pa.string()))
+    n_partitions = len(df[["city", "date"]].drop_duplicates())
+    scratch = root / f".write-{uuid.uuid4().hex[:8]}"
+    files = []
+    try:
+        # sorted input and a single writer thread: each partition is one file, rows in time order
+        ds.write_dataset(
+            table, scratch, format="parquet", partitioning=PARTITIONING,
+            basename_template="part-{i}.parquet",
+            file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+            use_threads=False, preserve_order=True, max_partitions=max(n_partitions, 1),
+            file_visitor=lambda f: files.append(Path(f.path)),
+        )
+        if len(files) != n_partitions:
+            raise RuntimeError(f"write_dataset wrote {len(files)} files for {n_partitions} partitions")
+        for f in files:
+            # the writer percent-encodes the directory names (city=Delhi%20%2300001)
+            city = unquote(f.parent.parent.name.split("=", 1)[1])
+            day = date.fromisoformat(unquote(f.parent.name.split("=", 1)[1]))
+            target = partition_path(city, day, root)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(f, target)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def write_partitions(df: pd.DataFrame, root: Path = DATASET_DIR, merge: bool = True,
+                     key: Optional[Iterable[str]] = None) -> List[Tuple[str, date]]:
+    """
+    Write df into its (city, date) partitions and return the partitions written.
+    merge=True combines the rows with what the partition already holds; with a
+    key (columns other than city, e.g. ["time"]) only the latest row per key is
+    kept (see keep_latest). merge=False replaces the partitions outright.
+    """
+    if df.empty:
+        return []
+    key = list(key) if key is not None else None
+    df = to_staging_dtypes(df)
+    df["date"] = _day_strings(df["time"])
+    touched = df[["city", "date"]].astype(str).drop_duplicates()
+    written = sorted((city, date.fromisoformat(day)) for city, day in touched.itertuples(index=False))
+    if merge:
+        existing = read_staged(root, partitions=written)
+        if not existing.empty:
+            existing["date"] = _day_strings(existing["time"])
+            # existing rows first: on equal fetch times the new row wins
+            df = to_staging_dtypes(pd.concat([existing, df], ignore_index=True))
+    if key is not None:
+        df = keep_latest(df, ["city", "date"] + key)
+    _write_dataset(df, root)
+    return written
+
+
+def replace_dataset(df: pd.DataFrame, root: Path = DATASET_DIR) -> List[Tuple[str, date]]:
+    """Full rebuild: write every partition of df and drop partitions df no longer has."""
+    written = write_partitions(df, root, merge=False)
+    keep = set(written)
+    for city, day in list_partitions(root):
+        if (city, day) not in keep:
+            shutil.rmtree(partition_path(city, day, root).parent)
+    return written
+
+
+def _utc(ts) -> pd.Timestamp:
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def read_staged(root: Path = DATASET_DIR, cities: Optional[Iterable[str]] = None,
+                start: Optional[datetime] = None, end: Optional[datetime] = None,
+                columns: Optional[List[str]] = None,
+                partitions: Optional[Iterable[Tuple[str, date]]] = None) -> pd.DataFrame:
+    """
+    Read staged rows, optionally only some cities, a time window [start, end)
+    and a subset of columns. Returns city as a column alongside the requested ones.
+    partitions limits the read to those (city, date) partitions, opened straight
+    from their files (no directory listing); missing ones are skipped.
+    """
+    root = Path(root)
+    partitions = list_partitions(root) if partitions is None else list(partitions)
+    expr = None
+
+    def both(a, b):
+        return b if a is None else a & b
+
+    # city/date filters pick the files, the time filter goes to the scan
+    if cities is not None:
+        cities = set(map(str, cities))
+        partitions = [(c, d) for c, d in partitions if c in cities]
+    if start is not None:
+        start = _utc(start)
+        partitions = [(c, d) for c, d in partitions if d >= start.date()]
+        expr = both(expr, ds.field("time") >= pa.scalar(start.to_pydatetime(), pa.timestamp("us", "UTC")))
+    if end is not None:
+        end = _utc(end)
+        partitions = [(c, d) for c, d in partitions if d <= end.date()]
+        expr = both(expr, ds.field("time") < pa.scalar(end.to_pydatetime(), pa.timestamp("us", "UTC")))
+    files = [str(p) for p in (partition_path(c, d, root) for c, d in partitions) if p.exists()]
+    if not files:
+        return pd.DataFrame()
+
+    if columns is not None:
+        columns = ["city"] + [c for c in columns if c not in ("city", "date")]
+    tables = [
+        ds.dataset(files[i:i + SCAN_FILES], format="parquet", partitioning=PARTITIONING,
+                   partition_base_dir=str(root)).to_table(columns=columns, filter=expr).combine_chunks()
+        for i in range(0, len(files), SCAN_FILES)
+    ]
+    df = pa.concat_tables(tables, promote_options="default").to_pandas()
+    df = df[["city"] + [c for c in df.columns if c not in ("city", "date")]]
+    for c in ["city"] + CATEGORICAL_COLUMNS:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+    sort_cols = [c for c in ("city", "time") if c in df.columns]
+    return df.sort_values(sort_cols).reset_index(drop=True) if sort_cols else df
@@ -0,0 +1,97 @@
+"""
+station_registry.py
+
+Registry of monitoring stations for the air-quality extractor.
+
+Stations are read from data/stations.csv (or a .json list of objects) with columns:
+  station_id, city, latitude, longitude, interval_minutes
+
+interval_minutes is the station's fetch schedule. The time each station was last
+fetched successfully (its watermark) is kept in data/station_state.json, so a run
+only selects the stations that are due instead of refetching everything.
+"""
+
+import csv
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# ---------------- Config ----------------
+BASE_DIR = Path(__file__).resolve().parent
+REGISTRY_FILE = BASE_DIR / "data" / "stations.csv"
+STATE_FILE = BASE_DIR / "data" / "station_state.json"
+
+DEFAULT_INTERVAL_MINUTES = 60
+
+
+@dataclass
+class Station:
+    station_id: str
+    city: str
+    latitude: float
+    longitude: float
+    interval_minutes: int = DEFAULT_INTERVAL_MINUTES
+    last_fetched: Optional[datetime] = None
+
+    def is_due(self, now: datetime) -> bool:
+        if self.last_fetched is None:
+            return True
+        return now - self.last_fetched >= timedelta(minutes=self.interval_minutes)
+
+
+# ---------------- Registry ----------------
+
+def _read_rows(path: Path) -> List[Dict]:
+    if path.suffix.lower() == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def load_registry(path: Optional[Path] = None, state_path: Optional[Path] = None) -> List[Station]:
+    """Load all stations and attach their last-fetched watermark."""
+    path = Path(path or REGISTRY_FILE)
+    watermarks = load_watermarks(state_path)
+    stations = []
+    for row in _read_rows(path):
+        sid = str(row["station_id"]).strip()
+        stations.append(Station(
+            station_id=sid,
+            city=str(row.get("city") or sid).strip(),
+            latitude=float(row["latitude"]),
+            longitude=float(row["longitude"]),
+            interval_minutes=int(row.get("interval_minutes") or DEFAULT_INTERVAL_MINUTES),
+            last_fetched=watermarks.get(sid),
+        ))
+    return stations
+
+
+def due_stations(stations: Iterable[Station], now: datetime) -> List[Station]:
+    return [s for s in stations if s.is_due(now)]
+
+
+# ---------------- Watermarks ----------------
+
+def load_watermarks(state_path: Optional[Path] = None) -> Dict[str, datetime]:
+    state_path = Path(state_path or STATE_FILE)
+    if not state_path.exists():
+        return {}
+    with open(state_path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    return {sid: datetime.fromisoformat(ts) for sid, ts in raw.items()}
+
+
+def mark_fetched(station_ids: Iterable[str], when: datetime, state_path: Optional[Path] = None) -> None:
+    """Advance the watermark of the given stations (written atomically)."""
+    state_path = Path(state_path or STATE_FILE)
+    watermarks = load_watermarks(state_path)
+    for sid in station_ids:
+        watermarks[sid] = when
+    tmp = state_path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({sid: ts.isoformat() for sid, ts in watermarks.items()}, f, indent=2)
+    os.replace(tmp, state_path)
@@ -0,0 +1,276 @@
+"""
+stream.py
+
+Streaming mode: extract → transform → load in memory, without intermediate files.
+
+The batch pipeline hands data from stage to stage on disk. Landing records are
+re-read by transform. Staged partitions are re-read by load. A row reaches the
+table only after every city was fetched and every stage finished. Here instead:
+
+  fetch threads ──(one featurized frame per city)──▶ bounded queue ──▶ loader
+
+- Every city response is flattened and featurized as soon as it arrives
+  (transform.flatten_columns / featurize), with the same rows and dtypes the
+  batch path would stage (to_staging_dtypes + load.plain_dtypes).
+- Frames wait in a queue of at most QUEUE_SIZE frames. When the loader falls
+  behind, fetching blocks instead of piling responses up in memory.
+- The loader takes whatever is queued (up to FLUSH_ROWS rows) and upserts it
+  with the batch loader's machinery (select_changed, BatchEncoder,
+  send_batches). It records the sent rows in the shared load state, so a later
+  batch load does not send them again.
+- Streaming keeps its own HTTP cache (STREAM_CACHE_DIR), so a streamed payload
+  still reaches extract / transform / the aggregate store as changed. A response
+  is committed to that cache only after a flush sent all of its rows; after a
+  failed flush the next run fetches it as changed again.
+
+Landing records (--land) and staged partitions (--stage) are optional. The
+aggregate store is computed from staged partitions, so streamed rows reach it
+only with --stage: the store is then refreshed at the end of the run for the
+partitions written, except those holding rows of a failed flush. Without
+--stage, run `python aggregate_store.py --rebuild` once a batch transform has
+staged the same payloads: the batch load skips rows the stream already sent, so
+it does not refresh their partitions. Each flush reports how long its oldest row
+took from fetch to being queryable.
+
+    python stream.py                   # all cities, nothing written but the load state
+    python stream.py --land --stage    # also keep landing records and staged partitions
+"""
+
+import argparse
+import logging
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # repo root, for etl_common
+from aggregate_store import AggregateStore
+from extract import (
+    CACHE_FRESHNESS_SECONDS, CITIES, MAX_WORKERS, ExtractError, city_params, fetch_json, save_raw,
+)
+from etl_common.http_cache import CachedResponse, HttpCache
+from load import (
+    LOAD_WORKERS, BatchEncoder, get_supabase_client, load_state, normalize_frame, partitions_of, plain_dtypes,
+    record_rows_out, record_sent, save_state, select_changed, send_batches,
+)
+from etl_common.run_metrics import RUN
+from staged_store import keep_latest, to_staging_dtypes, write_partitions
+from transform import columns_to_frame, featurize, flatten_columns
+
+# ---------------- Config ----------------
+QUEUE_SIZE = 16     # featurized city frames waiting for the loader
+FLUSH_ROWS = 5000   # rows the loader upserts at most per flush
+METRICS_DIR = Path(__file__).resolve().parent / "data" / "metrics"
+STREAM_CACHE_DIR = Path(__file__).resolve().parent / "data" / "http_cache_stream"
+PUT_TIMEOUT = 0.5   # seconds between checks for a stopped loader while the queue is full
+
+_DONE = object()
+_stream_cache = HttpCache(STREAM_CACHE_DIR, CACHE_FRESHNESS_SECONDS)
+
+# the root logger writes to extract.log (configured by extract.py); also print to stdout
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+def city_frame(city: str, payload: dict, fetched_at: datetime) -> Optional[pd.DataFrame]:
+    """One response -> featurized rows in loader dtypes (None when it has no hourly data)."""
+    cols = flatten_columns(payload, city)
+    if cols is None:
+        return None
+    fetched = pd.Timestamp(fetched_at).tz_convert("UTC").tz_localize(None)
+    cols["fetched_at"] = np.full(len(cols["time"]), fetched.to_datetime64())
+    df = featurize(columns_to_frame([(city, cols)]))
+    return plain_dtypes(to_staging_dtypes(df))
+
+
+def fetch_city(city: str, lat: float, lon: float,
+               land: bool = False) -> Optional[Tuple[pd.DataFrame, CachedResponse]]:
+    """
+    Fetch and featurize one city: (frame, response to commit once the frame is
+    loaded), or None when it failed or its payload is unchanged.
+    """
+    try:
+        data, response = fetch_json(city, city_params(lat, lon), cache=_stream_cache)
+    except ExtractError as e:
+        logger.error("Fetch failed for %s: %s", city, e)
+        if land:
+            save_raw(city, {"city": city, "error": str(e)}, tag="error")
+        return None
+    if not response.changed or not data:
+        logger.info("%s: %s", city, "unchanged since last run" if data else "empty response")
+        return None
+    fetched_at = datetime.now(timezone.utc)
+    if land:
+        save_raw(city, data, tag="raw")
+    frame = city_frame(city, data, fetched_at)
+    if frame is None or frame.empty:
+        response.commit()  # nothing to load
+        return None
+    return frame, response
+
+
+class StreamLoader:
+    """Upserts frames as they come, keeping the shared load state (load.LOAD_STATE_PATH) current."""
+
+    def __init__(self, client, workers: int = LOAD_WORKERS, only_changed: bool = True, stage: bool = False):
+        self.client = client
+        self.workers = workers
+        self.stage = stage
+        self.state = load_state() if only_changed else load_state().iloc[0:0]
+        self.rows_sent = 0
+        self.rows_skipped = 0
+        self.latencies: List[float] = []
+        self.partitions = set()
+        self.failed_partitions = set()  # staged, but some of their rows did not load
+
+    def flush(self, frames: List[pd.DataFrame], responses: List[CachedResponse] = ()) -> int:
+        """
+        Upsert the rows of frames that changed; returns the number of rows sent.
+        The frames' responses are committed to the HTTP cache unless a batch failed.
+        """
+        df = keep_latest(pd.concat(frames, ignore_index=True), ["city", "time"])
+        RUN.add("load", rows_in=len(df))
+        if self.stage:
+            self.partitions.update(write_partitions(df, key=["time"]))
+        changed = select_changed(df, self.state)
+        self.rows_skipped += len(df) - len(changed)
+        if changed.empty:
+            for response in responses:
+                response.commit()
+            return 0
+        encoder = BatchEncoder(normalize_frame(changed))
+        done, stats = send_batches(self.client, encoder, self.workers)
+        sent = (pd.concat([changed.iloc[b.start:b.stop] for b in done], ignore_index=True)
+                if done else changed.iloc[0:0])
+        self.state = record_sent(self.state, sent)
+        save_state(self.state)
+        if stats["failed_batches"]:
+            logger.error("%d batches failed; their rows are retried on the next run", stats["failed_batches"])
+            if self.stage:
+                landed = np.zeros(len(changed), dtype=bool)
+                for b in done:
+                    landed[b.start:b.stop] = True
+                self.failed_partitions.update(partitions_of(changed[~landed]))
+        else:
+            for response in responses:
+                response.commit()
+        record_rows_out(sent)
+        self.rows_sent += len(sent)
+        oldest = pd.to_datetime(changed["fetched_at"], utc=True).min()
+        self.latencies.append((pd.Timestamp.now(tz="UTC") - oldest).total_seconds())
+        return len(sent)
+
+    def close(self) -> None:
+        partitions = self.partitions - self.failed_partitions
+        if self.stage and partitions:
+            AggregateStore().refresh(partitions)
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> None:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=PUT_TIMEOUT)
+            return
+        except queue.Full:
+            continue
+
+
+def _produce(cities: Dict[str, Tuple[float, float]], q: queue.Queue, stop: threading.Event,
+             land: bool, workers: int) -> None:
+    def one(city, lat, lon):
+        if stop.is_set():
+            return
+        try:
+            fetched = fetch_city(city, lat, lon, land)
+        except Exception:
+            logger.exception("Streaming %s failed", city)
+            return
+        if fetched is not None:
+            _put(q, fetched, stop)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda item: one(item[0], *item[1]), cities.items()))
+    finally:
+        _put(q, _DONE, stop)
+
+
+def run_stream(cities: Dict[str, Tuple[float, float]] = CITIES, client=None, land: bool = False,
+               stage: bool = False, fetch_workers: int = MAX_WORKERS, load_workers: int = LOAD_WORKERS,
+               only_changed: bool = True, queue_size: int = QUEUE_SIZE) -> StreamLoader:
+    """
+    Stream every city from the API into the table. Fetching runs on a thread
+    pool in the background; this thread loads. Returns the loader (counters, latencies).
+    """
+    client = client if client is not None else get_supabase_client()
+    loader = StreamLoader(client, load_workers, only_changed, stage)
+    q: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    producer = threading.Thread(target=_produce, args=(cities, q, stop, land, fetch_workers), daemon=True)
+    t0 = time.perf_counter()
+    producer.start()
+    try:
+        item = None
+        while item is not _DONE:
+            # block for the next frame, then take whatever else is already waiting (up to FLUSH_ROWS rows)
+            item = q.get()
+            frames, responses, rows = [], [], 0
+            while item is not _DONE:
+                frame, response = item
+                frames.append(frame)
+                responses.append(response)
+                rows += len(frame)
+                if rows >= FLUSH_ROWS:
+                    break
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+            if frames:
+                sent = loader.flush(frames, responses)
+                if sent:
+                    logger.info("Flushed %d frames: %d rows upserted %.1fs after fetch",
+                                len(frames), sent, loader.latencies[-1])
+                else:
+                    logger.info("Flushed %d frames: nothing changed", len(frames))
+    finally:
+        stop.set()  # unblocks fetch threads if the loader failed
+        producer.join()
+    loader.close()
+
+    elapsed = time.perf_counter() - t0
+    print("\n=== STREAM SUMMARY ===")
+    print("Rows upserted:", loader.rows_sent)
+    print("Unchanged rows skipped:", loader.rows_skipped)
+    if loader.latencies:
+        print(f"Fetch → queryable: median {np.median(loader.latencies):.1f}s, max {max(loader.latencies):.1f}s")
+    print(f"Total time: {elapsed:.1f}s")
+    return loader
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream air-quality data from the API straight into Supabase")
+    parser.add_argument("--city", action="append", dest="cities", help="only this city (repeatable)")
+    parser.add_argument("--land", action="store_true", help="also append raw responses to the landing store")
+    parser.add_argument("--stage", action="store_true",
+                        help="also write staged partitions (and refresh the aggregate store)")
+    parser.add_argument("--resend-all", action="store_true", help="upsert every row, not only changed ones")
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS, help="load batches in flight")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], help="profile the run (see etl_common/run_metrics.py)")
+    parser.add_argument("--prometheus", action="store_true", help="also write the metrics in Prometheus text format")
+    args = parser.parse_args()
+    cities = {c: CITIES[c] for c in args.cities} if args.cities else CITIES
+    RUN.start("air_quality_stream", METRICS_DIR, profile=args.profile)
+    try:
+        with RUN.stage("stream"):
+            run_stream(cities, land=args.land, stage=args.stage, load_workers=args.workers,
+                       only_changed=not args.resend_all)
+    finally:
+        print("Metrics:", RUN.write_report(prometheus=args.prometheus))
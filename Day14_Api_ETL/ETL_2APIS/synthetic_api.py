@@ -0,0 +1,203 @@
+"""
+synthetic_api.py
+
+Offline stand-in for the Open-Meteo air-quality API.
+
+SyntheticTransport is a requests transport adapter. Mounted on extract's shared
+session (extract.mount_transport) it answers every request for extract.URL with
+generated payloads instead of going to the network. Payloads have the API's
+shape: latitude / longitude may be comma-separated lists (one payload per
+location, returned as a list), and "hourly" holds the requested variables.
+Values are deterministic per (location, first day), so a repeated request returns
+the same bytes and the HTTP cache sees it as unchanged, as with the real API
+between model updates.
+
+Knobs:
+  days        hours per payload = 24 * days, from today's midnight UTC
+  null_rate   fraction of readings returned as null
+  latency     mean seconds per response (exponentially distributed)
+  error_rate  fraction of requests answered with error_status
+
+    transport = SyntheticTransport(days=5, null_rate=0.05, latency=0.2)
+    extract.mount_transport(transport)
+    extract.extract_due_stations()
+
+synthetic_stations(n, centers) builds a registry of n distinct stations spread
+around the given cities; write_registry() saves it in station_registry's CSV format.
+"""
+
+import csv
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+# ---------------- Config ----------------
+HOURLY_UNITS = {
+    "pm10": "μg/m³",
+    "pm2_5": "μg/m³",
+    "carbon_monoxide": "μg/m³",
+    "nitrogen_dioxide": "μg/m³",
+    "ozone": "μg/m³",
+    "sulphur_dioxide": "μg/m³",
+    "uv_index": "",
+}
+# typical level and log-normal spread of each pollutant (Indian metros)
+LEVELS = {
+    "pm10": (90.0, 0.6),
+    "pm2_5": (60.0, 0.7),
+    "carbon_monoxide": (700.0, 0.5),
+    "nitrogen_dioxide": (30.0, 0.6),
+    "ozone": (60.0, 0.5),
+    "sulphur_dioxide": (15.0, 0.6),
+}
+UV_PEAK = (6.0, 11.0)  # range of the midday UV index peak
+STATION_SPREAD = 0.5   # degrees around the city centre
+
+
+def _seed(lat: float, lon: float, start: np.datetime64) -> int:
+    return zlib.crc32(f"{lat:.4f},{lon:.4f},{start}".encode("ascii"))
+
+
+def hourly_payload(lat: float, lon: float, start: np.datetime64, hours: int, variables: List[str],
+                   null_rate: float = 0.0) -> dict:
+    """One location's payload: `hours` hourly readings of `variables` from `start` (UTC)."""
+    rng = np.random.default_rng(_seed(lat, lon, start))
+    times = start + np.arange(hours).astype("timedelta64[h]")
+    hour_of_day = (times - times.astype("datetime64[D]")).astype("int64")
+    diurnal = np.sin((hour_of_day - 6) / 24 * 2 * np.pi)  # peaks mid-day
+
+    hourly = {"time": np.datetime_as_string(times, unit="m").tolist()}
+    for var in variables:
+        if var == "uv_index":
+            values = np.round(np.clip(diurnal, 0, None) * rng.uniform(*UV_PEAK), 2)
+        else:
+            level, spread = LEVELS.get(var, (50.0, 0.5))
+            base = level * rng.uniform(0.5, 1.5)
+            values = np.round(base * (1 + 0.3 * diurnal) * rng.lognormal(0, spread, hours), 1)
+        values = values.astype(object)
+        values[rng.random(hours) < null_rate] = None
+        hourly[var] = values.tolist()
+
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "generationtime_ms": 0.1,
+        "utc_offset_seconds": 0,
+        "timezone": "GMT",
+        "timezone_abbreviation": "GMT",
+        "elevation": 0.0,
+        "hourly_units": {"time": "iso8601", **{v: HOURLY_UNITS.get(v, "") for v in variables}},
+        "hourly": hourly,
+    }
+
+
+class SyntheticTransport(BaseAdapter):
+    """requests adapter answering air-quality requests with generated payloads."""
+
+    def __init__(self, days: int = 5, null_rate: float = 0.0, latency: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, seed: int = 0,
+                 now: Optional[datetime] = None):
+        super().__init__()
+        self.days = days
+        self.null_rate = null_rate
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.now = now
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.rows_served = 0
+
+    def payload(self, query: Dict[str, str]):
+        lats = [float(v) for v in query["latitude"].split(",")]
+        lons = [float(v) for v in query["longitude"].split(",")]
+        if len(lats) != len(lons):
+            raise ValueError("latitude and longitude lists differ in length")
+        variables = [v for v in query.get("hourly", "").split(",") if v]
+        now = self.now or datetime.now(timezone.utc)
+        start = np.datetime64(now.date(), "h")
+        hours = 24 * self.days
+        items = [hourly_payload(lat, lon, start, hours, variables, self.null_rate) for lat, lon in zip(lats, lons)]
+        with self._lock:
+            self.rows_served += hours * len(items)
+        return items[0] if len(items) == 1 else items
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        with self._lock:
+            delay = self._rng.expovariate(1 / self.latency) if self.latency > 0 else 0.0
+            failed = self._rng.random() < self.error_rate
+            self.requests += 1
+            self.errors += failed
+        time.sleep(delay)
+
+        if failed:
+            status, body = self.error_status, {"error": True, "reason": "synthetic error"}
+        else:
+            query = {k: v[-1] for k, v in parse_qs(urlsplit(request.url).query).items()}
+            try:
+                status, body = 200, self.payload(query)
+            except (KeyError, ValueError) as e:
+                status, body = 400, {"error": True, "reason": f"Bad request: {e}"}
+        return self._response(request, status, json.dumps(body).encode("utf-8"))
+
+    def _response(self, request, status: int, content: bytes) -> requests.Response:
+        resp = requests.Response()
+        resp.status_code = status
+        resp.reason = "OK" if status < 400 else "Error"
+        resp._content = content
+        resp.headers = CaseInsensitiveDict({"Content-Type": "application/json",
+                                            "Content-Length": str(len(content))})
+        resp.encoding = "utf-8"
+        resp.url = request.url
+        resp.request = request
+        resp.connection = self
+        return resp
+
+    def close(self):
+        pass
+
+
+# ---------------- Station registry ----------------
+
+def synthetic_stations(n: int, centers: Dict[str, Tuple[float, float]], seed: int = 0) -> List[dict]:
+    """
+    n stations spread around the given cities. Each station gets its own city
+    label ("Delhi #00001"), since rows are keyed by (city, time).
+    """
+    rng = np.random.default_rng(seed)
+    names = list(centers)
+    stations = []
+    for i in range(n):
+        city = names[i % len(names)]
+        lat, lon = centers[city]
+        d_lat, d_lon = rng.uniform(-STATION_SPREAD, STATION_SPREAD, 2)
+        stations.append({
+            "station_id": f"S{i:05d}",
+            "city": f"{city} #{i:05d}",
+            "latitude": round(lat + d_lat, 4),
+            "longitude": round(lon + d_lon, 4),
+            "interval_minutes": 60,
+        })
+    return stations
+
+
+def write_registry(path: Path, stations: List[dict]) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["station_id", "city", "latitude", "longitude", "interval_minutes"])
+        writer.writeheader()
+        writer.writerows(stations)
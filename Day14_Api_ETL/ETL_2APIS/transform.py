@@ -48,28 +48,49 @@ Derived features:
  - risk: High/Moderate/Low based on severity thresholds
  - hour: hour of day extracted from time
 
-Saves combined transformed table to:
-  data/staged/air_quality_transformed.csv
-  data/staged/air_quality_transformed.parquet
+Saves the transformed rows into the partitioned Parquet dataset (see staged_store.py):
+  data/staged/air_quality/city=<city>/date=<YYYY-MM-DD>/part.parquet
 """
 
+import argparse
+import hashlib
 import json
 import logging
-from datetime import datetime
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Set, Tuple
 
 import pandas as pd
 import numpy as np
 
+try:
+    import orjson
+except ImportError:  # optional, stdlib json is the fallback
+    orjson = None
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # repo root, for etl_common
+from etl_common.raw_store import RawStore
+from staged_store import DATASET_DIR, keep_latest, list_partitions, partition_path, replace_dataset, write_partitions
+from etl_common.run_metrics import RUN
+
 # ---------------- Config ----------------
 PROJECT_ROOT = Path(__file__).resolve().parent
 RAW_DIR = PROJECT_ROOT / "data" / "raw"
+LANDING_DIR = PROJECT_ROOT / "data" / "landing"
 STAGED_DIR = PROJECT_ROOT / "data" / "staged"
 STAGED_DIR.mkdir(parents=True, exist_ok=True)
 
-CSV_OUT = STAGED_DIR / "air_quality_transformed.csv"
-PARQUET_OUT = STAGED_DIR / "air_quality_transformed.parquet"
+# Inputs already folded into the staged outputs (see TransformManifest)
+MANIFEST_PATH = STAGED_DIR / "transform_manifest.json"
+
+# Parallel parsing: inputs are handed to worker processes in groups of this size,
+# and runs with fewer inputs than MIN_PARALLEL_SOURCES are parsed in-process
+PARSE_CHUNK_SIZE = 8
+MIN_PARALLEL_SOURCES = 16
 
 # Pollutant keys we expect (names used in Open-Meteo hourly)
 POLLUTANTS = [
@@ -107,9 +128,91 @@ def infer_city_from_filename(path: Path) -> str:
     return token.capitalize()
 
 
+def fetched_at_from_filename(path: Path) -> datetime:
+    """
+    When a legacy raw file was fetched: the timestamp in its name
+    (delhi_raw_20251211_123000.json, delhi_openaq_latest_20251211T123000Z.json),
+    else its modification time. Read as UTC.
+    """
+    m = re.search(r"(\d{8})[_T](\d{6})", path.stem)
+    if m:
+        return datetime.strptime(m.group(1) + m.group(2), "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+    return datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc)
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class TransformManifest:
+    """
+    Record of raw inputs already transformed:
+      files        -> {path: {size, mtime, sha256}} for legacy raw JSON files
+      landing_line -> number of landing index lines already consumed
+    A file is re-processed only if its size/mtime changed AND its content hash differs.
+    Listing inputs (iter_raw_sources) does not change it; advance() does, once
+    they are parsed, and main() saves it once the output is written.
+    """
+
+    def __init__(self, files: Dict[str, Dict] | None = None, landing_line: int = 0):
+        self.files = files or {}
+        self.landing_line = landing_line
+        self.landing_listed = landing_line  # end of the landing lines listed so far (not saved)
+
+    @classmethod
+    def load(cls, path: Path = MANIFEST_PATH) -> "TransformManifest":
+        if not path.exists():
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        return cls(raw.get("files"), raw.get("landing_line", 0))
+
+    def save(self, path: Path = MANIFEST_PATH) -> None:
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files, "landing_line": self.landing_line}, f, indent=2)
+        os.replace(tmp, path)
+
+    def is_new(self, path: Path) -> bool:
+        """True if path was never transformed or its content changed since."""
+        seen = self.files.get(str(path))
+        if seen is None:
+            return True
+        st = path.stat()
+        if seen["size"] == st.st_size and seen["mtime"] == st.st_mtime:
+            return False
+        return seen["sha256"] != file_sha256(path)
+
+    def record(self, path: Path) -> None:
+        st = path.stat()
+        self.files[str(path)] = {"size": st.st_size, "mtime": st.st_mtime, "sha256": file_sha256(path)}
+
+    def advance(self, tasks: List, failed: Set[str] = frozenset()) -> None:
+        """
+        Mark the listed tasks as transformed, except the sources in `failed`
+        (file paths / landing refs), which are retried by the next run. The
+        landing watermark stops at the first failed landing record.
+        """
+        failed_lines = []
+        for kind, location, info in tasks:
+            if kind == "file" and location not in failed:
+                self.record(Path(location))
+            elif kind == "landing" and info["ref"] in failed:
+                failed_lines.append(info["line"])
+        self.landing_line = min(failed_lines) if failed_lines else max(self.landing_line, self.landing_listed)
+
+
+def parse_json(data: bytes):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
 def load_json(path: Path) -> dict:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(path, "rb") as f:
+        return parse_json(f.read())
 
 
 def aqi_label_from_pm25(pm25: float) -> str:
@@ -164,13 +267,76 @@ def classify_risk(severity: float) -> str:
     return "Low Risk"
 
 
+# ---------------- Vectorized derived features ----------------
+# Column-wise versions of the three helpers above, with identical results
+# (see bench_transform.py for the parity check). The scalar helpers stay as
+# the reference definition.
+
+SEVERITY_WEIGHTS = [
+    ("pm2_5", 5.0),
+    ("pm10", 3.0),
+    ("nitrogen_dioxide", 4.0),
+    ("sulphur_dioxide", 4.0),
+    ("carbon_monoxide", 2.0),
+    ("ozone", 3.0),
+]
+
+
+def aqi_labels(pm25: pd.Series) -> pd.Series:
+    """aqi_label_from_pm25 for a whole column (NaN and the 50–51, 100–101, 200–201 gaps -> None)."""
+    v = pd.to_numeric(pm25, errors="coerce").to_numpy(dtype="float64")
+    conditions = [
+        v <= 50,
+        (v >= 51) & (v <= 100),
+        (v >= 101) & (v <= 200),
+        (v >= 201) & (v <= 300),
+        v > 300,
+    ]
+    choices = ["Good", "Moderate", "Unhealthy", "Very Unhealthy", "Hazardous"]
+    labels = np.select(conditions, choices, default=None)
+    return pd.Series(labels, index=pm25.index, dtype=object)
+
+
+def severity_scores(df: pd.DataFrame) -> pd.Series:
+    """
+    compute_severity for every row: weighted sum, missing values (or columns) count as 0.
+    Terms are added in the same order as compute_severity so results match bit for bit.
+    """
+    total = np.zeros(len(df), dtype="float64")
+    for col, weight in SEVERITY_WEIGHTS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64")
+            total = total + np.where(np.isnan(values), 0.0, values) * weight
+    return pd.Series(total, index=df.index)
+
+
+def classify_risks(severity: pd.Series) -> pd.Series:
+    """classify_risk for a whole column (NaN -> Low Risk)."""
+    v = severity.to_numpy(dtype="float64")
+    labels = np.where(v > 400, "High Risk", np.where(v > 200, "Moderate Risk", "Low Risk"))
+    return pd.Series(labels, index=severity.index, dtype=object)
+
+
 # ---------------- Main transform routine ----------------
 
 
-def flatten_openeo_meteo_hourly(payload: dict, city: str) -> pd.DataFrame:
+def _float_column(values, n: int) -> np.ndarray:
+    try:
+        arr = np.asarray(values, dtype="float64")  # None -> NaN
+    except (TypeError, ValueError):
+        arr = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype="float64")
+    if len(arr) < n:
+        # ensure length matches times; if shorter, pad with NaN
+        arr = np.concatenate([arr, np.full(n - len(arr), np.nan)])
+    return arr[:n]
+
+
+def flatten_columns(payload: dict, city: str) -> Optional[Dict[str, np.ndarray]]:
     """
-    Given an Open-Meteo air-quality JSON payload and a city name,
-    return a DataFrame with one row per hourly timestamp and pollutant columns.
+    Flatten an Open-Meteo air-quality payload into plain column arrays:
+      time -> datetime64 in UTC, without tz (NaT for unparseable values)
+      <pollutant> -> float64 (NaN for missing)
+    Returns None when the payload has no hourly timestamps.
     """
     # payload expected structure:
     # { "hourly": { "time": [...], "pm10": [...], "pm2_5": [...], ... }, ... }
@@ -178,76 +344,202 @@ def flatten_openeo_meteo_hourly(payload: dict, city: str) -> pd.DataFrame:
     times = hourly.get("time") or []
 
     if not times:
-        logger.warning("No 'time' array in hourly payload for city=%s", city)
-        return pd.DataFrame()  # empty
+        return None
 
-    # build dict of arrays for each pollutant; if missing use list of None
-    data = {"time": times}
     n = len(times)
+    # Open-Meteo returns ISO strings like "2025-12-11T13:00"
+    cols = {"time": pd.to_datetime(times, utc=True, errors="coerce").tz_convert(None).to_numpy()}
     for p in POLLUTANTS:
         arr = hourly.get(p)
         if arr is None:
             # try alternative key name mapping (if underscores vs dots etc.)
             arr = hourly.get(p.replace("_", ".")) or hourly.get(p.replace(".", "_"))
-        if arr is None:
-            # fill with Nones
-            arr = [None] * n
-        # ensure length matches times; if shorter, pad with None
-        if len(arr) < n:
-            arr = list(arr) + [None] * (n - len(arr))
-        data[p] = arr
+        cols[p] = np.full(n, np.nan) if arr is None else _float_column(arr, n)
+    return cols
 
-    df = pd.DataFrame(data)
-    df["city"] = city
 
-    # Convert time column to datetime
-    # Open-Meteo returns ISO strings like "2025-12-11T13:00"
-    df["time"] = pd.to_datetime(df["time"], utc=True, errors="coerce")
-
-    # Cast pollutants to numeric (coerce errors -> NaN)
+def columns_to_frame(parts: List[Tuple[str, Dict[str, np.ndarray]]]) -> pd.DataFrame:
+    """
+    Build one DataFrame from per-source column arrays: every column is
+    concatenated exactly once and city is expanded from per-source codes.
+    A fetched_at column is built too when every part carries one.
+    """
+    if not parts:
+        return pd.DataFrame(columns=["city", "time"] + POLLUTANTS)
+    cities = sorted({city for city, _ in parts})
+    code_of = {city: i for i, city in enumerate(cities)}
+    lengths = [len(cols["time"]) for _, cols in parts]
+    codes = np.repeat(np.array([code_of[city] for city, _ in parts], dtype="int32"), lengths)
+    data = {
+        "city": np.array(cities, dtype=object)[codes],
+        "time": pd.DatetimeIndex(np.concatenate([cols["time"] for _, cols in parts])).tz_localize("UTC"),
+    }
     for p in POLLUTANTS:
-        df[p] = pd.to_numeric(df[p], errors="coerce")
+        data[p] = np.concatenate([cols[p] for _, cols in parts])
+    if all("fetched_at" in cols for _, cols in parts):
+        data["fetched_at"] = pd.DatetimeIndex(np.concatenate([cols["fetched_at"] for _, cols in parts])).tz_localize("UTC")
+    return pd.DataFrame(data)
 
-    # Reorder columns as requested
-    cols = ["city", "time"] + POLLUTANTS
-    df = df[cols]
 
-    return df
+def flatten_openeo_meteo_hourly(payload: dict, city: str) -> pd.DataFrame:
+    """
+    Given an Open-Meteo air-quality JSON payload and a city name,
+    return a DataFrame with one row per hourly timestamp and pollutant columns.
+    """
+    cols = flatten_columns(payload, city)
+    if cols is None:
+        logger.warning("No 'time' array in hourly payload for city=%s", city)
+        return pd.DataFrame()  # empty
+    return columns_to_frame([(city, cols)])
 
 
-def transform_all(raw_dir: Path) -> pd.DataFrame:
+def iter_raw_sources(raw_dir: Path, landing_dir: Path = LANDING_DIR,
+                     manifest: TransformManifest | None = None):
     """
-    Process all JSON files under raw_dir and return combined transformed DataFrame.
+    Yield a picklable task for every raw response without reading it:
+      ("file", path, {"city", "fetched_at"}) legacy JSON files under raw_dir
+      ("landing", landing_dir, index_entry)   records of the compressed landing store
+    Both info dicts carry the city and the ISO time the response was fetched.
+    With a manifest, only inputs not transformed before are yielded; call
+    manifest.advance() with them once they are parsed.
     """
     files: List[Path] = sorted(raw_dir.glob("**/*.*"))  # include nested directories
     logger.info("Found %d raw files under %s", len(files), raw_dir)
-
-    dfs: List[pd.DataFrame] = []
     for f in files:
         # consider only json files
         if f.suffix.lower() not in [".json", ".txt"]:
             continue
+        if manifest is not None and not manifest.is_new(f):
+            continue
+        info = {"city": infer_city_from_filename(f), "fetched_at": fetched_at_from_filename(f).isoformat()}
+        yield "file", str(f), info
+
+    store = RawStore(landing_dir)
+    # seek past the landing records consumed by earlier runs
+    all_entries = store.entries(manifest.landing_line if manifest is not None else 0)
+    if manifest is not None and all_entries:
+        manifest.landing_listed = all_entries[-1]["line"] + 1
+    entries = [e for e in all_entries if e["tag"] == "raw"]
+    logger.info("Found %d new landing records under %s", len(entries), landing_dir)
+    for entry in entries:
+        yield "landing", str(landing_dir), entry
+
+
+def load_source(task) -> Tuple[str, str, dict]:
+    """Read and parse one task from iter_raw_sources -> (source, city, payload)."""
+    kind, location, info = task
+    if kind == "file":
+        payload = load_json(Path(location))
+        # registry extracts carry the city in the payload; older files only in the name
+        return location, payload.get("city") or info["city"], payload
+    payload = parse_json(RawStore(Path(location)).read_bytes(info))
+    return info["ref"], payload.get("city") or info["city"], payload
+
+
+def iter_raw_payloads(raw_dir: Path, landing_dir: Path = LANDING_DIR,
+                      manifest: TransformManifest | None = None):
+    """
+    Yield (source, city, payload) for every raw response, parsed in-process.
+    The manifest advances once every input was yielded.
+    """
+    tasks, failed = [], set()
+    for task in iter_raw_sources(raw_dir, landing_dir, manifest):
+        tasks.append(task)
         try:
-            payload = load_json(f)
+            yield load_source(task)
         except Exception as e:
-            logger.error("Skipping file %s - failed to load JSON: %s", f, e)
-            continue
+            failed.add(task[1] if task[0] == "file" else task[2]["ref"])
+            logger.error("Skipping %s - failed to load JSON: %s", task[1], e)
+    if manifest is not None:
+        manifest.advance(tasks, failed)
+
 
-        city = infer_city_from_filename(f)
-        df = flatten_openeo_meteo_hourly(payload, city)
-        if df.empty:
-            logger.warning("No hourly rows produced for file %s (city=%s)", f, city)
+def _parse_sources(tasks) -> List[Tuple[str, str, Optional[Dict[str, np.ndarray]], Optional[str]]]:
+    """
+    Worker: parse and flatten a group of inputs.
+    Returns (source, city, columns or None, error or None) per input; only numpy
+    arrays travel back to the parent, never DataFrames. columns includes the
+    fetch time of the response repeated per row (fetched_at).
+    """
+    out = []
+    for task in tasks:
+        try:
+            source, city, payload = load_source(task)
+        except Exception as e:
+            out.append((task[1] if task[0] == "file" else task[2]["ref"], None, None, str(e)))
             continue
+        cols = flatten_columns(payload, city)
+        if cols is not None:
+            fetched_at = pd.Timestamp(task[2]["fetched_at"]).tz_convert("UTC").tz_localize(None)
+            cols["fetched_at"] = np.full(len(cols["time"]), fetched_at.to_datetime64())
+        out.append((source, city, cols, None))
+    return out
 
-        dfs.append(df)
 
-    if not dfs:
+def parse_all(tasks: List, workers: Optional[int] = None
+              ) -> Tuple[List[Tuple[str, Dict[str, np.ndarray]]], Set[str]]:
+    """
+    Parse and flatten every task, in a process pool when there are enough inputs
+    (workers=None -> one per CPU, workers=1 -> in-process). Returns the
+    (city, columns) parts in input order and the sources that failed to load.
+    """
+    groups = [tasks[i:i + PARSE_CHUNK_SIZE] for i in range(0, len(tasks), PARSE_CHUNK_SIZE)]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) >= MIN_PARALLEL_SOURCES:
+        with ProcessPoolExecutor(max_workers=min(workers, len(groups))) as pool:
+            results = list(pool.map(_parse_sources, groups))
+    else:
+        results = [_parse_sources(g) for g in groups]
+
+    parts, failed = [], set()
+    for group in results:
+        for source, city, cols, error in group:
+            if error is not None:
+                failed.add(source)
+                logger.error("Skipping %s - failed to load JSON: %s", source, error)
+            elif cols is None:
+                logger.warning("No hourly rows produced for %s (city=%s)", source, city)
+            else:
+                parts.append((city, cols))
+    return parts, failed
+
+
+def transform_all(raw_dir: Path, landing_dir: Path = LANDING_DIR,
+                  manifest: TransformManifest | None = None, workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Process raw responses (JSON files under raw_dir and landing-store records)
+    and return combined transformed DataFrame. With a manifest only new inputs
+    are processed, and the manifest advances past the ones that parsed (inputs
+    that failed to load are retried next run). Inputs are parsed in parallel
+    worker processes (see parse_all).
+    """
+    tasks = list(iter_raw_sources(raw_dir, landing_dir, manifest))
+    RUN.add("transform", bytes_read=sum(
+        Path(location).stat().st_size if kind == "file" else info["length"] for kind, location, info in tasks
+    ))
+    parts, failed = parse_all(tasks, workers)
+    if manifest is not None:
+        manifest.advance(tasks, failed)
+
+    if not parts:
         logger.warning("No dataframes produced from raw files.")
         return pd.DataFrame(columns=["city", "time"] + POLLUTANTS)
 
-    combined = pd.concat(dfs, ignore_index=True)
+    combined = columns_to_frame(parts)
     logger.info("Combined rows before cleaning: %d", len(combined))
+    RUN.add("transform", rows_in=len(combined))
+    df = featurize(combined)
+    for city, rows in df["city"].value_counts().items():
+        RUN.add("transform", city=city, rows_out=int(rows))
+    return df
+
 
+def featurize(combined: pd.DataFrame) -> pd.DataFrame:
+    """
+    Clean flattened rows (columns_to_frame output) and add the derived columns:
+    drops rows without any reading, keeps the latest fetch per (city, time) and
+    returns the staged columns sorted by city/time.
+    """
     # Remove records where all pollutant readings are missing
     pollutant_cols = POLLUTANTS
     combined["all_missing"] = combined[pollutant_cols].isna().all(axis=1)
@@ -256,11 +548,15 @@ def transform_all(raw_dir: Path) -> pd.DataFrame:
     after = len(combined)
     logger.info("Dropped %d rows where all pollutant readings are missing", before - after)
 
+    # Forecast windows of successive fetches overlap: keep the latest reading per (city, time)
+    if "fetched_at" in combined.columns:
+        combined = keep_latest(combined, ["city", "time"])
+        logger.info("Dropped %d superseded (city, time) rows", after - len(combined))
+
     # Derived features
-    combined["aqi_pm25"] = combined["pm2_5"].apply(aqi_label_from_pm25)
-    # severity - use apply row-wise
-    combined["severity"] = combined.apply(compute_severity, axis=1)
-    combined["risk"] = combined["severity"].apply(classify_risk)
+    combined["aqi_pm25"] = aqi_labels(combined["pm2_5"])
+    combined["severity"] = severity_scores(combined)
+    combined["risk"] = classify_risks(combined["severity"])
 
     # hour of day feature (local hour or UTC hour?). We'll extract UTC hour from the timestamp.
     combined["hour"] = combined["time"].dt.hour
@@ -280,6 +576,7 @@ def transform_all(raw_dir: Path) -> pd.DataFrame:
         "aqi_pm25",
         "severity",
         "risk",
+        "fetched_at",
     ]
     # Some columns might be missing if payload lacked them, ensure they exist
     for c in final_cols:
@@ -294,24 +591,38 @@ def transform_all(raw_dir: Path) -> pd.DataFrame:
     return combined
 
 
-def main():
-    logger.info("Starting transform step")
-    df = transform_all(RAW_DIR)
+def main(full_rebuild: bool = False, workers: Optional[int] = None):
+    """
+    Transform only raw inputs not seen before and merge them into the staged
+    dataset. full_rebuild=True ignores the manifest and rewrites everything.
+    workers is the number of parsing processes (default: one per CPU).
+    """
+    logger.info("Starting transform step (%s)", "full rebuild" if full_rebuild else "incremental")
+    if not full_rebuild and MANIFEST_PATH.exists() and not list_partitions(DATASET_DIR):
+        # manifest from a run that wrote the old single-file outputs
+        logger.warning("Staged dataset %s is empty — doing a full rebuild", DATASET_DIR)
+        full_rebuild = True
+    manifest = TransformManifest() if full_rebuild else TransformManifest.load()
+    df = transform_all(RAW_DIR, manifest=manifest, workers=workers)
     if df.empty:
-        logger.warning("Transformed dataframe is empty — nothing to save.")
+        logger.warning("No new raw data to transform — staged outputs left as they are.")
+        manifest.save()
     else:
-        # Save CSV and parquet
-        df.to_csv(CSV_OUT, index=False)
-        try:
-            df.to_parquet(PARQUET_OUT, index=False)
-        except Exception as e:
-            logger.warning("Could not write parquet file: %s", e)
-        logger.info("Saved transformed CSV -> %s", CSV_OUT)
-        logger.info("Saved transformed Parquet -> %s", PARQUET_OUT)
-        print(f"Saved transformed data to:\n - {CSV_OUT}\n - {PARQUET_OUT}")
+        # only the (city, date) partitions present in df are rewritten
+        written = replace_dataset(df) if full_rebuild else write_partitions(df, key=["time"])
+        manifest.save()
+        RUN.add("transform", bytes_written=sum(partition_path(c, d).stat().st_size for c, d in written))
+        logger.info("Wrote %d staged partitions under %s", len(written), DATASET_DIR)
+        print(f"Saved transformed data to {DATASET_DIR} ({len(written)} partitions)")
 
     logger.info("Transform step finished.")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Transform raw air-quality data")
+    parser.add_argument("--full-rebuild", action="store_true",
+                        help="ignore the manifest and re-transform every raw input")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parsing processes (default: one per CPU, 1 = no pool)")
+    args = parser.parse_args()
+    main(full_rebuild=args.full_rebuild, workers=args.workers)
@@ -1,10 +1,15 @@
 # etl_analysis.py
 from dotenv import load_dotenv
 import os
+import sys
+import time
 import pandas as pd
 from supabase import create_client
 from pathlib import Path
-import matplotlib.pyplot as plt
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # repo root, for etl_common
+from etl_common.plot_render import PLOT_WORKERS, histogram, line, render_figures
+from etl_common.run_metrics import RUN
  
 load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -70,7 +75,9 @@ def fetch_table(limit: int | None = None) -> pd.DataFrame:
     query = supabase.table(TABLE_NAME).select("*")
     if limit:
         query = query.limit(limit)
+    t0 = time.perf_counter()
     res = query.execute()
+    RUN.observe_http("analysis", time.perf_counter() - t0)
  
     data = _extract_data_from_response(res)
  
@@ -100,7 +107,7 @@ def fetch_table(limit: int | None = None) -> pd.DataFrame:
     return df
  
  
-def analyze_and_save(df: pd.DataFrame):
+def analyze_and_save(df: pd.DataFrame, plot_workers: int = PLOT_WORKERS):
     if df.empty:
         print("No data to analyze.")
         return
@@ -134,35 +141,30 @@ def analyze_and_save(df: pd.DataFrame):
         hourly.to_csv(hourly_csv, index=False)
         print(f"✅ Saved hourly average temperature to {hourly_csv}")
  
-    # Plots (saved to processed dir)
+    # Plots (saved to processed dir): pre-binned here, rendered off-screen in
+    # parallel, unchanged figures are not redrawn (see etl_common/plot_render.py)
     try:
+        figures = []
         if "temperature_c" in df.columns:
-            plt.figure(figsize=(8, 4))
-            df["temperature_c"].plot(kind="hist", bins=30)
-            plt.title("Temperature distribution")
-            plt.xlabel("Temperature (°C)")
-            plt.tight_layout()
-            plt.savefig(PROCESSED_DIR / "temperature_hist.png")
-            plt.close()
-            print(f"✅ Saved temperature histogram to {PROCESSED_DIR / 'temperature_hist.png'}")
- 
+            figures.append(histogram("temperature_hist.png", df["temperature_c"], bins=30, figsize=(8, 4),
+                                     title="Temperature distribution", xlabel="Temperature (°C)"))
+
         if {"date", "temperature_c"}.issubset(df.columns):
             daily = df.groupby("date", as_index=False)["temperature_c"].mean()
-            plt.figure(figsize=(10, 4))
-            plt.plot(daily["date"], daily["temperature_c"], marker="o")
-            plt.title("Daily Average Temperature")
-            plt.ylabel("Temperature (°C)")
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            plt.savefig(PROCESSED_DIR / "daily_avg_temp.png")
-            plt.close()
-            print(f"✅ Saved daily average temperature plot to {PROCESSED_DIR / 'daily_avg_temp.png'}")
+            figures.append(line("daily_avg_temp.png", daily["date"], daily["temperature_c"], rotate_xticks=45,
+                                figsize=(10, 4), title="Daily Average Temperature", ylabel="Temperature (°C)"))
+
+        drawn = render_figures(figures, PROCESSED_DIR, workers=plot_workers)
+        for figure in figures:
+            status = "Saved" if figure.filename in drawn else "Unchanged"
+            print(f"✅ {status} {figure.title.lower()} plot: {PROCESSED_DIR / figure.filename}")
     except Exception as e:
         print(f"⚠️  Plotting failed: {e}")
  
  
 def run_analysis(limit: int | None = None):
     df = fetch_table(limit=limit)
+    RUN.add("analysis", rows_in=len(df))
     analyze_and_save(df)
  
  
@@ -1,25 +1,36 @@
 # extract.py
-import json
-from datetime import datetime
+import sys
 from pathlib import Path
 import requests
 from dotenv import load_dotenv
 import os
+import time
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # repo root, for etl_common
+from etl_common.http_cache import HttpCache
+from etl_common.raw_store import RawStore
+from etl_common.run_metrics import RUN
  
 load_dotenv()
  
 BASE_DIR = Path(__file__).resolve().parents[0]
 RAW_DIR = BASE_DIR / "data" / "raw"
 RAW_DIR.mkdir(parents=True, exist_ok=True)
+LANDING_DIR = BASE_DIR / "data" / "landing"
  
 LAT = os.getenv("LAT", "17.3850")
 LON = os.getenv("LON", "78.4867")
 FORECAST_DAYS = int(os.getenv("FORECAST_DAYS", "1"))
+# Reuse a cached forecast younger than this without asking the API (0 = always revalidate)
+CACHE_FRESHNESS_SECONDS = int(os.getenv("CACHE_FRESHNESS_SECONDS", "0"))
+
+http_cache = HttpCache(BASE_DIR / "data" / "http_cache", CACHE_FRESHNESS_SECONDS)
+raw_store = RawStore(LANDING_DIR)
  
 def extract_weather_data(lat: str = LAT, lon: str = LON, days: int = FORECAST_DAYS):
     """
-    Call Open-Meteo API and store raw JSON to data/raw/.
-    Returns path to saved file.
+    Call Open-Meteo API and append the raw JSON to the landing store (data/landing/).
+    Returns the record reference, or None if the forecast is unchanged since the last run.
     """
     url = "https://api.open-meteo.com/v1/forecast"
     params = {
@@ -31,14 +42,21 @@ def extract_weather_data(lat: str = LAT, lon: str = LON, days: int = FORECAST_DA
     }
  
     print(f"⏳ Requesting weather data for lat={lat}, lon={lon}, days={days} ...")
-    resp = requests.get(url, params=params, timeout=30)
+    t0 = time.perf_counter()
+    resp = http_cache.get(requests.get, url, params, timeout=30)
+    RUN.observe_http("extract", time.perf_counter() - t0, resp.status_code)
+    RUN.add("extract", bytes_read=len(resp.content))
     resp.raise_for_status()
+    if not resp.changed:
+        print("⏭️  Forecast unchanged since last run — nothing to extract.")
+        return None
     data = resp.json()
  
-    filename = RAW_DIR / f"weather_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    filename.write_text(json.dumps(data, indent=2))
-    print(f"✅ Extracted weather data and saved to: {filename}")
-    return str(filename)
+    entry = raw_store.append(f"{lat},{lon}", data)
+    resp.commit()  # cache the forecast only once it is landed
+    RUN.add("extract", rows_out=1, bytes_written=entry["length"])
+    print(f"✅ Extracted weather data and saved to: {entry['segment']} ({entry['ref']})")
+    return entry["ref"]
  
 if __name__ == "__main__":
     extract_weather_data()
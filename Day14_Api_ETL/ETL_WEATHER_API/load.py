@@ -1,11 +1,17 @@
 # load.py
+import argparse
 import os
 import math
+import sys
 from pathlib import Path
 import pandas as pd
 from dotenv import load_dotenv
 from supabase import create_client
-from time import sleep
+from time import perf_counter, sleep
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # repo root, for etl_common
+from etl_common.load_checkpoint import open_checkpoint, pending_batches
+from etl_common.run_metrics import RUN
  
 load_dotenv()
  
@@ -65,27 +71,38 @@ def _read_staged_csv(staged_path: str) -> pd.DataFrame:
     return df
  
  
-def load_to_supabase(staged_csv_path: str, batch_size: int = 100):
+def load_to_supabase(staged_csv_path: str, batch_size: int = 100, restart: bool = False):
+    """
+    Insert the staged CSV in batches. Committed batches are recorded in a
+    checkpoint file next to the CSV, so a rerun resumes where the last one
+    stopped; restart=True forgets the checkpoint and loads every row again.
+    """
     if not Path(staged_csv_path).exists():
         raise FileNotFoundError(f"Staged CSV not found at {staged_csv_path}")
  
     df = _read_staged_csv(staged_csv_path)
     total = len(df)
+    RUN.add("load", rows_in=total)
     print(f"📦 Loading {total} rows into Supabase table '{TABLE_NAME}' in batches of {batch_size} ...")
  
     # convert NaN to None for JSON serialization
     df = df.where(pd.notnull(df), None)
     records = df.to_dict(orient="records")
+
+    checkpoint = open_checkpoint(staged_csv_path, TABLE_NAME, restart)
  
-    for i in range(0, total, batch_size):
-        batch = records[i:i + batch_size]
+    for i, batch, key in pending_batches(checkpoint, records, batch_size):
         try:
+            t0 = perf_counter()
             res = supabase.table(TABLE_NAME).insert(batch).execute()
+            RUN.observe_http("load", perf_counter() - t0, error=bool(getattr(res, "error", None)))
             # supabase-py: res has .error attribute or .status_code depending on version
             # We print a short success message. If an error, print it.
             if hasattr(res, "error") and res.error:
                 print(f"⚠️  Batch {i//batch_size + 1} error: {res.error}")
             else:
+                checkpoint.commit(key, rows=len(batch))
+                RUN.add("load", rows_out=len(batch))
                 end = min(i + batch_size, total)
                 print(f"✅ Inserted rows {i+1}-{end} of {total}")
         except Exception as e:
@@ -95,6 +112,8 @@ def load_to_supabase(staged_csv_path: str, batch_size: int = 100):
             sleep(3)
             try:
                 supabase.table(TABLE_NAME).insert(batch).execute()
+                checkpoint.commit(key, rows=len(batch))
+                RUN.add("load", rows_out=len(batch))
                 print("✅ Retry success")
             except Exception as e2:
                 print(f"❌ Retry failed: {e2}")
@@ -104,10 +123,13 @@ def load_to_supabase(staged_csv_path: str, batch_size: int = 100):
     print("🎯 Load complete.")
  
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the latest staged weather CSV into Supabase")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and load every row again")
+    args = parser.parse_args()
     staged_files = sorted([str(p) for p in STAGED_DIR.glob("weather_staged_*.csv")])
     if not staged_files:
         raise SystemExit("No staged CSV found. Run transform.py first.")
     create_table_if_not_exists()
-    load_to_supabase(staged_files[-1], batch_size=100)
+    load_to_supabase(staged_files[-1], batch_size=100, restart=args.restart)
  
  
\ No newline at end of file
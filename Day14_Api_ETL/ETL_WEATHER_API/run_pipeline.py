@@ -1,24 +1,67 @@
 # run_pipeline.py
-import time
+#
+# Runs the stages as a DAG (see etl_common/pipeline_dag.py): extract always asks the API,
+# the table check runs alongside extract/transform, and transform/load/analysis
+# are skipped when nothing new was landed since their last successful run.
+# Each run writes a metrics report (etl_common/run_metrics.py) to data/metrics/.
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # repo root, for etl_common
 from extract import extract_weather_data
-from transform import transform_data
+from transform import LANDING_DIR, RAW_DIR, latest_raw_source, transform_data
 from load import create_table_if_not_exists, load_to_supabase
 from etl_analysis import run_analysis
- 
-def run_full_pipeline():
-    # 1) Extract
-    raw_file = extract_weather_data()
-    time.sleep(1)
- 
-    # 2) Transform
-    staged_csv = transform_data([raw_file])
- 
-    # 3) Load
-    create_table_if_not_exists()
+from etl_common.pipeline_dag import Pipeline, Stage
+from etl_common.run_metrics import RUN
+
+BASE_DIR = Path(__file__).resolve().parents[0]
+STATE_PATH = BASE_DIR / "data" / "pipeline_state.json"
+METRICS_DIR = BASE_DIR / "data" / "metrics"
+
+
+def extract(_):
+    # new data shows up in the landing index (transform's input); the ref itself is not passed on
+    extract_weather_data()
+
+
+def transform_latest(_):
+    source = latest_raw_source()
+    if source is None:
+        raise RuntimeError("No raw weather data found.")
+    return transform_data([source])
+
+
+def load_staged(upstream):
+    staged_csv = upstream["transform"]
     load_to_supabase(staged_csv, batch_size=100)
- 
-    # 4) Analysis
-    run_analysis()
- 
+    return staged_csv  # analysis reruns only after a new file was loaded
+
+
+def build_pipeline() -> Pipeline:
+    return Pipeline([
+        Stage("extract", extract, always=True),
+        Stage("create_table", lambda _: create_table_if_not_exists()),
+        Stage("transform", transform_latest, after=["extract"],
+              inputs=[LANDING_DIR / "index.ndjson", RAW_DIR]),
+        Stage("load", load_staged, after=["transform", "create_table"]),
+        Stage("analysis", lambda _: run_analysis(), after=["load"]),
+    ], STATE_PATH, metrics=RUN)
+
+
+def run_full_pipeline(force: bool = False, profile: str | None = None, prometheus: bool = False):
+    RUN.start("weather", METRICS_DIR, profile=profile)
+    reports = build_pipeline().run(force=force)
+    print("Metrics:", RUN.write_report(prometheus=prometheus))
+    if any(r.status == "failed" for r in reports):
+        raise SystemExit("❌ Pipeline failed.")
+
+
 if __name__ == "__main__":
-    run_full_pipeline()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the weather ETL pipeline")
+    parser.add_argument("--force", action="store_true", help="run every stage even if its inputs are unchanged")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], help="profile every stage (see etl_common/run_metrics.py)")
+    parser.add_argument("--prometheus", action="store_true", help="also write the metrics in Prometheus text format")
+    args = parser.parse_args()
+    run_full_pipeline(force=args.force, profile=args.profile, prometheus=args.prometheus)
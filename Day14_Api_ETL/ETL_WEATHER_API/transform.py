@@ -1,25 +1,37 @@
 # transform.py
 import json
+import sys
 from pathlib import Path
 import pandas as pd
 from datetime import datetime
 from typing import List
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # repo root, for etl_common
+from etl_common.raw_store import RawStore, is_ref
+from etl_common.run_metrics import RUN
  
 BASE_DIR = Path(__file__).resolve().parents[0]
 RAW_DIR = BASE_DIR / "data" / "raw"
+LANDING_DIR = BASE_DIR / "data" / "landing"
 STAGED_DIR = BASE_DIR / "data" / "staged"
 PROCESSED_DIR = BASE_DIR / "data" / "processed"
  
 STAGED_DIR.mkdir(parents=True, exist_ok=True)
 PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+# one store per process, so its index map is built once for all refs
+_raw_store = RawStore(LANDING_DIR)
  
 def _flatten_weather_json(json_path: str) -> pd.DataFrame:
     """
     Convert Open-Meteo hourly JSON payload to a flat DataFrame:
     columns: time, temperature_2m, relativehumidity_2m, windspeed_10m
+    json_path is a legacy raw JSON file or a landing reference ("landing:<seq>").
     """
-    with open(json_path, "r") as f:
-        payload = json.load(f)
+    if is_ref(json_path):
+        payload = _raw_store.read_ref(json_path)
+    else:
+        with open(json_path, "r") as f:
+            payload = json.load(f)
  
     hourly = payload.get("hourly", {})
     # Expect arrays of equal length for 'time' and each metric
@@ -55,6 +67,7 @@ def transform_data(raw_json_paths: List[str]) -> str:
         raise ValueError("No raw JSON files provided to transform")
  
     df = pd.concat(dfs, ignore_index=True)
+    RUN.add("transform", rows_in=len(df))
  
     # --- Basic cleaning ---
     # Ensure time column is datetime
@@ -86,13 +99,22 @@ def transform_data(raw_json_paths: List[str]) -> str:
  
     staged_path = STAGED_DIR / f"weather_staged_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     df.to_csv(staged_path, index=False)
+    RUN.add("transform", rows_out=len(df), bytes_written=staged_path.stat().st_size)
     print(f"✅ Transformed data saved at: {staged_path}")
     return str(staged_path)
  
-if __name__ == "__main__":
-    # Convenience: transform the latest raw file
+def latest_raw_source():
+    """The latest landed record reference (or legacy raw file), or None if there is none."""
+    entries = _raw_store.entries()
+    if entries:
+        return entries[-1]["ref"]
     raw_files = sorted([str(p) for p in RAW_DIR.glob("weather_*.json")])
-    if not raw_files:
-        raise SystemExit("No raw weather JSON files found. Run extract.py first.")
-    transform_data([raw_files[-1]])
+    return raw_files[-1] if raw_files else None
+ 
+if __name__ == "__main__":
+    # Convenience: transform the latest landed record (or legacy raw file)
+    source = latest_raw_source()
+    if source is None:
+        raise SystemExit("No raw weather data found. Run extract.py first.")
+    transform_data([source])
  
\ No newline at end of file
@@ -0,0 +1,156 @@
+'''Tiered electricity billing for many meters at once.
+
+currentbill_units.py bills one consumer through an if/elif slab chain.
+This module applies the same slabs to whole arrays of readings:
+
+    units <= 50          -> 3.80 per unit
+    51  - 100            -> 4.20
+    101 - 200            -> 5.10
+    201 - 300            -> 6.30
+    above 300            -> 7.50
+
+Slab boundaries are cumulative, so a bill is
+    cost_below[slab] + (units - slab_start[slab]) * rate[slab]
+where slab comes from np.searchsorted on the upper limits.
+
+Usage:
+    python billing_engine.py readings.csv bills.csv        # or .parquet input
+    python billing_engine.py --benchmark 10000000
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+# (upper limit of slab in units, rate per unit); the last slab has no limit
+DEFAULT_SLABS = [
+    (50, 3.80),
+    (100, 4.20),
+    (200, 5.10),
+    (300, 6.30),
+    (None, 7.50),
+]
+
+CHUNK_ROWS = 1_000_000
+
+
+def build_tariff(slabs=DEFAULT_SLABS):
+    """Turn a slab table into (upper_limits, slab_starts, rates, cost_below) arrays."""
+    limits = [lim for lim, _ in slabs[:-1]]
+    if slabs[-1][0] is not None:
+        raise ValueError("Last slab must be open-ended (limit None)")
+    if any(lim is None for lim in limits):
+        raise ValueError("Only the last slab can be open-ended")
+    # strictly increasing from 0: a repeated limit would make an empty slab
+    if any(hi <= lo for lo, hi in zip([0] + limits, limits)):
+        raise ValueError(f"Slab limits must be positive and strictly increasing, got {limits}")
+    rates = np.array([rate for _, rate in slabs], dtype=np.float64)
+    starts = np.array([0] + limits, dtype=np.float64)
+    widths = np.diff(starts)
+    cost_below = np.concatenate(([0.0], np.cumsum(widths * rates[:-1])))
+    return np.array(limits, dtype=np.float64), starts, rates, cost_below
+
+
+def compute_bills(units, tariff=None):
+    """Bill for every element of `units` (negative readings are billed as 0)."""
+    if tariff is None:
+        tariff = build_tariff()
+    limits, starts, rates, cost_below = tariff
+    units = np.clip(np.asarray(units, dtype=np.float64), 0, None)
+    slab = np.searchsorted(limits, units, side="left")
+    return cost_below[slab] + (units - starts[slab]) * rates[slab]
+
+
+def compute_bill(units, slabs=DEFAULT_SLABS):
+    """
+    Scalar convenience wrapper. Same bill as currentbill_units() for units >= 0;
+    negative units (meter replaced or rolled over) are billed as 0, where the
+    slab chain would return a negative bill.
+    """
+    return float(compute_bills([units], build_tariff(slabs))[0])
+
+
+# ---------------- files ----------------
+
+def _iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames of at most chunk_rows rows from a CSV or Parquet file."""
+    import pandas as pd
+
+    if str(path).endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+
+
+def bill_file(in_path, out_path, slabs=DEFAULT_SLABS, chunk_rows=CHUNK_ROWS):
+    """
+    Stream a readings file (columns: consumer_number, present_reading, last_reading)
+    chunk by chunk and write consumer_number, units, bill to out_path (CSV).
+    Returns number of rows billed.
+    """
+    tariff = build_tariff(slabs)
+    rows = 0
+    header = True
+    for df in _iter_chunks(in_path, chunk_rows):
+        units = df["present_reading"].to_numpy() - df["last_reading"].to_numpy()
+        out = df[["consumer_number"]].copy()
+        out["units"] = units
+        out["bill"] = np.round(compute_bills(units, tariff), 2)
+        out.to_csv(out_path, mode="w" if header else "a", header=header, index=False)
+        header = False
+        rows += len(out)
+    return rows
+
+
+# ---------------- benchmark ----------------
+
+def _loop_bill(tu):
+    # original slab chain from currentbill_units.py
+    if tu <= 50:
+        return tu * 3.80
+    elif tu <= 100:
+        return (50 * 3.80) + (tu - 50) * 4.20
+    elif tu <= 200:
+        return (50 * 3.80) + (50 * 4.20) + (tu - 100) * 5.10
+    elif tu <= 300:
+        return (50 * 3.80) + (50 * 4.20) + (100 * 5.10) + (tu - 200) * 6.30
+    return (50 * 3.80) + (50 * 4.20) + (100 * 5.10) + (100 * 6.30) + (tu - 300) * 7.50
+
+
+def benchmark(n):
+    rng = np.random.default_rng(0)
+    units = rng.integers(0, 600, size=n)
+
+    sample = units[:200_000]
+    t0 = time.perf_counter()
+    expected = np.array([_loop_bill(int(u)) for u in sample])
+    loop_rate = len(sample) / (time.perf_counter() - t0)
+    assert np.allclose(compute_bills(sample), expected), "vectorised bills differ from slab chain"
+
+    t0 = time.perf_counter()
+    compute_bills(units)
+    vec_time = time.perf_counter() - t0
+
+    print(f"Readings            : {n:,}")
+    print(f"if/elif loop        : {loop_rate:,.0f} bills/s (~{n / loop_rate:.1f}s for all)")
+    print(f"vectorised          : {vec_time:.2f}s ({n / vec_time:,.0f} bills/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bill meter readings with tiered slabs")
+    parser.add_argument("input", nargs="?", help="readings .csv or .parquet")
+    parser.add_argument("output", nargs="?", help="bills .csv")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="benchmark N random readings")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+    elif args.input and args.output:
+        n = bill_file(args.input, args.output)
+        print(f"Billed {n} consumers -> {args.output}")
+    else:
+        parser.print_help()
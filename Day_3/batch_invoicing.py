@@ -0,0 +1,220 @@
+'''Batch invoicing for many carts at once.
+
+ecommerce_using_modules.generate_invoice prints one invoice for one cart dict.
+This module takes a table of cart lines instead:
+
+    cart_id, product, price[, quantity][, discount_percent]
+
+computes subtotal, discount and GST for every cart with one groupby
+(apply_discount / add_gst work on whole columns too), and renders the
+invoices to text files from a process pool, one file per block of carts.
+
+Usage:
+    python batch_invoicing.py cart_lines.csv invoices/ --discount 10
+    python batch_invoicing.py --benchmark 200000 --out-dir /tmp/invoices
+'''
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import ecommerce_using_modules as emod
+
+CARTS_PER_FILE = 10_000
+CHUNK_ROWS = 500_000
+BLOCKS_IN_FLIGHT_PER_WORKER = 2  # rendered blocks queued per worker before waiting
+
+
+def compute_totals(lines, discount_percent=0, gst_percent=18):
+    """
+    One row per cart: subtotal, discount_percent, after_discount, total.
+    A discount_percent column in `lines` overrides the default per cart.
+    """
+    amounts = lines["price"] * lines["quantity"] if "quantity" in lines else lines["price"]
+    grouped = amounts.groupby(lines["cart_id"], sort=False)
+    totals = grouped.sum().rename("subtotal").to_frame()
+    if "discount_percent" in lines:
+        totals["discount_percent"] = lines.groupby("cart_id", sort=False)["discount_percent"].first()
+    else:
+        totals["discount_percent"] = discount_percent
+    totals["after_discount"] = emod.apply_discount(totals["subtotal"], totals["discount_percent"])
+    totals["total"] = emod.add_gst(totals["after_discount"], gst_percent)
+    return totals
+
+
+def render_invoice(cart_id, lines, subtotal, discount_percent, after_discount, total, gst_percent=18):
+    """Text of one invoice, same layout as generate_invoice."""
+    out = [f"----------INVOICE {cart_id}----------"]
+    for product, price in lines:
+        out.append(f"{product} : ₹ {price}")
+    out.append("---------------------------")
+    out.append(f"Subtotal:  {subtotal}")
+    if discount_percent:
+        out.append(f"After {discount_percent} % discount:  ₹ {round(after_discount, 1)}")
+    out.append(f"After {gst_percent} % GST:  ₹ {round(total, 1)}")
+    out.append("----------------------------")
+    out.append("Thank you for shopping with us!")
+    return "\n".join(out) + "\n\n"
+
+
+def _render_block(args):
+    """
+    Worker: write the invoices of one block of carts to a single file, in the
+    order of `totals`. A cart's lines need not be adjacent in `lines`: they are
+    stable-sorted into cart order first, keeping each cart's own line order.
+    """
+    path, lines, totals, gst_percent = args
+    amounts = lines["price"] * lines["quantity"] if "quantity" in lines else lines["price"]
+    cart_pos = totals.index.get_indexer(lines["cart_id"])
+    products = lines["product"].to_numpy()
+    amounts = amounts.to_numpy()
+    if (np.diff(cart_pos) < 0).any():
+        order = np.argsort(cart_pos, kind="stable")
+        cart_pos, products, amounts = cart_pos[order], products[order], amounts[order]
+    products = products.tolist()
+    amounts = amounts.tolist()
+    # the lines of one cart are contiguous now: split at every change of cart
+    bounds = np.flatnonzero(cart_pos[1:] != cart_pos[:-1]) + 1
+    starts = [0] + bounds.tolist()
+    ends = bounds.tolist() + [len(cart_pos)]
+    t = totals.iloc[cart_pos[starts]]
+    with open(path, "w", encoding="utf-8") as f:
+        for s, e, cart_id, sub, disc, after, total in zip(
+            starts, ends, t.index.tolist(), t["subtotal"].tolist(), t["discount_percent"].tolist(),
+            t["after_discount"].tolist(), t["total"].tolist(),
+        ):
+            lines_ = zip(products[s:e], amounts[s:e])
+            f.write(render_invoice(cart_id, lines_, sub, disc, after, total, gst_percent))
+    return len(starts)
+
+
+def _blocks(lines, totals, out_dir, start_index, gst_percent):
+    block_of = pd.Series(np.arange(len(totals)) // CARTS_PER_FILE, index=totals.index)
+    for block, block_lines in lines.groupby(lines["cart_id"].map(block_of), sort=True):
+        ids = totals.index[block * CARTS_PER_FILE:(block + 1) * CARTS_PER_FILE]
+        path = Path(out_dir) / f"invoices_{start_index + block:05d}.txt"
+        yield str(path), block_lines, totals.loc[ids], gst_percent
+
+
+def _iter_carts(path, chunk_rows=None):
+    """
+    Read cart lines in chunks (file must be grouped by cart_id). The last cart of
+    each chunk is held back and joined with the next chunk so no cart is split.
+    Raises ValueError when a cart shows up again after a chunk that closed it.
+    chunk_rows defaults to CHUNK_ROWS as set at call time.
+    """
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    carry = None
+    done = set()  # carts of the chunks already yielded
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        last = chunk["cart_id"].iloc[-1]
+        tail = chunk["cart_id"] == last
+        carry = chunk[tail]
+        if (~tail).any():
+            head = chunk[~tail]
+            ids = head["cart_id"].unique()
+            again = [c for c in ids if c in done]
+            if again:
+                raise ValueError(f"{path} is not grouped by cart_id: cart {again[0]} appears again")
+            done.update(ids)
+            yield head
+    if carry is not None and len(carry):
+        if carry["cart_id"].iloc[0] in done:
+            raise ValueError(f"{path} is not grouped by cart_id: cart {carry['cart_id'].iloc[0]} appears again")
+        yield carry
+
+
+def iter_invoice_batch(source, out_dir, discount_percent=0, gst_percent=18, workers=None):
+    """
+    Invoice every cart in `source` (a DataFrame or a CSV path, streamed in chunks),
+    yielding the per-cart totals of each chunk. At most
+    BLOCKS_IN_FLIGHT_PER_WORKER blocks per worker are queued for rendering, so
+    memory stays bounded however large the input; every file is written once
+    the iterator is exhausted.
+    """
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    chunks = [source] if isinstance(source, pd.DataFrame) else _iter_carts(source)
+    workers = workers or os.cpu_count() or 1
+    file_index = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for lines in chunks:
+            totals = compute_totals(lines, discount_percent, gst_percent)
+            for block in _blocks(lines, totals, out_dir, file_index, gst_percent):
+                pending.append(pool.submit(_render_block, block))
+                file_index += 1
+                while len(pending) > workers * BLOCKS_IN_FLIGHT_PER_WORKER:
+                    pending.popleft().result()
+            yield totals
+        for fut in pending:
+            fut.result()
+
+
+def invoice_batch(source, out_dir, discount_percent=0, gst_percent=18, workers=None):
+    """
+    Invoice every cart in `source` (a DataFrame or a CSV path, streamed in chunks).
+    Writes invoice files into out_dir and returns the per-cart totals table.
+    """
+    all_totals = list(iter_invoice_batch(source, out_dir, discount_percent, gst_percent, workers))
+    return pd.concat(all_totals) if all_totals else pd.DataFrame()
+
+
+# ---------------- benchmark ----------------
+
+def make_cart_lines(n_carts, lines_per_cart=4, seed=0):
+    rng = np.random.default_rng(seed)
+    n = n_carts * lines_per_cart
+    return pd.DataFrame({
+        "cart_id": np.repeat(np.arange(n_carts), lines_per_cart),
+        "product": rng.choice(["Laptop", "Phone", "Headphones", "Mouse", "Charger"], size=n),
+        "price": rng.integers(100, 60000, size=n),
+    })
+
+
+def benchmark(n_carts, out_dir):
+    lines = make_cart_lines(n_carts)
+
+    # parity with the scalar functions on a few carts
+    totals = compute_totals(lines.head(400), discount_percent=10)
+    for cart_id, cart in lines.head(400).groupby("cart_id"):
+        expected = emod.add_gst(emod.apply_discount(cart["price"].sum(), 10), 18)
+        assert abs(totals.loc[cart_id, "total"] - expected) < 1e-6
+
+    t0 = time.perf_counter()
+    compute_totals(lines, discount_percent=10)
+    calc = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    invoice_batch(lines, out_dir, discount_percent=10)
+    full = time.perf_counter() - t0
+
+    print(f"Carts              : {n_carts:,} ({len(lines):,} lines)")
+    print(f"totals (groupby)   : {calc:.2f}s ({n_carts / calc:,.0f} carts/s)")
+    print(f"totals + rendering : {full:.2f}s ({n_carts / full:,.0f} invoices/s, {os.cpu_count()} cpus)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate invoices for many carts")
+    parser.add_argument("input", nargs="?", help="cart lines CSV (grouped by cart_id)")
+    parser.add_argument("out_dir", nargs="?", default="invoices")
+    parser.add_argument("--discount", type=float, default=0)
+    parser.add_argument("--gst", type=float, default=18)
+    parser.add_argument("--benchmark", type=int, metavar="CARTS")
+    parser.add_argument("--out-dir", dest="bench_dir", default="bench_invoices", help="output dir for --benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.bench_dir)
+    elif args.input:
+        carts = sum(len(t) for t in iter_invoice_batch(args.input, args.out_dir, args.discount, args.gst))
+        print(f"Invoiced {carts} carts -> {args.out_dir}")
+    else:
+        parser.print_help()
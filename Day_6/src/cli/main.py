@@ -6,6 +6,7 @@ from src.services.customer_service import CustomerService, CustomerError
 from src.services.order_service import OrderService, OrderError
 from src.services.payment_service import PaymentService, PaymentError
 from src.services.reporting_service import ReportingService
+from src.models import json_default
 
 # ------------------- SERVICES -------------------
 product_service = ProductService()
@@ -19,26 +20,26 @@ def cmd_product_add(args):
     try:
         p = product_service.add_product(args.name, args.sku, args.price, args.stock, args.category)
         print("Created product:")
-        print(json.dumps(p, indent=2, default=str))
+        print(json.dumps(p, indent=2, default=json_default))
     except ProductError as e:
         print("Error:", e)
 
 def cmd_product_list(args):
     ps = product_service.list_products()
-    print(json.dumps(ps, indent=2, default=str))
+    print(json.dumps(ps, indent=2, default=json_default))
 
 # ------------------- CUSTOMER COMMANDS -------------------
 def cmd_customer_add(args):
     try:
         c = customer_service.add_customer(args.name, args.email, args.phone, args.city)
         print("Created customer:")
-        print(json.dumps(c, indent=2, default=str))
+        print(json.dumps(c, indent=2, default=json_default))
     except CustomerError as e:
         print("Error:", e)
 
 def cmd_customer_list(args):
     cs = customer_service.list_customers()
-    print(json.dumps(cs, indent=2, default=str))
+    print(json.dumps(cs, indent=2, default=json_default))
 
 # ------------------- ORDER COMMANDS -------------------
 def parse_order_items(raw_items):
@@ -57,14 +58,14 @@ def cmd_order_create(args):
         items = parse_order_items(args.item)
         o = order_service.create_order(args.customer, items)
         print("Order created:")
-        print(json.dumps(o, indent=2, default=str))
+        print(json.dumps(o, indent=2, default=json_default))
     except (OrderError, ValueError) as e:
         print("Error:", e)
 
 def cmd_order_show(args):
     try:
         o = order_service.get_order_details(args.order)
-        print(json.dumps(o, indent=2, default=str))
+        print(json.dumps(o, indent=2, default=json_default))
     except OrderError as e:
         print("Error:", e)
 
@@ -72,7 +73,15 @@ def cmd_order_cancel(args):
     try:
         o = order_service.cancel_order(args.order)
         print("Order cancelled:")
-        print(json.dumps(o, indent=2, default=str))
+        print(json.dumps(o, indent=2, default=json_default))
+    except OrderError as e:
+        print("Error:", e)
+
+def cmd_order_cancel_bulk(args):
+    try:
+        orders = order_service.cancel_orders(args.orders)
+        print(f"Orders cancelled: {len(orders)}")
+        print(json.dumps(orders, indent=2, default=json_default))
     except OrderError as e:
         print("Error:", e)
 
@@ -81,7 +90,7 @@ def cmd_payment_process(args):
     try:
         p = payment_service.process_payment(args.order, args.method)
         print("Payment processed:")
-        print(json.dumps(p, indent=2, default=str))
+        print(json.dumps(p, indent=2, default=json_default))
     except PaymentError as e:
         print("Error:", e)
 
@@ -89,7 +98,7 @@ def cmd_payment_refund(args):
     try:
         p = payment_service.refund_payment(args.order)
         print("Payment refunded:")
-        print(json.dumps(p, indent=2, default=str))
+        print(json.dumps(p, indent=2, default=json_default))
     except PaymentError as e:
         print("Error:", e)
 
@@ -97,7 +106,7 @@ def cmd_payment_refund(args):
 def cmd_report_top_products(args):
     top = reporting_service.top_selling_products()
     print("Top Selling Products:")
-    print(json.dumps(top, indent=2, default=str))
+    print(json.dumps(top, indent=2, default=json_default))
 
 def cmd_report_revenue(args):
     revenue = reporting_service.total_revenue_last_month()
@@ -106,12 +115,12 @@ def cmd_report_revenue(args):
 def cmd_report_orders_per_customer(args):
     data = reporting_service.total_orders_per_customer()
     print("Total Orders Per Customer:")
-    print(json.dumps(data, indent=2, default=str))
+    print(json.dumps(data, indent=2, default=json_default))
 
 def cmd_report_frequent_customers(args):
     data = reporting_service.customers_with_more_than_two_orders()
     print("Customers with more than 2 orders:")
-    print(json.dumps(data, indent=2, default=str))
+    print(json.dumps(data, indent=2, default=json_default))
 
 # ------------------- ARGUMENT PARSER -------------------
 def build_parser():
@@ -156,6 +165,9 @@ def build_parser():
     canco = order_sub.add_parser("cancel")
     canco.add_argument("--order", type=int, required=True)
     canco.set_defaults(func=cmd_order_cancel)
+    cancbulk = order_sub.add_parser("cancel-bulk")
+    cancbulk.add_argument("--orders", type=int, nargs="+", required=True)
+    cancbulk.set_defaults(func=cmd_order_cancel_bulk)
 
     # Payment commands
     p_pay = sub.add_parser("payment")
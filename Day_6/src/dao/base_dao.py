@@ -0,0 +1,162 @@
+# src/dao/base_dao.py
+"""
+Shared DAO plumbing: the Supabase client plus request coalescing for hot reads.
+
+SingleFlight merges identical in-flight reads: while one thread is fetching a key,
+other threads asking for the same key wait for that result instead of sending
+their own request.
+
+BatchLoader (DataLoader-style) sends a by-id lookup right away when none is in
+flight; distinct lookups issued while one is in flight are resolved together
+with one `in_` query as soon as it returns (or once max_batch are waiting).
+A lone lookup never waits for company.
+
+`in_` filters travel in the request URL, so id lists are sent IN_CHUNK_SIZE at a
+time (BaseDao._select_in) to stay under the server's URL length limit.
+
+Nothing is cached after a request completes, so callers never see data older
+than a request that was already running when they asked.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from src.config import get_supabase
+
+# ids per in_() filter: a few hundred ids keep the URL far below the usual 8 KB cap
+IN_CHUNK_SIZE = 200
+# errors meaning "no such function" for an rpc(): PostgREST's schema cache (PGRST202), Postgres (42883)
+MISSING_FUNCTION_CODES = {"PGRST202", "42883"}
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+
+class BatchLoader:
+    """
+    load(key) blocks until the batch holding `key` is fetched.
+    fetch_many(keys) must return {key: value}; missing keys resolve to None.
+    """
+
+    def __init__(self, fetch_many: Callable[[List[Hashable]], Dict[Hashable, Any]], max_batch: int = 100):
+        self._fetch_many = fetch_many
+        self._max_batch = max_batch
+        self._cond = threading.Condition()
+        self._pending: Dict[Hashable, _Call] = {}
+        self._in_flight = 0
+
+    def load(self, key: Hashable) -> Any:
+        with self._cond:
+            call = self._pending.get(key)
+            if call is None:
+                call = self._pending[key] = _Call()
+            while not call.done.is_set():
+                # whoever finds keys pending and nothing in flight (or a full batch) sends them
+                if self._pending and (self._in_flight == 0 or len(self._pending) >= self._max_batch):
+                    batch, self._pending = self._pending, {}
+                    self._in_flight += 1
+                    self._cond.release()
+                    try:
+                        self._fetch(batch)
+                    finally:
+                        self._cond.acquire()
+                        self._in_flight -= 1
+                        self._cond.notify_all()
+                else:
+                    self._cond.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _fetch(self, batch: Dict[Hashable, _Call]) -> None:
+        for keys in chunks(list(batch), self._max_batch):
+            try:
+                found = self._fetch_many(keys)
+                for k in keys:
+                    batch[k].result = found.get(k)
+            except Exception as e:
+                for k in keys:
+                    batch[k].error = e
+            finally:
+                for k in keys:
+                    batch[k].done.set()
+
+
+def chunks(items: List, size: int) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# Loaders are shared by every DAO instance (services each build their own DAOs),
+# keyed by (table, id column).
+_flights: Dict[Tuple[str, str], SingleFlight] = {}
+_loaders: Dict[Tuple[str, str], BatchLoader] = {}
+_registry_lock = threading.Lock()
+
+
+class BaseDao:
+    def __init__(self):
+        self._sb = get_supabase()
+
+    def _load_by_id(self, table: str, id_col: str, key: Any, row_type) -> Optional[Any]:
+        """
+        Coalesced single-row lookup by primary key. Identical concurrent calls share
+        one request and distinct keys arriving together share one in_() query.
+        """
+        reg_key = (table, id_col)
+        with _registry_lock:
+            flight = _flights.get(reg_key)
+            if flight is None:
+                flight = _flights[reg_key] = SingleFlight()
+                _loaders[reg_key] = BatchLoader(
+                    lambda keys, t=table, c=id_col: self._fetch_rows_by_ids(t, c, keys)
+                )
+            loader = _loaders[reg_key]
+        row = flight.do(key, lambda: loader.load(key))
+        # each caller gets its own record, so services can mutate it safely
+        return row_type.from_row(row) if row is not None else None
+
+    def _fetch_rows_by_ids(self, table: str, id_col: str, keys: List[Any]) -> Dict[Any, Dict]:
+        return {row[id_col]: row for row in self._select_in(table, id_col, keys)}
+
+    def _select_in(self, table: str, column: str, values: Iterable[Any]) -> List[Dict]:
+        """Rows whose column is in values, one in_() request per IN_CHUNK_SIZE values."""
+        rows: List[Dict] = []
+        for chunk in chunks(list(values), IN_CHUNK_SIZE):
+            rows.extend(self._sb.table(table).select("*").in_(column, chunk).execute().data or [])
+        return rows
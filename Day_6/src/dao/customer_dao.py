@@ -17,13 +17,11 @@ Search customer by email or city.
 
 # src/dao/customer_dao.py
 from typing import Optional, List, Dict
-from src.config import get_supabase
+from src.dao.base_dao import BaseDao
+from src.models import Customer
 
-class CustomerDao:
-    def __init__(self):
-        self._sb = get_supabase()
-
-    def create_customer(self, name: str, email: str, phone: str, city: str | None = None) -> Optional[Dict]:
+class CustomerDao(BaseDao):
+    def create_customer(self, name: str, email: str, phone: str, city: str | None = None) -> Optional[Customer]:
         # check uniqueness
         if self.get_customer_by_email(email):
             return None
@@ -32,40 +30,39 @@ class CustomerDao:
             payload["city"] = city
         self._sb.table("customers").insert(payload).execute()
         resp = self._sb.table("customers").select("*").eq("email", email).limit(1).execute()
-        return resp.data[0] if resp.data else None
+        return Customer.from_row(resp.data[0]) if resp.data else None
 
-    def get_customer_by_email(self, email: str) -> Optional[Dict]:
+    def get_customer_by_email(self, email: str) -> Optional[Customer]:
         resp = self._sb.table("customers").select("*").eq("email", email).limit(1).execute()
-        return resp.data[0] if resp.data else None
+        return Customer.from_row(resp.data[0]) if resp.data else None
 
-    def get_customer_by_id(self, cust_id: int) -> Optional[Dict]:
-        resp = self._sb.table("customers").select("*").eq("cust_id", cust_id).limit(1).execute()
-        return resp.data[0] if resp.data else None
+    def get_customer_by_id(self, cust_id: int) -> Optional[Customer]:
+        return self._load_by_id("customers", "cust_id", cust_id, Customer)
 
-    def update_customer(self, cust_id: int, fields: Dict) -> Optional[Dict]:
+    def update_customer(self, cust_id: int, fields: Dict) -> Optional[Customer]:
         self._sb.table("customers").update(fields).eq("cust_id", cust_id).execute()
         resp = self._sb.table("customers").select("*").eq("cust_id", cust_id).limit(1).execute()
-        return resp.data[0] if resp.data else None
+        return Customer.from_row(resp.data[0]) if resp.data else None
 
-    def delete_customer(self, cust_id: int) -> Optional[Dict]:
+    def delete_customer(self, cust_id: int) -> Optional[Customer]:
         # check if customer has orders
         orders = self._sb.table("orders").select("*").eq("customer_id", cust_id).execute()
         if orders.data:
             raise Exception("Cannot delete customer with existing orders")
         resp_before = self._sb.table("customers").select("*").eq("cust_id", cust_id).limit(1).execute()
-        row = resp_before.data[0] if resp_before.data else None
+        row = Customer.from_row(resp_before.data[0]) if resp_before.data else None
         self._sb.table("customers").delete().eq("cust_id", cust_id).execute()
         return row
 
-    def list_customers(self, limit: int = 100) -> List[Dict]:
+    def list_customers(self, limit: int = 100) -> List[Customer]:
         resp = self._sb.table("customers").select("*").order("cust_id", desc=False).limit(limit).execute()
-        return resp.data or []
+        return Customer.from_rows(resp.data)
 
-    def search_customers(self, email: str | None = None, city: str | None = None) -> List[Dict]:
+    def search_customers(self, email: str | None = None, city: str | None = None) -> List[Customer]:
         q = self._sb.table("customers").select("*")
         if email:
             q = q.eq("email", email)
         if city:
             q = q.eq("city", city)
         resp = q.execute()
-        return resp.data or []
\ No newline at end of file
+        return Customer.from_rows(resp.data)
\ No newline at end of file
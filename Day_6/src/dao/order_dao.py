@@ -22,15 +22,46 @@ Mark an order as Completed after payment is successful
 
 
 # src/dao/order_dao.py
-from typing import Optional, List, Dict
-from src.config import get_supabase
+import logging
+from typing import Optional, List
 
-class OrderDao:
-    def __init__(self):
-        self._sb = get_supabase()
+from postgrest.exceptions import APIError
 
+from src.dao.base_dao import IN_CHUNK_SIZE, MISSING_FUNCTION_CODES, BaseDao, chunks
+from src.models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+# Postgres function used by cancel_placed_orders. Run once in the Supabase SQL editor.
+# One statement, so the status flip and the stock restore commit together; the
+# status = 'PLACED' check is re-evaluated under the row lock, so an order cancelled
+# concurrently is neither returned nor restocked twice.
+CANCEL_ORDERS_SQL = """
+CREATE OR REPLACE FUNCTION public.cancel_orders(order_ids BIGINT[])
+RETURNS SETOF public.orders AS $$
+    WITH cancelled AS (
+        UPDATE public.orders o
+        SET status = 'CANCELLED'
+        WHERE o.order_id = ANY(order_ids) AND o.status = 'PLACED'
+        RETURNING o.*
+    ), deltas AS (
+        SELECT i.prod_id, SUM(i.quantity)::INTEGER AS delta
+        FROM public.order_items i JOIN cancelled c ON c.order_id = i.order_id
+        GROUP BY i.prod_id
+    ), restocked AS (
+        UPDATE public.products p
+        SET stock = COALESCE(p.stock, 0) + d.delta
+        FROM deltas d
+        WHERE p.prod_id = d.prod_id
+        RETURNING p.prod_id
+    )
+    SELECT * FROM cancelled;
+$$ LANGUAGE sql;
+"""
+
+class OrderDao(BaseDao):
     # Create order and return the inserted row
-    def create_order(self, customer_id: int, total_amount: float = 0.0, status: str = "PLACED") -> Optional[Dict]:
+    def create_order(self, customer_id: int, total_amount: float = 0.0, status: str = "PLACED") -> Optional[Order]:
         payload = {"customer_id": customer_id, "total_amount": total_amount, "status": status}
         self._sb.table("orders").insert(payload).execute()
         # Fetch latest order for this customer
@@ -40,7 +71,7 @@ class OrderDao:
             .order("order_id", desc=True)\
             .limit(1)\
             .execute()
-        return resp.data[0] if resp.data else None
+        return Order.from_row(resp.data[0]) if resp.data else None
 
    
     def create_order_items(self, items: list) -> None:
@@ -48,25 +79,63 @@ class OrderDao:
         self._sb.table("order_items").insert(items).execute()
 
     # Fetch order by ID
-    def get_order_by_id(self, order_id: int) -> Optional[Dict]:
+    def get_order_by_id(self, order_id: int) -> Optional[Order]:
         resp = self._sb.table("orders").select("*").eq("order_id", order_id).limit(1).execute()
-        return resp.data[0] if resp.data else None
+        return Order.from_row(resp.data[0]) if resp.data else None
+
+    # Fetch many orders in one request
+    def get_orders_by_ids(self, order_ids: List[int]) -> List[Order]:
+        if not order_ids:
+            return []
+        return Order.from_rows(self._select_in("orders", "order_id", order_ids))
 
     # Fetch order items
-    def get_order_items(self, order_id: int) -> List[Dict]:
+    def get_order_items(self, order_id: int) -> List[OrderItem]:
         resp = self._sb.table("order_items").select("*").eq("order_id", order_id).execute()
-        return resp.data or []
+        return OrderItem.from_rows(resp.data)
+
+    # Fetch the items of many orders in one request
+    def get_items_for_orders(self, order_ids: List[int]) -> List[OrderItem]:
+        if not order_ids:
+            return []
+        return OrderItem.from_rows(self._select_in("order_items", "order_id", order_ids))
 
     # List orders by customer
-    def list_orders_by_customer(self, customer_id: int) -> List[Dict]:
+    def list_orders_by_customer(self, customer_id: int) -> List[Order]:
         resp = self._sb.table("orders").select("*").eq("customer_id", customer_id).execute()
-        return resp.data or []
+        return Order.from_rows(resp.data)
 
     # Update order status
-    def update_order_status(self, order_id: int, status: str) -> Optional[Dict]:
+    def update_order_status(self, order_id: int, status: str) -> Optional[Order]:
         self._sb.table("orders").update({"status": status}).eq("order_id", order_id).execute()
         return self.get_order_by_id(order_id)
+
+    # Update the status of many orders with one multi-row update per IN_CHUNK_SIZE ids.
+    # Only rows still in from_status are touched; the updated rows are returned.
+    def update_orders_status(self, order_ids: List[int], status: str, from_status: str | None = None) -> List[Order]:
+        rows = []
+        for chunk in chunks(list(order_ids), IN_CHUNK_SIZE):
+            q = self._sb.table("orders").update({"status": status}).in_("order_id", chunk)
+            if from_status:
+                q = q.eq("status", from_status)
+            rows.extend(q.execute().data or [])
+        return Order.from_rows(rows)
+
+    # Cancel the PLACED orders among order_ids and restore their stock in one
+    # transaction (CANCEL_ORDERS_SQL). Returns the orders cancelled, or None when
+    # the function is not installed; any other error propagates.
+    def cancel_placed_orders(self, order_ids: List[int]) -> Optional[List[Order]]:
+        try:
+            resp = self._sb.rpc("cancel_orders", {"order_ids": list(order_ids)}).execute()
+        except APIError as e:
+            if e.code not in MISSING_FUNCTION_CODES:
+                raise
+            logger.warning("cancel_orders function not installed (%s): restocking and cancelling in "
+                           "separate requests; run CANCEL_ORDERS_SQL to fix", e.code)
+            return None
+        return Order.from_rows(resp.data)
+
     # List all orders
     def list_orders(self) -> list:
         resp = self._sb.table("orders").select("*").execute()
-        return resp.data or []
\ No newline at end of file
+        return Order.from_rows(resp.data)
\ No newline at end of file
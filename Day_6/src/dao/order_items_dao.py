@@ -1,26 +1,24 @@
 # src/dao/order_items_dao.py
-from typing import Optional, List, Dict
-from src.config import get_supabase
+from typing import Optional, List
+from src.dao.base_dao import BaseDao
+from src.models import OrderItem
 
-class OrderItemsDAO:
-    def __init__(self):
-        self._sb = get_supabase()
-
-    def create_order_item(self, order_id: int, prod_id: int, quantity: int) -> Optional[Dict]:
+class OrderItemsDAO(BaseDao):
+    def create_order_item(self, order_id: int, prod_id: int, quantity: int) -> Optional[OrderItem]:
         payload = {"order_id": order_id, "prod_id": prod_id, "quantity": quantity}
         self._sb.table("order_items").insert(payload).execute()
         resp = self._sb.table("order_items").select("*").eq("order_id", order_id).eq("prod_id", prod_id).limit(1).execute()
-        return resp.data[0] if resp.data else None
+        return OrderItem.from_row(resp.data[0]) if resp.data else None
 
-    def list_items_by_order(self, order_id: int) -> List[Dict]:
+    def list_items_by_order(self, order_id: int) -> List[OrderItem]:
         resp = self._sb.table("order_items").select("*").eq("order_id", order_id).execute()
-        return resp.data or []
+        return OrderItem.from_rows(resp.data)
 
-    def list_all_order_items(self) -> List[Dict]:
+    def list_all_order_items(self) -> List[OrderItem]:
         resp = self._sb.table("order_items").select("*").execute()
-        return resp.data or []
+        return OrderItem.from_rows(resp.data)
 
-    def update_quantity(self, order_id: int, prod_id: int, quantity: int) -> Optional[Dict]:
+    def update_quantity(self, order_id: int, prod_id: int, quantity: int) -> Optional[OrderItem]:
         self._sb.table("order_items").update({"quantity": quantity}).eq("order_id", order_id).eq("prod_id", prod_id).execute()
         resp = self._sb.table("order_items").select("*").eq("order_id", order_id).eq("prod_id", prod_id).limit(1).execute()
-        return resp.data[0] if resp.data else None
\ No newline at end of file
+        return OrderItem.from_row(resp.data[0]) if resp.data else None
\ No newline at end of file
@@ -1,10 +1,8 @@
 # src/dao/payment_dao.py
-from src.config import get_supabase
-
-class PaymentDao:
-    def __init__(self):
-        self._sb = get_supabase()
+from src.dao.base_dao import BaseDao
+from src.models import Payment
 
+class PaymentDao(BaseDao):
     def create_payment(self, order_id: int, amount: float):
         payload = {
             "order_id": order_id,
@@ -12,15 +10,15 @@ class PaymentDao:
             "status": "PENDING"
         }
         resp = self._sb.table("payments").insert(payload).execute()
-        return resp.data[0] if resp.data else None
+        return Payment.from_row(resp.data[0]) if resp.data else None
 
     def get_payment_by_order(self, order_id: int):
         resp = self._sb.table("payments").select("*").eq("order_id", order_id).limit(1).execute()
-        return resp.data[0] if resp.data else None
+        return Payment.from_row(resp.data[0]) if resp.data else None
 
     def update_payment(self, order_id: int, fields: dict):
         self._sb.table("payments").update(fields).eq("order_id", order_id).execute()
 
     def list_all_payments(self):
         resp = self._sb.table("payments").select("*").execute()
-        return resp.data or []
\ No newline at end of file
+        return Payment.from_rows(resp.data)
\ No newline at end of file
@@ -1,11 +1,29 @@
 # src/dao/product_dao.py
+import logging
 from typing import Optional, List, Dict
-from src.config import get_supabase
-class ProductDao:
-    def __init__(self):
-        self._sb=get_supabase()
 
-    def create_product(self,name: str, sku: str, price: float, stock: int = 0, category: str | None = None) -> Optional[Dict]:
+from postgrest.exceptions import APIError
+
+from src.dao.base_dao import MISSING_FUNCTION_CODES, BaseDao
+from src.models import Product
+
+logger = logging.getLogger(__name__)
+
+# Postgres function used by increment_stock. Run once in the Supabase SQL editor;
+# without it increment_stock falls back to one select + one upsert (not atomic).
+INCREMENT_STOCK_SQL = """
+CREATE OR REPLACE FUNCTION public.increment_stock(prod_ids BIGINT[], deltas INTEGER[])
+RETURNS SETOF public.products AS $$
+    UPDATE public.products p
+    SET stock = COALESCE(p.stock, 0) + d.delta
+    FROM unnest(prod_ids, deltas) AS d(prod_id, delta)
+    WHERE p.prod_id = d.prod_id
+    RETURNING p.*;
+$$ LANGUAGE sql;
+"""
+
+class ProductDao(BaseDao):
+    def create_product(self,name: str, sku: str, price: float, stock: int = 0, category: str | None = None) -> Optional[Product]:
         """
         Insert a product and return the inserted row (two-step: insert then select by unique sku).
         """
@@ -18,34 +36,68 @@ class ProductDao:
  
         # Fetch inserted row by unique column (sku)
         resp = self._sb.table("products").select("*").eq("sku", sku).limit(1).execute()
-        return resp.data[0] if resp.data else None
+        return Product.from_row(resp.data[0]) if resp.data else None
  
-    def get_product_by_id(self,prod_id: int) -> Optional[Dict]:
-        resp = self._sb.table("products").select("*").eq("prod_id", prod_id).limit(1).execute()
-        return resp.data[0] if resp.data else None
+    def get_product_by_id(self,prod_id: int) -> Optional[Product]:
+        # coalesced: hot SKUs read by many threads cost one request
+        return self._load_by_id("products", "prod_id", prod_id, Product)
+ 
+    def get_products_by_ids(self, prod_ids: List[int]) -> List[Product]:
+        if not prod_ids:
+            return []
+        return Product.from_rows(self._select_in("products", "prod_id", prod_ids))
+
+    def increment_stock(self, deltas: Dict[int, int]) -> List[Product]:
+        """
+        Add deltas[prod_id] to each product's stock in one round trip.
+        Uses the increment_stock RPC (atomic, one UPDATE); only if the function is
+        not installed, reads the products once and writes them back with one upsert.
+        Any other error propagates.
+        """
+        if not deltas:
+            return []
+        prod_ids = list(deltas)
+        try:
+            resp = self._sb.rpc("increment_stock", {
+                "prod_ids": prod_ids,
+                "deltas": [deltas[pid] for pid in prod_ids],
+            }).execute()
+            return Product.from_rows(resp.data)
+        except APIError as e:
+            if e.code not in MISSING_FUNCTION_CODES:
+                raise
+            logger.warning("increment_stock function not installed (%s): falling back to a non-atomic "
+                           "select + upsert; run INCREMENT_STOCK_SQL to fix", e.code)
+            rows = self._select_in("products", "prod_id", prod_ids)
+            for row in rows:
+                row["stock"] = (row.get("stock") or 0) + deltas[row["prod_id"]]
+            if not rows:
+                return []
+            resp = self._sb.table("products").upsert(rows, on_conflict="prod_id").execute()
+            return Product.from_rows(resp.data)
  
-    def get_product_by_sku(self,sku: str) -> Optional[Dict]:
+    def get_product_by_sku(self,sku: str) -> Optional[Product]:
         resp = self._sb.table("products").select("*").eq("sku", sku).limit(1).execute()
-        return resp.data[0] if resp.data else None
+        return Product.from_row(resp.data[0]) if resp.data else None
  
-    def update_product(self,prod_id: int, fields: Dict) -> Optional[Dict]:
+    def update_product(self,prod_id: int, fields: Dict) -> Optional[Product]:
         """
         Update and then return the updated row (two-step).
         """
         self._sb.table("products").update(fields).eq("prod_id", prod_id).execute()
         resp = self._sb.table("products").select("*").eq("prod_id", prod_id).limit(1).execute()
-        return resp.data[0] if resp.data else None
+        return Product.from_row(resp.data[0]) if resp.data else None
  
-    def delete_product(self,prod_id: int) -> Optional[Dict]:
+    def delete_product(self,prod_id: int) -> Optional[Product]:
         # fetch row before delete (so we can return it)
         resp_before = self._sb.table("products").select("*").eq("prod_id", prod_id).limit(1).execute()
-        row = resp_before.data[0] if resp_before.data else None
+        row = Product.from_row(resp_before.data[0]) if resp_before.data else None
         self._sb.table("products").delete().eq("prod_id", prod_id).execute()
         return row
  
-    def list_products(self,limit: int = 100, category: str | None = None) -> List[Dict]:
+    def list_products(self,limit: int = 100, category: str | None = None) -> List[Product]:
         q = self._sb.table("products").select("*").order("prod_id", desc=False).limit(limit)
         if category:
             q = q.eq("category", category)
         resp = q.execute()
-        return resp.data or []
\ No newline at end of file
+        return Product.from_rows(resp.data)
\ No newline at end of file
@@ -0,0 +1,170 @@
+# src/models.py
+"""
+Compact row models returned by the DAOs.
+
+Each record keeps its columns in __slots__ instead of a per-row dict, so large
+listings (order items, payments) use a fraction of the memory. Records still
+support item access (row["prod_id"], row.get("stock"), row["items"] = ...) so
+services can treat them like the dicts they replaced.
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional, TextIO
+
+
+class Record:
+    """Base class for slot-backed rows. Subclasses only declare FIELDS."""
+
+    FIELDS: tuple = ()
+    _FIELD_SET: frozenset = frozenset()
+    # Columns the table returned that the model does not know about (None when empty)
+    __slots__ = ("extra",)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "__slots__" not in cls.__dict__:
+            raise TypeError(f"{cls.__name__} must declare __slots__ = FIELDS")
+        cls._FIELD_SET = frozenset(cls.FIELDS)
+
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, fields.pop(name, None))
+        self.extra = fields or None
+
+    # ---------------- construction ----------------
+    @classmethod
+    def from_row(cls, row: Optional[Dict]) -> Optional["Record"]:
+        """Build a record from one response row (dict), or None for no row."""
+        if row is None:
+            return None
+        obj = cls.__new__(cls)
+        get = row.get
+        for name in cls.FIELDS:
+            setattr(obj, name, get(name))
+        extra = {k: v for k, v in row.items() if k not in cls._FIELD_SET}
+        obj.extra = extra or None
+        return obj
+
+    @classmethod
+    def from_rows(cls, rows: Optional[Iterable[Dict]]) -> List["Record"]:
+        """Build records from resp.data (a list of dicts)."""
+        if not rows:
+            return []
+        return [cls.from_row(r) for r in rows]
+
+    # ---------------- dict compatibility ----------------
+    def __getitem__(self, key: str) -> Any:
+        if key in self._FIELD_SET:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in self._FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._FIELD_SET or bool(self.extra and key in self.extra)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        # like dict.get: a stored None is returned as is
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict:
+        """Plain dict of the record (nested records are converted too)."""
+        d = {name: _plain(getattr(self, name)) for name in self.FIELDS}
+        if self.extra:
+            d.update({k: _plain(v) for k, v in self.extra.items()})
+        return d
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Record):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{n}={getattr(self, n)!r}" for n in self.FIELDS)
+        return f"{type(self).__name__}({fields})"
+
+
+class Product(Record):
+    FIELDS = ("prod_id", "name", "sku", "price", "stock", "category", "created_at")
+    __slots__ = FIELDS
+
+
+class Customer(Record):
+    FIELDS = ("cust_id", "name", "email", "phone", "city", "created_at")
+    __slots__ = FIELDS
+
+
+class Order(Record):
+    # items / customer are filled in by OrderService, not by the orders table
+    FIELDS = ("order_id", "customer_id", "total_amount", "status", "created_at", "items", "customer")
+    __slots__ = FIELDS
+
+    def to_dict(self) -> Dict:
+        d = super().to_dict()
+        # keep the table shape when the service has not attached anything
+        if self.items is None:
+            d.pop("items")
+        if self.customer is None:
+            d.pop("customer")
+        return d
+
+
+class OrderItem(Record):
+    FIELDS = ("item_id", "order_id", "prod_id", "quantity", "price")
+    __slots__ = FIELDS
+
+
+class Payment(Record):
+    FIELDS = ("payment_id", "order_id", "amount", "method", "status", "paid_at", "created_at")
+    __slots__ = FIELDS
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+def json_default(value: Any) -> Any:
+    """json.dumps(default=...) hook: records become dicts, anything else str()."""
+    if isinstance(value, Record):
+        return value.to_dict()
+    return str(value)
+
+
+def to_ndjson(records: Iterable[Record], fp: TextIO) -> int:
+    """Stream records to fp as newline-delimited JSON. Returns rows written."""
+    n = 0
+    for r in records:
+        fp.write(json.dumps(r, default=json_default))
+        fp.write("\n")
+        n += 1
+    return n
+
+
+def to_dataframe(records: List[Record], cls: type | None = None):
+    """
+    Build a pandas DataFrame column by column straight from the slots,
+    without materialising an intermediate dict per row.
+    pandas is only needed when this is called.
+    """
+    import pandas as pd
+
+    if cls is None:
+        if not records:
+            return pd.DataFrame()
+        cls = type(records[0])
+    columns = {name: [getattr(r, name) for r in records] for name in cls.FIELDS}
+    return pd.DataFrame(columns, columns=list(cls.FIELDS))
@@ -65,21 +65,59 @@ class OrderService:
 
     # Cancel an order
     def cancel_order(self, order_id: int) -> Dict:
-        order = self.dao.get_order_by_id(order_id)
-        if not order:
-            raise OrderError("Order not found")
-        if order["status"] != "PLACED":
+        cancelled = self.cancel_orders([order_id])
+        if not cancelled:
             raise OrderError("Only PLACED orders can be cancelled")
+        return cancelled[0]
 
-        # Restore stock
-        items = self.dao.get_order_items(order_id)
-        for item in items:
-            prod = self.prod_dao.get_product_by_id(item["prod_id"])
-            new_stock = (prod.get("stock") or 0) + item["quantity"]
-            self.prod_dao.update_product(item["prod_id"], {"stock": new_stock})
+    # Cancel many orders at once (e.g. after a fraud sweep)
+    def cancel_orders(self, order_ids: List[int]) -> List[Dict]:
+        order_ids = list(dict.fromkeys(order_ids))
+        orders = {o["order_id"]: o for o in self.dao.get_orders_by_ids(order_ids)}
+        missing = [oid for oid in order_ids if oid not in orders]
+        if missing:
+            raise OrderError(f"Order not found: {', '.join(map(str, missing))}")
+        not_placed = [oid for oid in order_ids if orders[oid]["status"] != "PLACED"]
+        if not_placed:
+            raise OrderError(f"Only PLACED orders can be cancelled: {', '.join(map(str, not_placed))}")
+
+        # Status flip and stock restore in one transaction; only orders still
+        # PLACED are cancelled, so a concurrent cancel never restocks twice
+        cancelled = self.dao.cancel_placed_orders(order_ids)
+        if cancelled is None:
+            cancelled = self._restock_then_cancel(order_ids)
+
+        # Orders that left PLACED in the meantime are simply not returned
+        by_id = {o["order_id"]: o for o in cancelled}
+        return [by_id[oid] for oid in order_ids if oid in by_id]
 
-        # Update status
-        return self.dao.update_order_status(order_id, "CANCELLED")
+    def _restock_then_cancel(self, order_ids: List[int]) -> List[Dict]:
+        # Without the cancel_orders function: restore stock first, flip status second.
+        # Orders the flip did not cancel (it failed, or they left PLACED meanwhile)
+        # get their stock taken back, so they stay PLACED with stock unchanged and
+        # the cancel can simply be retried.
+        items = self.dao.get_items_for_orders(order_ids)
+        self.prod_dao.increment_stock(self._stock_deltas(items))
+        try:
+            cancelled = self.dao.update_orders_status(order_ids, "CANCELLED", from_status="PLACED")
+        except Exception:
+            still_placed = {o["order_id"] for o in self.dao.get_orders_by_ids(order_ids) if o["status"] == "PLACED"}
+            self.prod_dao.increment_stock(self._stock_deltas(items, still_placed, sign=-1))
+            raise
+        cancelled_ids = {o["order_id"] for o in cancelled}
+        missed = set(order_ids) - cancelled_ids
+        if missed:
+            self.prod_dao.increment_stock(self._stock_deltas(items, missed, sign=-1))
+        return cancelled
+
+    @staticmethod
+    def _stock_deltas(items: List[Dict], order_ids=None, sign: int = 1) -> Dict[int, int]:
+        # one delta per product, over the items of order_ids (all items when None)
+        deltas: Dict[int, int] = {}
+        for item in items:
+            if order_ids is None or item["order_id"] in order_ids:
+                deltas[item["prod_id"]] = deltas.get(item["prod_id"], 0) + sign * item["quantity"]
+        return deltas
 
     # Complete an order
     def complete_order(self, order_id: int) -> Dict:
@@ -0,0 +1,17 @@
+"""
+etl_common
+
+Modules shared by the ETL scripts (Day13_ETL_Pipeline_Titanic, Day14_Api_ETL):
+
+  http_cache        on-disk HTTP cache (ETag / max-age / content hash) for the API extractors
+  load_checkpoint   resumable loads: journal of the batches already committed
+  raw_store         append-only compressed landing zone for raw API responses
+  pipeline_dag      DAG runner for pipeline stages with content-keyed caching
+  plot_render       off-screen, parallel, incremental rendering of analysis plots
+  run_metrics       per-stage run metrics, JSON / Prometheus report, opt-in profiling
+
+Scripts run from their own folder, so each one puts the repository root on
+sys.path before importing from here:
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))  # repo root, for etl_common
+"""
@@ -0,0 +1,155 @@
+"""
+http_cache.py
+
+Small on-disk HTTP cache for the Open-Meteo extractors.
+
+Entries are keyed by (url, params). Each entry keeps the last response body plus
+its validators (ETag / Last-Modified), Cache-Control max-age and a content hash:
+
+  - while an entry is fresh (max-age or the configured freshness window) no
+    request is sent at all;
+  - afterwards the request is sent conditionally (If-None-Match /
+    If-Modified-Since) and a 304 reuses the stored body;
+  - a 200 whose body hashes the same as before is still reported as unchanged.
+
+CachedResponse.changed tells callers whether the payload differs from the last
+run, so downstream stages can skip unchanged data.
+
+A changed 200 is not stored right away: the caller commits it once the payload
+is safely handled (landed, loaded), so a run that fails in between gets the
+payload again as changed next time instead of skipping it.
+
+    resp = cache.get(session.get, url, params)
+    if resp.changed:
+        land(resp.json())
+    resp.commit()
+
+or `with cache.get(...) as resp:`, which commits when the block does not raise.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+
+class CachedResponse:
+    """Just enough of requests.Response for the extractors, plus cache info."""
+
+    def __init__(self, status_code: int, body: bytes, from_cache: bool, changed: bool,
+                 on_commit: Optional[Callable[[], None]] = None):
+        self.status_code = status_code
+        self.content = body
+        self.from_cache = from_cache
+        self.changed = changed
+        self._on_commit = on_commit
+
+    def commit(self) -> None:
+        """Store the response in the cache (no-op when there is nothing new to store)."""
+        if self._on_commit is not None:
+            self._on_commit()
+            self._on_commit = None
+
+    def __enter__(self) -> "CachedResponse":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+def _max_age(cache_control: str) -> Optional[int]:
+    m = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(m.group(1)) if m else None
+
+
+class HttpCache:
+    def __init__(self, cache_dir: Path, freshness_seconds: int = 0):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.freshness_seconds = freshness_seconds
+
+    def _key(self, url: str, params: dict) -> str:
+        raw = url + "?" + json.dumps(params or {}, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _load(self, key: str):
+        meta_path = self.cache_dir / f"{key}.meta.json"
+        body_path = self.cache_dir / f"{key}.body"
+        if not meta_path.exists() or not body_path.exists():
+            return None, None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f), body_path.read_bytes()
+
+    def _store(self, key: str, meta: dict, body: Optional[bytes]) -> None:
+        if body is not None:
+            tmp = self.cache_dir / f"{key}.body.tmp"
+            tmp.write_bytes(body)
+            os.replace(tmp, self.cache_dir / f"{key}.body")
+        tmp = self.cache_dir / f"{key}.meta.tmp"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self.cache_dir / f"{key}.meta.json")
+
+    def get(self, send: Callable, url: str, params: dict, timeout: int = 20) -> CachedResponse:
+        """
+        send(url, params=..., headers=..., timeout=...) performs the real GET
+        (e.g. session.get); it is only called when the entry is not fresh.
+        A changed 200 is stored only by the response's commit().
+        """
+        key = self._key(url, params)
+        meta, body = self._load(key)
+        now = time.time()
+
+        if meta is not None:
+            ttl = max(meta.get("max_age") or 0, self.freshness_seconds)
+            if not meta.get("no_cache") and now - meta["stored_at"] < ttl:
+                return CachedResponse(200, body, from_cache=True, changed=False)
+
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        resp = send(url, params=params, headers=headers, timeout=timeout)
+
+        if resp.status_code == 304 and meta is not None:
+            meta["stored_at"] = now
+            self._store(key, meta, None)
+            return CachedResponse(200, body, from_cache=True, changed=False)
+
+        if resp.status_code >= 400:
+            return CachedResponse(resp.status_code, resp.content, from_cache=False, changed=True)
+
+        cache_control = resp.headers.get("Cache-Control", "")
+        content_hash = hashlib.sha256(resp.content).hexdigest()
+        changed = meta is None or meta.get("content_hash") != content_hash
+        on_commit = None
+        if "no-store" not in cache_control:
+            entry = {
+                "url": url,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "max_age": _max_age(cache_control),
+                "no_cache": "no-cache" in cache_control,
+                "content_hash": content_hash,
+                "stored_at": now,
+            }
+            if changed:
+                on_commit = lambda: self._store(key, entry, resp.content)
+            else:
+                # same body as the committed entry: only its validators move on
+                self._store(key, entry, None)
+        return CachedResponse(resp.status_code, resp.content, from_cache=False, changed=changed,
+                              on_commit=on_commit)
@@ -0,0 +1,103 @@
+"""
+load_checkpoint.py
+
+Resumable loads: a small journal of the batches a loader has already committed.
+
+Every committed batch is appended as one JSON line to a local state file
+(flushed and fsync'ed before the next batch is sent), so after a crash a rerun
+skips what made it and carries on with the first missing batch:
+
+    checkpoint = open_checkpoint(staged_csv, table_name, restart)
+    for offset, batch, key in pending_batches(checkpoint, records, batch_size):
+        insert(batch)
+        checkpoint.commit(key, rows=len(batch))
+
+A batch key is its offset plus a hash of its content, so a batch is only skipped
+when the same rows sit at the same place; if the staged file changed, the changed
+batches are sent again. A line torn by a crash mid-write is ignored on load.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+
+def batch_key(offset: int, records) -> str:
+    """Key of a batch: '<offset>:<hash of its records>'."""
+    blob = records if isinstance(records, bytes) else json.dumps(records, sort_keys=True, default=str).encode("utf-8")
+    return f"{offset}:{hashlib.sha256(blob).hexdigest()[:20]}"
+
+
+class LoadCheckpoint:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._committed: Dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line
+                    self._committed[entry["key"]] = entry
+
+    @classmethod
+    def for_source(cls, source_path, table_name: str) -> "LoadCheckpoint":
+        """Checkpoint file next to the staged file: <source>.<table>.checkpoint.ndjson"""
+        source_path = Path(source_path)
+        return cls(source_path.parent / f"{source_path.name}.{table_name}.checkpoint.ndjson")
+
+    def __len__(self) -> int:
+        return len(self._committed)
+
+    def is_committed(self, key: str) -> bool:
+        return key in self._committed
+
+    def commit(self, key: str, **info) -> None:
+        """Durably record that the batch `key` is in the target table."""
+        entry = {"key": key, "committed_at": datetime.now(timezone.utc).isoformat(), **info}
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._committed[key] = entry
+
+    def entries(self) -> Iterator[dict]:
+        return iter(list(self._committed.values()))
+
+    def committed_rows(self) -> int:
+        return sum(e.get("rows", 0) for e in self._committed.values())
+
+    def reset(self) -> None:
+        """Forget every committed batch (next run starts from zero)."""
+        with self._lock:
+            self._committed.clear()
+            if self.path.exists():
+                self.path.unlink()
+
+
+def open_checkpoint(source_path, table_name: str, restart: bool = False) -> LoadCheckpoint:
+    """The checkpoint of loading source_path into table_name; restart=True forgets it."""
+    checkpoint = LoadCheckpoint.for_source(source_path, table_name)
+    if restart:
+        checkpoint.reset()
+    elif len(checkpoint):
+        print(f"↩️  Resuming: {len(checkpoint)} batches already committed ({checkpoint.path.name})")
+    return checkpoint
+
+
+def pending_batches(checkpoint: LoadCheckpoint, records: List[dict],
+                    batch_size: int) -> Iterator[Tuple[int, List[dict], str]]:
+    """(offset, batch, key) of every batch of records not committed yet."""
+    for offset in range(0, len(records), batch_size):
+        batch = records[offset:offset + batch_size]
+        key = batch_key(offset, batch)
+        if not checkpoint.is_committed(key):
+            yield offset, batch, key
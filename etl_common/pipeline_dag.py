@@ -0,0 +1,239 @@
+"""
+pipeline_dag.py
+
+A small DAG runner for the pipeline stages.
+
+Every Stage names the stages it runs after, the files / directories it reads
+(inputs) and the ones it writes (outputs). Before a stage runs, its key is
+computed: a hash of the content of its inputs plus the results of the stages it
+runs after. If the key equals the one recorded after the stage's last successful
+run and all its outputs exist, the stage is skipped ("cached") and its recorded
+result is reused. Stages marked always=True (extract: the API decides whether
+there is new data) run every time.
+
+Stages whose dependencies are done run concurrently on a thread pool. When a stage
+fails, the stages that depend on it are skipped, while independent branches
+still finish. Each run prints a per-stage timing table. With a RunMetrics
+(run_metrics.py), every stage that runs is also measured by it, and stages
+that do not run are marked as cached or skipped.
+
+State lives in a JSON file (data/pipeline_state.json): the key, result and
+timing of each stage's last successful run, plus a digest cache keyed by (size,
+mtime) so that unchanged files are not read again to hash them.
+Stage results must therefore be JSON-serialisable.
+
+    pipeline = Pipeline([
+        Stage("extract", lambda results: extract(), always=True),
+        Stage("transform", lambda results: transform(), after=["extract"],
+              inputs=[RAW_DIR], outputs=[STAGED_DIR]),
+    ], BASE_DIR / "data" / "pipeline_state.json")
+    pipeline.run()
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[Dict[str, Any]], Any]  # gets the results of the stages it runs after
+    after: List[str] = field(default_factory=list)
+    inputs: List[Path] = field(default_factory=list)
+    outputs: List[Path] = field(default_factory=list)
+    always: bool = False
+
+
+@dataclass
+class StageReport:
+    name: str
+    status: str  # "ran" | "cached" | "failed" | "skipped"
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage], state_path: Path, max_workers: Optional[int] = None,
+                 metrics=None):
+        self.stages = {s.name: s for s in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("stage names must be unique")
+        for stage in stages:
+            unknown = set(stage.after) - set(self.stages)
+            if unknown:
+                raise ValueError(f"stage {stage.name!r} runs after unknown stages {sorted(unknown)}")
+        self.order = self._topological_order()
+        self.state_path = Path(state_path)
+        self.max_workers = max_workers or len(stages)
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._state = self._load_state()
+
+    def _topological_order(self) -> List[str]:
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"stage dependency cycle through {name!r}")
+            visiting.add(name)
+            for dep in self.stages[name].after:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    # ---------------- state ----------------
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault("stages", {})
+        state.setdefault("files", {})
+        return state
+
+    def _save_state(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(f".{self.state_path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._state, f, indent=2, default=str)
+        os.replace(tmp, self.state_path)
+
+    # ---------------- keys ----------------
+
+    def _file_digest(self, path: Path) -> str:
+        st = path.stat()
+        stamp = [st.st_size, st.st_mtime_ns]
+        with self._lock:
+            cached = self._state["files"].get(str(path))
+        if cached and cached[:2] == stamp:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self._lock:
+            self._state["files"][str(path)] = stamp + [digest]
+        return digest
+
+    def digest(self, path: Path) -> str:
+        """Content hash of a file, or of every file under a directory (dot-files skipped)."""
+        path = Path(path)
+        if path.is_file():
+            return self._file_digest(path)
+        if not path.is_dir():
+            return "missing"
+        h = hashlib.sha256()
+        for file in sorted(p for p in path.rglob("*") if p.is_file()):
+            rel = file.relative_to(path)
+            if any(part.startswith(".") for part in rel.parts):
+                continue  # temp files of atomic writes, manifests of other tools
+            h.update(str(rel).encode("utf-8"))
+            h.update(self._file_digest(file).encode("ascii"))
+        return h.hexdigest()
+
+    def stage_key(self, stage: Stage, results: Dict[str, Any]) -> str:
+        h = hashlib.sha256(stage.name.encode("utf-8"))
+        for path in stage.inputs:
+            h.update(f"{path}={self.digest(path)}".encode("utf-8"))
+        for dep in stage.after:
+            h.update(f"{dep}={json.dumps(results.get(dep), sort_keys=True, default=str)}".encode("utf-8"))
+        return h.hexdigest()[:20]
+
+    # ---------------- run ----------------
+
+    def _run_stage(self, stage: Stage, results: Dict[str, Any], force: bool) -> StageReport:
+        t0 = time.perf_counter()
+        upstream = {dep: results.get(dep) for dep in stage.after}
+        key = self.stage_key(stage, upstream)
+        last = self._state["stages"].get(stage.name, {})
+        if (not force and not stage.always and last.get("key") == key
+                and all(Path(p).exists() for p in stage.outputs)):
+            results[stage.name] = last.get("result")
+            if self.metrics is not None:
+                self.metrics.mark(stage.name, "cached")
+            return StageReport(stage.name, "cached", time.perf_counter() - t0)
+
+        print(f"▶️  {stage.name} ...")
+        try:
+            with self.metrics.stage(stage.name) if self.metrics is not None else nullcontext():
+                result = stage.run(upstream)
+        except Exception as e:
+            traceback.print_exc()
+            return StageReport(stage.name, "failed", time.perf_counter() - t0, f"{type(e).__name__}: {e}")
+        seconds = time.perf_counter() - t0
+        results[stage.name] = result
+        with self._lock:
+            self._state["stages"][stage.name] = {
+                "key": key,
+                "result": result,
+                "seconds": round(seconds, 3),
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+            }
+            self._save_state()
+        return StageReport(stage.name, "ran", seconds)
+
+    def run(self, force: bool = False) -> List[StageReport]:
+        """
+        Run every stage whose inputs changed (all of them with force=True), as
+        many at a time as their dependencies allow. Returns one report per stage
+        in dependency order.
+        """
+        t0 = time.perf_counter()
+        results: Dict[str, Any] = {}
+        reports: Dict[str, StageReport] = {}
+        pending = list(self.order)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            running = {}
+            while pending or running:
+                for name in list(pending):
+                    deps = [reports.get(d) for d in self.stages[name].after]
+                    if any(r is not None and r.status in ("failed", "skipped") for r in deps):
+                        reports[name] = StageReport(name, "skipped", error="upstream stage failed")
+                        if self.metrics is not None:
+                            self.metrics.mark(name, "skipped")
+                        pending.remove(name)
+                    elif all(r is not None for r in deps):
+                        running[pool.submit(self._run_stage, self.stages[name], results, force)] = name
+                        pending.remove(name)
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    reports[running.pop(future)] = future.result()
+
+        with self._lock:
+            self._save_state()  # digest cache of stages that were cached
+        ordered = [reports[name] for name in self.order]
+        print_report(ordered, time.perf_counter() - t0)
+        return ordered
+
+
+def print_report(reports: List[StageReport], total_seconds: float) -> None:
+    print("\n=== PIPELINE RUN ===")
+    width = max([len("total")] + [len(r.name) for r in reports])
+    for r in reports:
+        line = f"  {r.name:<{width}}  {r.status:<7}  {r.seconds:8.2f}s"
+        if r.error:
+            line += f"  ({r.error})"
+        print(line)
+    print(f"  {'total':<{width}}  {'':<7}  {total_seconds:8.2f}s")
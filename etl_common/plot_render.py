@@ -0,0 +1,205 @@
+"""
+plot_render.py
+
+Off-screen, parallel rendering of the analysis figures.
+
+Figures are described first and drawn later. A Figure holds only the small,
+already-reduced data it shows: histogram counts and bin edges, a 2-D density grid
+in place of a scatter with millions of points, or a rolled-up frame for bar and line
+charts. Describing a figure costs one numpy pass over the rows. Drawing it
+then costs the same at 1k rows as at 100M.
+
+render_figures draws figures with the non-interactive Agg backend in a process
+pool (matplotlib is not thread-safe), writing each PNG atomically. A fingerprint
+of every figure's data and labels is kept in plots_manifest.json next to the PNGs.
+A figure whose fingerprint and file are unchanged is not drawn again.
+
+    figures = [
+        histogram("hist_pm25.png", df["pm2_5"], title="Histogram of PM2.5"),
+        scatter("scatter.png", df["pm2_5"], df["severity_score"]),
+    ]
+    render_figures(figures, OUTPUT_DIR)
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import matplotlib
+
+matplotlib.use("Agg")  # before pyplot: never open windows, works without a display
+
+import numpy as np
+import pandas as pd
+
+# ---------------- Config ----------------
+PLOT_WORKERS = min(4, os.cpu_count() or 1)
+MANIFEST_NAME = "plots_manifest.json"
+# above this many points a scatter is drawn as a 2-D density grid
+SCATTER_MAX_POINTS = 5000
+DENSITY_BINS = 100
+# bump when the drawing code changes so every figure is redrawn once
+RENDER_VERSION = 1
+
+
+@dataclass
+class Figure:
+    filename: str
+    kind: str  # "hist" | "bar" | "line" | "scatter" | "density"
+    data: Dict[str, object]
+    title: str = ""
+    xlabel: str = ""
+    ylabel: str = ""
+    figsize: Optional[Tuple[float, float]] = None
+    options: Dict[str, object] = field(default_factory=dict)
+
+
+# ---------------- Describe ----------------
+
+def _finite(values) -> np.ndarray:
+    values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype="float64")
+    return values[np.isfinite(values)]
+
+
+def histogram(filename: str, values, bins: int = 30, **labels) -> Figure:
+    """Histogram pre-binned with np.histogram (the same bins pandas' .plot(kind="hist") uses)."""
+    counts, edges = np.histogram(_finite(values), bins=bins)
+    return Figure(filename, "hist", {"counts": counts, "edges": edges}, **labels)
+
+
+def scatter(filename: str, x, y, max_points: int = SCATTER_MAX_POINTS,
+            bins: int = DENSITY_BINS, **labels) -> Figure:
+    """
+    Scatter of x vs y. Up to max_points points are drawn as they are; beyond that
+    the points are binned into a bins x bins grid and drawn as a density plot.
+    """
+    x = pd.to_numeric(pd.Series(x), errors="coerce").to_numpy(dtype="float64")
+    y = pd.to_numeric(pd.Series(y), errors="coerce").to_numpy(dtype="float64")
+    keep = np.isfinite(x) & np.isfinite(y)
+    x, y = x[keep], y[keep]
+    if len(x) <= max_points:
+        return Figure(filename, "scatter", {"x": x, "y": y}, **labels)
+    counts, xedges, yedges = np.histogram2d(x, y, bins=bins)
+    return Figure(filename, "density", {"counts": counts, "xedges": xedges, "yedges": yedges}, **labels)
+
+
+def line(filename: str, x, y, marker: str = "o", rotate_xticks: int = 0, **labels) -> Figure:
+    return Figure(filename, "line", {"x": np.asarray(x), "y": np.asarray(y, dtype="float64")},
+                  options={"marker": marker, "rotate_xticks": rotate_xticks}, **labels)
+
+
+def stacked_bar(filename: str, frame: pd.DataFrame, **labels) -> Figure:
+    """Bar per index value, one stacked segment per column."""
+    return Figure(filename, "bar", {"frame": frame}, **labels)
+
+
+# ---------------- Render ----------------
+
+def fingerprint(figure: Figure) -> str:
+    """Hash of everything that ends up in the PNG."""
+    h = hashlib.sha256()
+    h.update(repr((RENDER_VERSION, figure.kind, figure.title, figure.xlabel, figure.ylabel,
+                   figure.figsize, sorted(figure.options.items()))).encode("utf-8"))
+    for key in sorted(figure.data):
+        value = figure.data[key]
+        h.update(key.encode("utf-8"))
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            h.update(value.to_csv().encode("utf-8"))
+            continue
+        arr = np.asarray(value)
+        if arr.dtype == object:
+            h.update(repr(arr.tolist()).encode("utf-8"))
+        else:
+            h.update(f"{arr.dtype}{arr.shape}".encode("utf-8"))
+            h.update(np.ascontiguousarray(arr).tobytes())
+    return h.hexdigest()[:20]
+
+
+def _draw(figure: Figure, ax) -> None:
+    data = figure.data
+    if figure.kind == "hist":
+        ax.stairs(data["counts"], data["edges"], fill=True)
+    elif figure.kind == "scatter":
+        ax.scatter(data["x"], data["y"], alpha=0.5)
+    elif figure.kind == "density":
+        from matplotlib.colors import LogNorm
+
+        counts = np.ma.masked_equal(data["counts"].T, 0)
+        mesh = ax.pcolormesh(data["xedges"], data["yedges"], counts, norm=LogNorm(), cmap="viridis")
+        ax.figure.colorbar(mesh, ax=ax, label="rows")
+    elif figure.kind == "line":
+        ax.plot(data["x"], data["y"], marker=figure.options.get("marker", "o"))
+        if figure.options.get("rotate_xticks"):
+            ax.tick_params(axis="x", labelrotation=figure.options["rotate_xticks"])
+    elif figure.kind == "bar":
+        data["frame"].plot(kind="bar", stacked=True, ax=ax)
+    else:
+        raise ValueError(f"unknown figure kind: {figure.kind}")
+
+
+def render(figure: Figure, out_dir: str) -> str:
+    """Draw one figure to out_dir/filename (temp file + os.replace). Returns the filename."""
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=figure.figsize)
+    try:
+        _draw(figure, ax)
+        ax.set_title(figure.title)
+        ax.set_xlabel(figure.xlabel)
+        ax.set_ylabel(figure.ylabel)
+        fig.tight_layout()
+        path = Path(out_dir) / figure.filename
+        tmp = path.with_name(f".{path.stem}.{uuid.uuid4().hex[:8]}{path.suffix}")
+        fig.savefig(tmp)
+        os.replace(tmp, path)
+    finally:
+        plt.close(fig)
+    return figure.filename
+
+
+def _load_manifest(out_dir: Path) -> Dict[str, str]:
+    try:
+        with open(out_dir / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(out_dir: Path, manifest: Dict[str, str]) -> None:
+    tmp = out_dir / f".{MANIFEST_NAME}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, out_dir / MANIFEST_NAME)
+
+
+def render_figures(figures: List[Figure], out_dir, workers: int = PLOT_WORKERS,
+                   force: bool = False) -> List[str]:
+    """
+    Draw the figures whose data changed since the last run (all of them with
+    force=True), up to `workers` at a time. Returns the filenames drawn.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = _load_manifest(out_dir)
+    todo = []
+    for figure in figures:
+        digest = fingerprint(figure)
+        if force or manifest.get(figure.filename) != digest or not (out_dir / figure.filename).exists():
+            todo.append((figure, digest))
+
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            drawn = list(pool.map(render, [f for f, _ in todo], [str(out_dir)] * len(todo)))
+    else:
+        drawn = [render(f, str(out_dir)) for f, _ in todo]
+
+    # a failed render raised above, so the manifest only records figures on disk
+    for figure, digest in todo:
+        manifest[figure.filename] = digest
+    _save_manifest(out_dir, manifest)
+    return drawn
@@ -0,0 +1,165 @@
+"""
+raw_store.py
+
+Append-only landing zone for raw API responses.
+
+Instead of one pretty-printed JSON file per response, responses are appended as
+compressed NDJSON records to segment files under a landing directory (each
+pipeline keeps its own, data/landing/):
+
+  <landing dir>/segments/seg_<writer>_<n>.ndjson.gz   (.zst when zstandard is installed)
+  <landing dir>/index.ndjson                          one line per record
+
+Every record is compressed as its own gzip member / zstd frame, so a segment is
+still a valid .gz/.zst stream, and a single record can be read by seeking to its
+offset and decompressing `length` bytes. Segments rotate at MAX_SEGMENT_BYTES and
+every writer process has its own segments, so concurrent extract workers never
+interleave bytes. Index lines are small single writes in append mode.
+
+Index entry: {"seq", "city", "station_id", "tag", "fetched_at", "segment", "offset", "length"}
+A record is referenced elsewhere as "landing:<seq>". read_ref looks refs up in
+an in-memory map of the index, built on first use and extended with the lines
+appended since.
+"""
+
+import gzip
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is always available
+    zstandard = None
+
+# ---------------- Config ----------------
+MAX_SEGMENT_BYTES = 64 * 1024 * 1024
+
+REF_PREFIX = "landing:"
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class RawStore:
+    def __init__(self, root: Path, max_segment_bytes: int = MAX_SEGMENT_BYTES,
+                 codec: Optional[str] = None):
+        self.root = Path(root)
+        self.segment_dir = self.root / "segments"
+        self.index_path = self.root / "index.ndjson"
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.codec = codec or ("zst" if zstandard is not None else "gz")
+        self._lock = threading.Lock()
+        self._pid = None
+        self._by_seq: Dict[str, Dict] = {}
+        self._indexed_lines = 0
+
+    def _ensure_writer(self) -> None:
+        # a forked worker must not keep writing into its parent's segment
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._writer_id = f"{self._pid}_{uuid.uuid4().hex[:6]}"
+            self._segment: Optional[Path] = None
+            self._segment_no = 0
+
+    # ---------------- write ----------------
+
+    def _current_segment(self, incoming: int) -> Path:
+        if self._segment is None or (
+            self._segment.exists() and self._segment.stat().st_size + incoming > self.max_segment_bytes
+        ):
+            self._segment_no += 1
+            self._segment = self.segment_dir / f"seg_{self._writer_id}_{self._segment_no:05d}.ndjson.{self.codec}"
+        return self._segment
+
+    def append(self, city: str, payload: dict, tag: str = "raw", station_id: Optional[str] = None,
+               fetched_at: Optional[datetime] = None) -> Dict:
+        """Append one response; returns its index entry (entry["ref"] is "landing:<seq>")."""
+        fetched_at = fetched_at or datetime.now(timezone.utc)
+        blob = _compress(json.dumps(payload, separators=(",", ":")).encode("utf-8") + b"\n", self.codec)
+        with self._lock:
+            self._ensure_writer()
+            segment = self._current_segment(len(blob))
+            with open(segment, "ab") as f:
+                offset = f.tell()
+                f.write(blob)
+            entry = {
+                # seq is unique without coordination: time-ordered, writer-tagged
+                "seq": f"{fetched_at.strftime('%Y%m%dT%H%M%S%f')}_{self._writer_id}_{offset}",
+                "city": city,
+                "station_id": station_id,
+                "tag": tag,
+                "fetched_at": fetched_at.isoformat(),
+                "segment": segment.name,
+                "offset": offset,
+                "length": len(blob),
+            }
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        entry["ref"] = REF_PREFIX + entry["seq"]
+        return entry
+
+    # ---------------- read ----------------
+
+    def entries(self, start_line: int = 0) -> List[Dict]:
+        """Index entries from line `start_line` on (lets readers skip what they already saw)."""
+        if not self.index_path.exists():
+            return []
+        out = []
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                if i < start_line or not line.strip():
+                    continue
+                entry = json.loads(line)
+                entry["line"] = i
+                entry["ref"] = REF_PREFIX + entry["seq"]
+                out.append(entry)
+        return out
+
+    def read_bytes(self, entry: Dict) -> bytes:
+        """Seek straight to one record and return its decompressed JSON bytes."""
+        codec = entry["segment"].rsplit(".", 1)[-1]
+        with open(self.segment_dir / entry["segment"], "rb") as f:
+            f.seek(entry["offset"])
+            blob = f.read(entry["length"])
+        return _decompress(blob, codec)
+
+    def read(self, entry: Dict) -> dict:
+        return json.loads(self.read_bytes(entry))
+
+    def _lookup(self, seq: str) -> Optional[Dict]:
+        # the index is append-only: read it once, then only the lines added since
+        with self._lock:
+            if seq not in self._by_seq:
+                for entry in self.entries(self._indexed_lines):
+                    self._by_seq[entry["seq"]] = entry
+                    self._indexed_lines = entry["line"] + 1
+            return self._by_seq.get(seq)
+
+    def read_ref(self, ref: str) -> dict:
+        entry = self._lookup(ref[len(REF_PREFIX):])
+        if entry is None:
+            raise KeyError(ref)
+        return self.read(entry)
+
+    def iter_records(self, start_line: int = 0) -> Iterator[Tuple[Dict, dict]]:
+        for entry in self.entries(start_line):
+            yield entry, self.read(entry)
+
+
+def is_ref(value: str) -> bool:
+    return str(value).startswith(REF_PREFIX)
@@ -0,0 +1,265 @@
+"""
+run_metrics.py
+
+Per-stage metrics of a pipeline run, written as a machine-readable report.
+
+For every stage (and every city, where the stage knows it) a run collects:
+  wall_seconds / cpu_seconds    time spent in the stage. CPU time is process-wide,
+                                so stages that overlap share it.
+  peak_rss_mb / rss_growth_mb   process high-water mark at the end of the stage,
+                                and how much the stage raised it
+  rows_in / rows_out, bytes_read / bytes_written
+  http_requests / http_errors   plus request latencies (count, mean, p50, p95, max)
+
+Stages are timed with `with RUN.stage("transform"):` (pipeline_dag does this
+for every stage it runs). Modules record counters wherever the numbers are
+known, e.g. RUN.add("transform", city="Delhi", rows_out=120) and
+RUN.observe_http("extract", seconds, status, city="Delhi"). Recording is cheap
+and thread-safe, so it is unconditional. Counters recorded inside worker processes
+(extract_due_stations shards, transform's parser pool) stay in those processes;
+the parent records what it gets back.
+
+Each pipeline starts the run with its own output directory
+(RUN.start("air_quality", BASE_DIR / "data" / "metrics")). write_report() writes
+<out dir>/run_<run id>.json and, with prometheus=True, the same numbers in
+Prometheus text format to <out dir>/last_run.prom (for a node_exporter textfile
+collector).
+
+Profiling is opt-in: with profile="cprofile" (or METRICS_PROFILE=cprofile) every
+stage is profiled into <out dir>/<run id>_<stage>.pstats; "pyinstrument"
+writes <run id>_<stage>.html instead (when pyinstrument is installed). Only one
+profiler can be active at a time: of overlapping stages only the first is profiled.
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+try:
+    import pyinstrument
+except ImportError:  # optional, cProfile is always available
+    pyinstrument = None
+
+# ---------------- Config ----------------
+PROMETHEUS_FILE = "last_run.prom"
+
+COUNTERS = ["rows_in", "rows_out", "bytes_read", "bytes_written", "http_requests", "http_errors"]
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _latency_summary(latencies) -> Optional[Dict[str, float]]:
+    if not latencies:
+        return None
+    arr = np.asarray(latencies, dtype="float64")
+    return {
+        "count": int(arr.size),
+        "mean": float(arr.mean()),
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "max": float(arr.max()),
+    }
+
+
+class RunMetrics:
+    def __init__(self, pipeline: str = "", out_dir: Optional[Path] = None, profile: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()
+        self.out_dir = None
+        self.start(pipeline, out_dir, profile)
+
+    def start(self, pipeline: str, out_dir: Optional[Path] = None, profile: Optional[str] = None) -> None:
+        """
+        Begin a new run (drops everything recorded so far). out_dir receives the
+        report and profiles; None keeps the previous one.
+        """
+        profile = profile or os.getenv("METRICS_PROFILE") or None
+        if profile is not None and profile not in PROFILERS:
+            raise ValueError(f"profile must be one of {PROFILERS}, not {profile!r}")
+        with self._lock:
+            if out_dir is not None:
+                self.out_dir = Path(out_dir)
+            self.pipeline = pipeline
+            self.profile = profile
+            self.started_at = datetime.now(timezone.utc)
+            self.run_id = self.started_at.strftime("%Y%m%dT%H%M%SZ")
+            self.stages: Dict[str, dict] = {}
+            # (stage, city or None) -> {"counters": {...}, "latencies": [...]}
+            self._buckets: Dict[Tuple[str, Optional[str]], dict] = {}
+
+    # ---------------- recording ----------------
+
+    def _bucket(self, stage: str, city: Optional[str]) -> dict:
+        key = (stage, city)
+        if key not in self._buckets:
+            self._buckets[key] = {"counters": dict.fromkeys(COUNTERS, 0), "latencies": []}
+        return self._buckets[key]
+
+    def _buckets_for(self, stage: str, city: Optional[str]) -> list:
+        """The stage total, plus the city's own bucket when there is a city."""
+        buckets = [self._bucket(stage, None)]
+        if city is not None:
+            buckets.append(self._bucket(stage, city))
+        return buckets
+
+    def add(self, stage: str, city: Optional[str] = None, **counters) -> None:
+        """Add to counters (rows_in, rows_out, bytes_read, bytes_written, ...) of a stage / city."""
+        with self._lock:
+            for bucket in self._buckets_for(stage, city):
+                for name, value in counters.items():
+                    bucket["counters"][name] = bucket["counters"].get(name, 0) + value
+
+    def observe_http(self, stage: str, seconds: float, status: Optional[int] = None,
+                     city: Optional[str] = None, error: bool = False) -> None:
+        """One HTTP request: its latency, and an error when it raised or answered >= 400."""
+        failed = error or (status is not None and status >= 400)
+        with self._lock:
+            for bucket in self._buckets_for(stage, city):
+                bucket["counters"]["http_requests"] += 1
+                bucket["counters"]["http_errors"] += int(failed)
+                bucket["latencies"].append(seconds)
+
+    def mark(self, stage: str, status: str) -> None:
+        """Record a stage that did not run (cached / skipped)."""
+        with self._lock:
+            self.stages[stage] = {"status": status}
+
+    @contextmanager
+    def _profiler(self, stage: str):
+        if self.profile is None or self.out_dir is None or not self._profiling.acquire(blocking=False):
+            yield None
+            return
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f"{self.run_id}_{stage}"
+        try:
+            if self.profile == "pyinstrument" and pyinstrument is not None:
+                profiler = pyinstrument.Profiler()
+                profiler.start()
+                try:
+                    yield path.with_suffix(".html")
+                finally:
+                    profiler.stop()
+                    path.with_suffix(".html").write_text(profiler.output_html(), encoding="utf-8")
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    yield path.with_suffix(".pstats")
+                finally:
+                    profiler.disable()
+                    profiler.dump_stats(path.with_suffix(".pstats"))
+        finally:
+            self._profiling.release()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a stage (wall, CPU, peak RSS) and profile it if profiling is on."""
+        rss_before = _peak_rss_mb()
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        status = "failed"
+        profile_path = None
+        try:
+            with self._profiler(name) as profile_path:
+                yield self
+            status = "ran"
+        finally:
+            rss_after = _peak_rss_mb()
+            entry = {
+                "status": status,
+                "wall_seconds": round(time.perf_counter() - wall0, 4),
+                "cpu_seconds": round(time.process_time() - cpu0, 4),
+                "peak_rss_mb": None if rss_after is None else round(rss_after, 1),
+                "rss_growth_mb": None if rss_after is None else round(rss_after - rss_before, 1),
+            }
+            if profile_path is not None:
+                entry["profile"] = str(profile_path)
+            with self._lock:
+                self.stages[name] = entry
+
+    # ---------------- report ----------------
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            stages = {name: dict(entry) for name, entry in self.stages.items()}
+            for (stage, city), bucket in self._buckets.items():
+                entry = stages.setdefault(stage, {"status": "ran"})
+                numbers = dict(bucket["counters"])
+                http = _latency_summary(bucket["latencies"])
+                if http is not None:
+                    numbers["http_latency_seconds"] = http
+                if city is None:
+                    entry.update(numbers)
+                else:
+                    entry.setdefault("cities", {})[city] = numbers
+        return {
+            "run_id": self.run_id,
+            "pipeline": self.pipeline,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "stages": stages,
+        }
+
+    def to_prometheus(self, report: Optional[dict] = None) -> str:
+        report = report or self.to_dict()
+        families: Dict[str, list] = {}  # samples of a metric must be written together
+
+        def metric(name: str, value, **labels):
+            if value is None:
+                return
+            labels = {"pipeline": report["pipeline"], **labels}
+            text = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in labels.items())
+            families.setdefault(name, []).append(f"{name}{{{text}}} {value}")
+
+        for stage, entry in report["stages"].items():
+            for key in ["wall_seconds", "cpu_seconds", "peak_rss_mb", "rss_growth_mb"] + COUNTERS:
+                metric(f"etl_stage_{key}", entry.get(key), stage=stage)
+            for q, value in (entry.get("http_latency_seconds") or {}).items():
+                metric("etl_stage_http_latency_seconds", value, stage=stage, stat=q)
+            for city, numbers in (entry.get("cities") or {}).items():
+                for key in COUNTERS:
+                    metric(f"etl_city_{key}", numbers.get(key), stage=stage, city=city)
+
+        lines = []
+        for name, samples in families.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, prometheus: bool = False) -> Path:
+        """Write run_<run id>.json (and last_run.prom); returns the JSON path."""
+        if self.out_dir is None:
+            raise ValueError("no output directory: pass out_dir to RUN.start()")
+        report = self.to_dict()
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f"run_{self.run_id}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        if prometheus:
+            tmp = self.out_dir / f".{PROMETHEUS_FILE}.tmp"
+            tmp.write_text(self.to_prometheus(report), encoding="utf-8")
+            os.replace(tmp, self.out_dir / PROMETHEUS_FILE)
+        return path
+
+
+# the current run; run_pipeline.py starts it, every module records into it
+RUN = RunMetrics()